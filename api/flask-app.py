@@ -1,7 +1,22 @@
 # app.py
-from flask import Flask
+from flask import Flask, Response, request
+from patients import MAX_RESULTS, PatientStore
 
 app = Flask(__name__)
+store = PatientStore()
+
+def json_response(body: str) -> Response:
+    """JSON response from already serialized records"""
+    return Response(body, mimetype='application/json')
+
+@app.after_request
+def conditional(response: Response) -> Response:
+    """Tag successful reads with an ETag and answer a matching If-None-Match with 304"""
+    if request.method == 'GET' and response.status_code == 200 and response.mimetype == 'application/json':
+        response.add_etag()
+        response.make_conditional(request)
+
+    return response
 
 @app.route('/', methods=['GET'])
 def index():
@@ -11,47 +26,39 @@ def index():
 @app.route('/patient/<int:patient_id>', methods=['GET'])
 def get_data(patient_id: int):
     """Get data by patient ID"""
-    if patient_id == 1:
-        data = {
-            "id": 1,
-            "name": "John Doe",
-            "dob": "01/01/1975",
-            "pcp": "Dr. Meredith Grey",
-            "ehrId": "1234abcd",
-            "referred_providers": [
-                {"provider": "House, Gregory MD", "specialty": "Orthopedics"},
-                {"specialty": "Primary Care"},
-            ],
-            "appointments": [
-                {
-                    "date": "3/05/18",
-                    "time": "9:15am",
-                    "provider": "Dr. Meredith Grey",
-                    "status": "completed"
-                    },
-                {
-                    "date": "8/12/24",
-                    "time": "2:30pm",
-                    "provider": "Dr. Gregory House",
-                    "status": "completed"
-                    },
-                {
-                    "date": "9/17/24",
-                    "time": "10:00am",
-                    "provider": "Dr. Meredith Grey",
-                    "status": "noshow"
-                    },
-                {
-                    "date": "11/25/24",
-                    "time": "11:30am",
-                    "provider": "Dr. Meredith Grey",
-                    "status": "cancelled"
-                    }
-            ]
-        }
-        return data, 200
-
-    return 'Patient not found', 404
+    record = store.get(patient_id)
+    if record is None:
+        return 'Patient not found', 404
+
+    return json_response(record)
+
+@app.route('/patient/search', methods=['GET'])
+def search():
+    """Find patients by full name and date of birth (MM/DD/YYYY)"""
+    name = request.args.get('name', '')
+    dob = request.args.get('dob', '')
+    if not name.strip() or not dob:
+        return 'name and dob are required', 400
+
+    try:
+        records = store.search(name, dob)
+    except ValueError:
+        return 'dob must be MM/DD/YYYY', 400
+
+    return json_response(f"[{','.join(records)}]")
+
+@app.route('/patients', methods=['GET'])
+def get_many():
+    """Get data of several patients by comma-separated IDs; unknown IDs are left out"""
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        return 'ids must be comma-separated integers', 400
+
+    if len(ids) > MAX_RESULTS:
+        return f'At most {MAX_RESULTS} ids per request', 400
+
+    return json_response(f"[{','.join(store.get_many(ids))}]")
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5050, debug=True)
@@ -0,0 +1,215 @@
+# generate_patients.py
+"""Generate a synthetic patient population for the EHR stub.
+
+Writes `--count` patients with random names, dates of birth, PCPs,
+referrals and appointment histories to a fresh SQLite file, which then
+replaces `--db`. It refuses to while the EHR stub (or anything else) has
+`--db` open, so stop the stub first and restart it afterwards. Patient 1
+is always the demo patient, John Doe (01/01/1975).
+Names are drawn from small lists, so many patients share a name and a few
+share a name and date of birth, as in a real population.
+
+Usage:
+    python generate_patients.py [--count 1000000] [--seed 0] [--db patients.db]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Optional
+from patients import INDEX, PATIENT_DB, SCHEMA, SEED_PATIENT, create, name_key
+
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Christopher', 'Lisa', 'Daniel', 'Nancy', 'Matthew', 'Betty', 'Anthony', 'Sandra', 'Mark', 'Margaret',
+    'Donald', 'Ashley', 'Steven', 'Kimberly', 'Andrew', 'Emily', 'Paul', 'Donna', 'Joshua', 'Michelle',
+    'Kenneth', 'Carol', 'Kevin', 'Amanda', 'Brian', 'Melissa', 'George', 'Deborah', 'Timothy', 'Stephanie',
+    'Jose', 'Maria', 'Luis', 'Ana', 'Wei', 'Mei', 'Aisha', 'Omar', 'Priya', 'Raj',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+    'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores',
+    'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts',
+    'Chen', 'Patel', 'Kim', 'Khan', 'Singh', 'Murphy', 'Cook', 'Rogers', 'Morgan', 'Cooper',
+    'Peterson', 'Bailey', 'Reed', 'Kelly', 'Howard', 'Ramos', 'Cox', 'Ward', 'Richardson', 'Watson',
+    'Brooks', 'Wood', 'James', 'Bennett', 'Gray', 'Hughes', 'Price', 'Sanders', 'Myers', 'Long',
+)
+
+# providers as (first name, last name, specialty)
+PROVIDERS = (
+    ('Meredith', 'Grey', 'Primary Care'),
+    ('Gregory', 'House', 'Orthopedics'),
+    ('Allison', 'Cameron', 'Primary Care'),
+    ('James', 'Wilson', 'Primary Care'),
+    ('Robert', 'Chase', 'Surgery'),
+    ('Lisa', 'Cuddy', 'Primary Care'),
+    ('Derek', 'Shepherd', 'Surgery'),
+    ('Miranda', 'Bailey', 'Surgery'),
+    ('Callie', 'Torres', 'Orthopedics'),
+    ('Cristina', 'Yang', 'Surgery'),
+)
+PCPS = tuple(i for i in PROVIDERS if i[2] == 'Primary Care')
+SPECIALTIES = sorted({specialty for _, _, specialty in PROVIDERS})
+STATUSES = ('completed', 'completed', 'completed', 'noshow', 'cancelled')
+
+OLDEST = date(1930, 1, 1)
+YOUNGEST = date(2020, 12, 31)
+FIRST_VISIT = date(2015, 1, 1)
+LAST_VISIT = date(2025, 12, 31)
+
+
+class DatabaseInUse(Exception):
+    """The database to replace is open in another process, such as the EHR stub."""
+
+
+def lock(path: str) -> Optional[sqlite3.Connection]:
+    """Connection holding an exclusive lock on the database at `path`, or None if there is none.
+
+    Leaving WAL mode fails while another connection has the database open, and
+    otherwise makes SQLite remove the WAL and shared memory files itself.
+
+    Raises:
+        DatabaseInUse: If another connection has the database open
+    """
+    if not os.path.exists(path):
+        return None
+
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA journal_mode=DELETE').fetchone()[0] != 'delete':
+            raise DatabaseInUse(path)
+        conn.execute('BEGIN EXCLUSIVE')
+    except sqlite3.OperationalError as e:
+        conn.close()
+        raise DatabaseInUse(path) from e
+    except DatabaseInUse:
+        conn.close()
+        raise
+
+    return conn
+
+
+def appointment(rng: random.Random, day: date, provider: str) -> dict:
+    """Appointment on a day, in the EHR's date ("3/05/18") and time ("9:15am") formats."""
+    hour = rng.randrange(8, 17)
+    minute = rng.choice((0, 15, 30, 45))
+
+    return {
+        'date': f"{day.month}/{day.day:02d}/{day.year % 100:02d}",
+        'time': f"{(hour - 1) % 12 + 1}:{minute:02d}{'am' if hour < 12 else 'pm'}",
+        'provider': provider,
+        'status': rng.choice(STATUSES),
+    }
+
+
+def patient(rng: random.Random, idx: int) -> dict:
+    """Random patient record."""
+    dob = OLDEST + timedelta(days=rng.randrange((YOUNGEST - OLDEST).days))
+    pcp = rng.choice(PCPS)
+    seen = [pcp] + rng.sample(PROVIDERS, rng.randrange(3))
+
+    referrals = []
+    for first, last, specialty in rng.sample(PROVIDERS, rng.randrange(3)):
+        referrals.append({'provider': f"{last}, {first} MD", 'specialty': specialty})
+    if rng.random() < 0.3:
+        referrals.append({'specialty': rng.choice(SPECIALTIES)})
+
+    visits = (LAST_VISIT - FIRST_VISIT).days
+    days = sorted(FIRST_VISIT + timedelta(days=rng.randrange(visits)) for _ in range(rng.randrange(7)))
+    appointments = [
+        appointment(rng, day, f"Dr. {first} {last}")
+        for day, (first, last, _) in zip(days, rng.choices(seen, k=len(days)))
+        ]
+
+    return {
+        'id': idx,
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'dob': dob.strftime('%m/%d/%Y'),
+        'pcp': f"Dr. {pcp[0]} {pcp[1]}",
+        'ehrId': f"{rng.getrandbits(32):08x}",
+        'referred_providers': referrals,
+        'appointments': appointments,
+    }
+
+
+def generate(path: str, count: int, seed: int = 0, batch: int = 10000) -> None:
+    """Write `count` patients, the seed patient first, to a new SQLite file at `path`.
+
+    Args:
+        path (str): SQLite file to replace
+        count (int): Number of patients, including the seed patient
+        seed (int): Random seed, so a population can be regenerated exactly
+        batch (int): Rows per insert
+
+    Raises:
+        DatabaseInUse: If another process has `path` open
+    """
+    # fail before spending minutes on a file that can't be swapped in
+    held = lock(path)
+    if held is not None:
+        held.close()
+
+    rng = random.Random(seed)
+    tmp = f"{path}.tmp"
+    for stale in (tmp, f"{tmp}-wal", f"{tmp}-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    conn = sqlite3.connect(tmp)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute(SCHEMA)
+
+    rows = []
+    for idx in range(2, count + 1):
+        record = patient(rng, idx)
+        rows.append((idx, name_key(record['name']), record['dob'], json.dumps(record, separators=(',', ':'))))
+        if len(rows) == batch:
+            conn.executemany('INSERT INTO patients VALUES (?, ?, ?, ?)', rows)
+            rows.clear()
+    conn.executemany('INSERT INTO patients VALUES (?, ?, ?, ?)', rows)
+
+    # indexing once at the end is much faster than maintaining the index per row
+    conn.execute(INDEX)
+    # WAL mode can't be entered inside the insert transaction
+    conn.commit()
+    create(conn)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+    # the lock keeps the old file from being opened between the check and the swap
+    held = lock(path)
+    try:
+        os.replace(tmp, path)
+    finally:
+        if held is not None:
+            held.close()
+
+
+def main() -> None:
+    """Generator CLI."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1_000_000, help='Number of patients')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--db', default=PATIENT_DB, help='SQLite file to write')
+    args = parser.parse_args()
+
+    if args.count < 1:
+        parser.error('--count must be at least 1')
+
+    start = time.perf_counter()
+    try:
+        generate(args.db, args.count, args.seed)
+    except DatabaseInUse:
+        parser.error(f"{args.db} is open in another process; stop the EHR stub and try again")
+    print(f"Wrote {args.count} patients ({SEED_PATIENT['name']} is patient 1) "
+          f"to {args.db} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# patients.py
+"""SQLite patient store behind the EHR stub."""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+PATIENT_DB = os.getenv('PATIENT_DB', str(Path(__file__).with_name('patients.db')))
+
+# most records a search or batch request returns
+MAX_RESULTS = 100
+
+# the demo patient the conversation flows are written around; always patient 1
+SEED_PATIENT = {
+    "id": 1,
+    "name": "John Doe",
+    "dob": "01/01/1975",
+    "pcp": "Dr. Meredith Grey",
+    "ehrId": "1234abcd",
+    "referred_providers": [
+        {"provider": "House, Gregory MD", "specialty": "Orthopedics"},
+        {"specialty": "Primary Care"},
+    ],
+    "appointments": [
+        {
+            "date": "3/05/18",
+            "time": "9:15am",
+            "provider": "Dr. Meredith Grey",
+            "status": "completed"
+            },
+        {
+            "date": "8/12/24",
+            "time": "2:30pm",
+            "provider": "Dr. Gregory House",
+            "status": "completed"
+            },
+        {
+            "date": "9/17/24",
+            "time": "10:00am",
+            "provider": "Dr. Meredith Grey",
+            "status": "noshow"
+            },
+        {
+            "date": "11/25/24",
+            "time": "11:30am",
+            "provider": "Dr. Meredith Grey",
+            "status": "cancelled"
+            }
+    ]
+}
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS patients ('
+    'id INTEGER PRIMARY KEY, '
+    'name_key TEXT NOT NULL, '
+    'dob TEXT NOT NULL, '
+    'record TEXT NOT NULL)'
+    )
+INDEX = 'CREATE INDEX IF NOT EXISTS patients_name_dob ON patients (name_key, dob)'
+
+
+def name_key(name: str) -> str:
+    """Lowercase name with single spaces ("John  DOE" -> "john doe")."""
+    return ' '.join(name.lower().split())
+
+
+def normalize_dob(dob: str) -> str:
+    """Zero-padded MM/DD/YYYY date of birth ("1/1/1975" -> "01/01/1975").
+
+    Raises:
+        ValueError: If `dob` is not a MM/DD/YYYY date
+    """
+    return datetime.strptime(dob.strip(), '%m/%d/%Y').strftime('%m/%d/%Y')
+
+
+def row(record: dict) -> tuple:
+    """Table row of a patient record; the record is kept as serialized JSON."""
+    return (
+        record['id'],
+        name_key(record['name']),
+        normalize_dob(record['dob']),
+        json.dumps(record, separators=(',', ':')),
+        )
+
+
+def create(conn: sqlite3.Connection) -> None:
+    """Create the patients table and its name+DOB index, with the seed patient."""
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    conn.execute(INDEX)
+    conn.execute('INSERT OR IGNORE INTO patients VALUES (?, ?, ?, ?)', row(SEED_PATIENT))
+    conn.commit()
+
+
+class PatientStore:
+    """Read access to the patients table, one connection per thread.
+
+    Records are returned as the JSON text they are stored as, so serving them
+    doesn't parse or re-serialize anything.
+
+    Args:
+        path (str): SQLite file; created with the seed patient if missing
+    """
+    def __init__(self, path: str = PATIENT_DB):
+        self.path = path
+        self._local = threading.local()
+
+        conn = sqlite3.connect(path)
+        try:
+            create(conn)
+        finally:
+            conn.close()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's read-only connection, opened on first use (after any fork)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._local.conn = conn
+
+        return conn
+
+    def get(self, idx: int) -> str | None:
+        """Record of a patient, or None if there is no such patient."""
+        found = self.conn.execute('SELECT record FROM patients WHERE id = ?', (idx,)).fetchone()
+        return found and found[0]
+
+    def get_many(self, ids: list[int]) -> list[str]:
+        """Records of the patients that exist among `ids`, in the order asked for."""
+        ids = list(dict.fromkeys(ids))
+        found = dict(self.conn.execute(
+            f"SELECT id, record FROM patients WHERE id IN ({', '.join('?' * len(ids))})",
+            ids,
+            ).fetchall()) if ids else {}
+
+        return [found[i] for i in ids if i in found]
+
+    def search(self, name: str, dob: str) -> list[str]:
+        """Records of the patients with a name and date of birth, by ID.
+
+        Raises:
+            ValueError: If `dob` is not a MM/DD/YYYY date
+        """
+        return [record for record, in self.conn.execute(
+            'SELECT record FROM patients WHERE name_key = ? AND dob = ? ORDER BY id LIMIT ?',
+            (name_key(name), normalize_dob(dob), MAX_RESULTS),
+            )]
+
+    def count(self) -> int:
+        """Number of patients."""
+        return self.conn.execute('SELECT count(*) FROM patients').fetchone()[0]
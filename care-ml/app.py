@@ -1,7 +1,7 @@
 """Main app module"""
 import os
-from typing import List, Self
-import time
+import json
+from typing import Iterator, List, Self, Tuple
 import requests
 from pydantic import BaseModel, model_validator, field_validator
 import streamlit as st
@@ -40,31 +40,76 @@ class ChatHistory(BaseModel):
 
         st.session_state.messages.append(m.model_dump())
 
-    def _call_ml_services(self, messages: List[Message]) -> Message:
-        url = f"{ML_URL}/message/create"
-        print(url)
+    def _start_session(self, messages: List[Message]) -> str:
+        """Start an ML service session seeded with the given chat history."""
         ml_response = requests.post(
-            url,
+            f"{ML_URL}/session",
             json={
                 "messages": [i.model_dump() for i in messages]
             },
             timeout=30
             )
+        ml_response.raise_for_status()
+        st.session_state.session_id = ml_response.json()["session_id"]
 
-        return CustomerFacingMessage(**ml_response.json()["message"])
+        return st.session_state.session_id
+
+    def _post_turn(self, session_id: str, prompt: str) -> requests.Response:
+        return requests.post(
+            f"{ML_URL}/session/{session_id}/stream",
+            json={"content": prompt},
+            stream=True,
+            timeout=30
+            )
+
+    def _stream_ml_services(self, prompt: str) -> Iterator[Tuple[str, dict]]:
+        """Send only the new user message to the ML session and yield (event, data) pairs
+        from its server-sent events."""
+        history = self.messages[:-1]
+        session_id = st.session_state.get("session_id") or self._start_session(history)
+        ml_response = self._post_turn(session_id, prompt)
+
+        if ml_response.status_code == 404:
+            # the session expired server-side, so start a new one from the local history
+            ml_response.close()
+            ml_response = self._post_turn(self._start_session(history), prompt)
+
+        with ml_response:
+            ml_response.raise_for_status()
+
+            event = None
+            for line in ml_response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    yield event, json.loads(line[len("data: "):])
 
     def step(self, prompt: str):
         """Complete a dialogue step with the given chat history."""
         st.chat_message(Role.USER).markdown(prompt)
 
         self._append(Message(role=Role.USER, content=prompt))
-        response = self._call_ml_services(self.messages)
-        with st.spinner("typing..."):
-            time.sleep(1)
-            with st.chat_message(response.role):
-                st.markdown(response.content)
-
-        self._append(response)
+        response = {}
+
+        with st.chat_message(Role.ASSISTANT):
+            status = st.empty()
+
+            def tokens() -> Iterator[str]:
+                status.caption("typing...")
+                for event, data in self._stream_ml_services(prompt):
+                    if event == "status" and data["stage"] == "tools":
+                        status.caption("looking things up...")
+                    elif event == "token":
+                        status.empty()
+                        yield data["content"]
+                    elif event == "done":
+                        response.update(data["message"])
+                    elif event == "error":
+                        raise RuntimeError(data["detail"])
+
+            st.write_stream(tokens())
+
+        self._append(CustomerFacingMessage(**response))
 
 st.title("Care Coordinator Assistant 🧑‍⚕️")
 
@@ -0,0 +1,6 @@
+"""Micro-benchmarks of the per-turn CPU work of the ML service.
+
+Usage (from `care-ml/`):
+    python -m benchmarks run [--out FILE] [-k FILTER]
+    python -m benchmarks compare CURRENT [--baseline FILE] [--threshold 0.1]
+"""
@@ -0,0 +1,59 @@
+"""Benchmark CLI."""
+import argparse
+import json
+import sys
+from pathlib import Path
+from . import suite  # pylint: disable=unused-import  # registers the benchmarks
+from .runner import run, compare
+
+BASELINE = Path(__file__).parent / 'baselines' / 'baseline.json'
+
+
+def main() -> None:
+    """Run benchmarks or compare results."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run benchmarks and write their results as JSON')
+    run_parser.add_argument('-k', dest='pattern', help='Only run benchmarks whose name contains this')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Timing repeats per benchmark')
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per repeat')
+    run_parser.add_argument('--out', type=Path, help='Result file (default: stdout)')
+
+    compare_parser = commands.add_parser('compare', help='Compare results to a baseline')
+    compare_parser.add_argument('current', type=Path, help='Result file')
+    compare_parser.add_argument('--baseline', type=Path, default=BASELINE, help='Baseline result file')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative slowdown of the median that counts as a regression')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        output = json.dumps(run(args.pattern, repeat=args.repeat, min_time=args.min_time), indent=2)
+        if args.out:
+            args.out.parent.mkdir(parents=True, exist_ok=True)
+            args.out.write_text(output + '\n')
+        else:
+            print(output)
+        return
+
+    rows = compare(
+        json.loads(args.baseline.read_text()),
+        json.loads(args.current.read_text()),
+        args.threshold,
+        )
+
+    for row in rows:
+        print(
+            f"{row['name']:<64} {row['baseline_us']:>12.2f} us {row['current_us']:>12.2f} us"
+            f" {row['ratio']:>6.2f}x{'  REGRESSION' if row['regressed'] else ''}"
+            )
+
+    regressions = [row['name'] for row in rows if row['regressed']]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
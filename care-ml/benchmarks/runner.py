@@ -0,0 +1,124 @@
+"""Benchmark registry, timing and baseline comparison."""
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+import itertools
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+
+# a setup function returns the callable to time
+Setup = Callable[..., Callable[[], Any]]
+
+
+class Benchmark(NamedTuple):
+    """Registered benchmark."""
+    name: str
+    setup: Setup
+    params: Dict[str, Any]
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, **params: Iterable[Any]) -> Callable[[Setup], Setup]:
+    """Register a setup function, once per combination of `params`.
+
+    Each instance is named `name[key=value,...]` and its setup function is
+    called with that combination.
+    """
+    def register(setup: Setup) -> Setup:
+        keys = list(params)
+        for values in itertools.product(*params.values()):
+            kwargs = dict(zip(keys, values))
+            label = ','.join(f"{key}={value}" for key, value in kwargs.items())
+            BENCHMARKS.append(Benchmark(f"{name}[{label}]" if label else name, setup, kwargs))
+        return setup
+
+    return register
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Per-call timings (seconds) of `fn`.
+
+    The loop count is calibrated so that one repeat takes at least `min_time`.
+    """
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    loops = max(loops, int(loops * min_time / 0.2))
+    times = [i / loops for i in timer.repeat(repeat=repeat, number=loops)]
+
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def environment() -> dict:
+    """Where a result was measured; timings only compare on the same machine."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def run(pattern: Optional[str] = None, repeat: int = 5, min_time: float = 0.2) -> dict:
+    """Run the registered benchmarks whose name contains `pattern`."""
+    results = {}
+
+    for bench in BENCHMARKS:
+        if pattern and pattern not in bench.name:
+            continue
+
+        start = time.perf_counter()
+        fn = bench.setup(**bench.params)
+        setup_time = time.perf_counter() - start
+        results[bench.name] = measure(fn, repeat=repeat, min_time=min_time)
+        print(
+            f"{bench.name:<64} {results[bench.name]['median'] * 1e6:>12.2f} us"
+            f"  (setup {setup_time:.2f}s)",
+            file=sys.stderr,
+            )
+
+    return {'environment': environment(), 'results': results}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """Median ratio (current / baseline) of every benchmark in both results.
+
+    A benchmark regressed if it got more than `threshold` (relative) slower.
+    """
+    rows = []
+
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+
+        ratio = result['median'] / base['median']
+        rows.append({
+            'name': name,
+            'baseline_us': base['median'] * 1e6,
+            'current_us': result['median'] * 1e6,
+            'ratio': ratio,
+            'regressed': ratio > 1 + threshold,
+        })
+
+    return rows
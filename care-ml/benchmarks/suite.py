@@ -0,0 +1,191 @@
+"""Benchmarks."""
+from typing import List
+import json
+import random
+from datetime import datetime
+import duckdb
+from care_ml.ml.message import ChatHistory, Message, Role, TOOL_CALLS_TAG
+from care_ml.ml.ehr_connector import Appointment, Patient
+from care_ml.ml.queries import ZipCode, all_providers, search_providers
+from care_ml.ml.provider_index import PROVIDER_INDEX
+from care_ml.ml.tools import find_earliest_slots, search_available_providers
+from care_ml.ml.policy import POLICY_TABLE
+from care_ml.env_settings import TOOL_CALL_TOKEN_BUDGET
+from .runner import benchmark
+
+SIZES = (10, 100, 1000)
+DIRECTORY_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5)
+SEARCH_TIMESTAMP = '10/19/2026 10:00:00'  # a Monday
+NEAR = ZipCode('27401', 'Greensboro', 'NC', 36.0726, -79.7920)
+SEARCH_QUERIES = {
+    'last_name': {'last_name': 'Last42'},
+    'specialty_time': {'specialty': 'Orthopedics', 'timestamp': SEARCH_TIMESTAMP},
+}
+
+
+def conversation(size: int) -> List[Message]:
+    """Alternating user/assistant messages, every fifth assistant message a tool call result."""
+    messages = []
+
+    for i in range(size):
+        if i % 2 == 0:
+            messages.append(Message(role=Role.USER, content=f"Message {i}: " + 'lorem ipsum ' * 15))
+        elif i % 10 == 9:
+            result = json.dumps([{'provider_id': j, 'first_name': 'Gregory', 'last_name': 'House'} for j in range(5)])
+            messages.append(Message(role=Role.ASSISTANT, content=f"{TOOL_CALLS_TAG}\nsearch_available_providers: {result}"))
+        else:
+            messages.append(Message(role=Role.ASSISTANT, content=f"Reply {i}: " + 'dolor sit amet ' * 12))
+
+    return messages
+
+
+def appointment_records(size: int) -> List[dict]:
+    """Appointment records in the EHR API's format (seeded, so every run measures the same data)."""
+    rng = random.Random(size)
+    return [
+        {
+            'date': f"{rng.randint(1, 12)}/{rng.randint(1, 28):02d}/{rng.randint(10, 24)}",
+            'time': f"{rng.randint(1, 12)}:{rng.choice(['00', '15', '30', '45'])}{rng.choice(['am', 'pm'])}",
+            'provider': rng.choice(['Dr. Meredith Grey', 'Dr. Gregory House', 'Dr. Cristina Yang']),
+            'status': rng.choice(['completed', 'cancelled', 'noshow']),
+        }
+        for _ in range(size)
+    ]
+
+
+def provider_directory(size: int) -> duckdb.DuckDBPyConnection:
+    """In-memory provider database with `size` provider departments."""
+    conn = duckdb.connect(':memory:')
+    conn.execute(
+        """
+        CREATE TABLE providers AS
+        SELECT
+            i AS id,
+            'First' || (i % 500) AS first_name,
+            'Last' || (i % 1000) AS last_name,
+            ['Primary Care', 'Orthopedics', 'Surgery'][i % 3 + 1] AS specialty,
+            'MD' AS certification
+        FROM range(1, $size + 1) t(i)
+        """,
+        {'size': size},
+        )
+    conn.execute(
+        """
+        CREATE TABLE departments AS
+        SELECT
+            i AS id,
+            i AS provider_id,
+            'Department ' || (i % 1000) AS name,
+            '(555) 555-0100' AS phone_number,
+            i || ' Main St, Raleigh, NC 27601' AS address,
+            i % 2 AS start_day,
+            2 + i % 3 AS end_day,
+            7 + i % 4 AS start_hour,
+            15 + i % 4 AS end_hour,
+            -- scattered over a North Carolina-sized box
+            34.0 + hash(i) % 2500 / 1000 AS latitude,
+            -84.0 + hash(i + 1) % 8000 / 1000 AS longitude
+        FROM range(1, $size + 1) t(i)
+        """,
+        {'size': size},
+        )
+
+    return conn
+
+
+@benchmark('history_render', messages=SIZES)
+def history_render(messages: int):
+    history = ChatHistory(conversation(messages))
+    return lambda: history.render(system_prompt_id='tool_call_system', token_budget=TOOL_CALL_TOKEN_BUDGET)
+
+
+@benchmark('history_switch', messages=SIZES)
+def history_switch(messages: int):
+    history = ChatHistory(conversation(messages))
+    return history.switch
+
+
+@benchmark('message_from_template', template=('tool_call_system', 'fast_appointment_scheduled'))
+def message_from_template(template: str):
+    kwargs = {
+        'appointment_type': 'NEW',
+        'provider_first_name': 'Gregory',
+        'provider_last_name': 'House',
+        'location': 'PPTH Orthopedics',
+        'timestamp': SEARCH_TIMESTAMP,
+        'durations': POLICY_TABLE.durations,
+        'arrival': POLICY_TABLE.arrival,
+    } if template.startswith('fast_') else None
+    return lambda: Message.from_template(template, Role.SYSTEM, prompt_kwargs=kwargs)
+
+
+@benchmark('search_available_providers', providers=DIRECTORY_SIZES, query=tuple(SEARCH_QUERIES))
+def search_index(providers: int, query: str):
+    PROVIDER_INDEX.build(all_providers(provider_directory(providers)))
+    return lambda: search_available_providers(appointment_type='NEW', **SEARCH_QUERIES[query])
+
+
+@benchmark('search_fuzzy', providers=DIRECTORY_SIZES, query=('last_name', 'location'))
+def search_fuzzy(providers: int, query: str):
+    PROVIDER_INDEX.build(all_providers(provider_directory(providers)))
+    kwargs = {'last_name': 'Lsat42'} if query == 'last_name' else {'location': 'Departmnt 42'}
+    return lambda: search_available_providers(appointment_type='NEW', **kwargs)
+
+
+@benchmark('search_nearest', providers=DIRECTORY_SIZES, query=('all', 'specialty'))
+def search_nearest(providers: int, query: str):
+    PROVIDER_INDEX.build(all_providers(provider_directory(providers)), [NEAR])
+    kwargs = {'specialty': 'Orthopedics'} if query == 'specialty' else {}
+    return lambda: search_available_providers(appointment_type='NEW', near=NEAR.zip, **kwargs)
+
+
+@benchmark('find_earliest_slots', providers=DIRECTORY_SIZES, query=('last_name', 'specialty'))
+def earliest_slots(providers: int, query: str):
+    PROVIDER_INDEX.build(all_providers(provider_directory(providers)))
+    kwargs = {'last_name': 'Last42'} if query == 'last_name' else {'specialty': 'Orthopedics'}
+    return lambda: find_earliest_slots(appointment_type='NEW', after=SEARCH_TIMESTAMP, count=5, **kwargs)
+
+
+@benchmark('search_providers_sql', providers=DIRECTORY_SIZES, query=tuple(SEARCH_QUERIES))
+def search_sql(providers: int, query: str):
+    conn = provider_directory(providers)
+    kwargs = dict(SEARCH_QUERIES[query])
+    if 'timestamp' in kwargs:
+        kwargs.pop('timestamp')
+        kwargs.update(day=0, hour=10)
+    return lambda: search_providers(conn, duration=30, **kwargs)
+
+
+@benchmark('appointment_validate', appointments=SIZES)
+def appointment_validate(appointments: int):
+    records = appointment_records(appointments)
+    return lambda: [Appointment.model_validate(i).timestamp for i in records]
+
+
+def patient_payload(appointments: int) -> str:
+    """Patient record JSON in the EHR API's format."""
+    return json.dumps({
+        'id': 1,
+        'name': 'John Doe',
+        'dob': '01/01/1975',
+        'pcp': 'Dr. Meredith Grey',
+        'ehrId': '1234abcd',
+        'referred_providers': [
+            {'provider': 'House, Gregory MD', 'specialty': 'Orthopedics'},
+            {'specialty': 'Primary Care'},
+        ],
+        'appointments': appointment_records(appointments),
+    })
+
+
+@benchmark('patient_validate_json', appointments=SIZES)
+def patient_validate_json(appointments: int):
+    payload = patient_payload(appointments)
+    return lambda: Patient.model_validate_json(payload)
+
+
+@benchmark('patient_seen_since', appointments=SIZES)
+def patient_seen_since(appointments: int):
+    patient = Patient.model_validate_json(patient_payload(appointments))
+    since = datetime(2019, 10, 19)
+    return lambda: (patient.seen_since(since, provider='Gregory House'), patient.seen_since(since))
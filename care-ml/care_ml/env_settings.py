@@ -4,3 +4,78 @@ import os
 API_URL = os.getenv('API_URL')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DB_FILE = os.getenv('DB_FILE')
+
+# logging
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_JSON = os.getenv('LOG_JSON', 'true').lower() == 'true'
+
+# state shared between worker processes (set by care_ml.serve for more than one worker);
+# unset, caches, sessions and bookings live in each process
+SHARED_STATE_DIR = os.getenv('SHARED_STATE_DIR')
+SHARED_STATE_DB = os.path.join(SHARED_STATE_DIR, 'state.db') if SHARED_STATE_DIR else None
+
+# tool execution
+TOOL_WORKERS = int(os.getenv('TOOL_WORKERS', '8'))
+TOOL_TIMEOUT = float(os.getenv('TOOL_TIMEOUT', '20'))
+
+# EHR client
+EHR_CONNECT_TIMEOUT = float(os.getenv('EHR_CONNECT_TIMEOUT', '3'))
+EHR_READ_TIMEOUT = float(os.getenv('EHR_READ_TIMEOUT', '10'))
+EHR_MAX_CONNECTIONS = int(os.getenv('EHR_MAX_CONNECTIONS', '32'))
+EHR_MAX_KEEPALIVE = int(os.getenv('EHR_MAX_KEEPALIVE', '16'))
+EHR_MAX_RETRIES = int(os.getenv('EHR_MAX_RETRIES', '2'))
+EHR_RETRY_BACKOFF = float(os.getenv('EHR_RETRY_BACKOFF', '0.2'))
+
+# patient cache
+PATIENT_CACHE_SIZE = int(os.getenv('PATIENT_CACHE_SIZE', '1024'))
+PATIENT_CACHE_TTL = float(os.getenv('PATIENT_CACHE_TTL', '900'))
+
+# provider database
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+PROVIDER_INDEX_ENABLED = os.getenv('PROVIDER_INDEX_ENABLED', 'true').lower() == 'true'
+SLOT_SEARCH_DAYS = int(os.getenv('SLOT_SEARCH_DAYS', '60'))
+FUZZY_MIN_SCORE = float(os.getenv('FUZZY_MIN_SCORE', '0.5'))
+FUZZY_CANDIDATES = int(os.getenv('FUZZY_CANDIDATES', '3'))
+NEAREST_DEPARTMENTS = int(os.getenv('NEAREST_DEPARTMENTS', '5'))
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', '10'))
+PLACE_MIN_SCORE = float(os.getenv('PLACE_MIN_SCORE', '0.9'))
+
+# prompts
+PROMPTS_HOT_RELOAD = os.getenv('PROMPTS_HOT_RELOAD', 'false').lower() == 'true'
+
+# conversation sessions
+SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))
+SESSION_TTL = float(os.getenv('SESSION_TTL', '3600'))
+SESSION_SPILL_PATH = os.getenv('SESSION_SPILL_PATH')
+
+# prompt token budgets per pipeline stage (0 disables history compaction)
+TOOL_CALL_TOKEN_BUDGET = int(os.getenv('TOOL_CALL_TOKEN_BUDGET', '6000'))
+SUMMARIZATION_TOKEN_BUDGET = int(os.getenv('SUMMARIZATION_TOKEN_BUDGET', '6000'))
+
+# pipeline
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'two_stage')
+MAX_TOOL_STEPS = int(os.getenv('MAX_TOOL_STEPS', '4'))
+
+# completion cache
+COMPLETION_CACHE_ENABLED = os.getenv('COMPLETION_CACHE_ENABLED', 'true').lower() == 'true'
+COMPLETION_CACHE_SIZE = int(os.getenv('COMPLETION_CACHE_SIZE', '2048'))
+COMPLETION_CACHE_TTL = float(os.getenv('COMPLETION_CACHE_TTL', '3600'))
+COMPLETION_CACHE_PATH = os.getenv('COMPLETION_CACHE_PATH', SHARED_STATE_DB)
+COMPLETION_CACHE_STAGES = os.getenv('COMPLETION_CACHE_STAGES', 'tool_call,summarization,tool_loop').split(',')
+COMPLETION_CACHE_TOOL_CALLS = os.getenv('COMPLETION_CACHE_TOOL_CALLS', 'false').lower() == 'true'
+
+# local answers to static policy questions
+POLICY_FAST_PATH_ENABLED = os.getenv('POLICY_FAST_PATH_ENABLED', 'true').lower() == 'true'
+POLICY_MIN_CONFIDENCE = float(os.getenv('POLICY_MIN_CONFIDENCE', '0.8'))
+
+# request traces (for offline replay, see care_ml.replay)
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'false').lower() == 'true'
+TRACE_DIR = os.getenv('TRACE_DIR', 'traces')
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', '5'))
+
+# appointment bookings (an empty BOOKING_WAL_PATH keeps them in memory only)
+BOOKING_WAL_PATH = os.getenv('BOOKING_WAL_PATH', 'bookings.wal')
+BOOKING_WAL_FSYNC = os.getenv('BOOKING_WAL_FSYNC', 'false').lower() == 'true'
+BOOKING_LOCK_STRIPES = int(os.getenv('BOOKING_LOCK_STRIPES', '64'))
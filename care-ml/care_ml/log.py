@@ -0,0 +1,58 @@
+"""Non-blocking structured logging."""
+import json
+import logging
+import logging.handlers
+import queue
+from .env_settings import LOG_LEVEL, LOG_JSON
+
+# attributes every LogRecord has; anything else was passed in `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed in `extra`."""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **{key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES},
+        }
+
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
+def stream_handler() -> logging.StreamHandler:
+    """stderr handler with the configured (JSON or plain) format."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        JSONFormatter() if LOG_JSON
+        else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        )
+
+    return handler
+
+
+def setup_logging(name: str = 'care_ml') -> logging.handlers.QueueListener:
+    """Send the package's log records through a queue to a background thread,
+    so that logging on the request path never blocks on the stream.
+
+    Returns:
+        logging.handlers.QueueListener: Started listener; stop it on shutdown to flush
+    """
+    handler = stream_handler()
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+
+    logger = logging.getLogger(name)
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+    listener.start()
+    return listener
@@ -1,9 +1,54 @@
 """ML services."""
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from .routers.message import router as message_router
 from .routers.debug import router as debug_router
+from .routers.session import router as session_router
+from .ml.ehr_client import EHR_CLIENT
+from .ml.db import DB_POOL
+from .ml.provider_index import PROVIDER_INDEX
+from .ml.sessions import SESSIONS
+from .ml.completion_cache import COMPLETION_CACHE
+from .ml.timing import start_request, server_timing
+from .ml.trace import TRACER
+from .ml.booking import BOOKINGS
+from .log import setup_logging
+from .env_settings import PROVIDER_INDEX_ENABLED
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Open and release shared resources."""
+    log_listener = setup_logging()
+    DB_POOL.open()
+    BOOKINGS.open()
+    # already built if care_ml.serve preloaded it before forking this worker
+    if PROVIDER_INDEX_ENABLED and not PROVIDER_INDEX.ready:
+        PROVIDER_INDEX.load()
+    SESSIONS.purge()
+    if COMPLETION_CACHE.store:
+        COMPLETION_CACHE.store.purge()
+    yield
+    await EHR_CLIENT.aclose()
+    DB_POOL.close()
+    BOOKINGS.close()
+    SESSIONS.close()
+    COMPLETION_CACHE.close()
+    if TRACER:
+        TRACER.close()
+    log_listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware('http')
+async def timing(request: Request, call_next):
+    """Report per-stage durations of a request in a `Server-Timing` header."""
+    spans = start_request()
+    response = await call_next(request)
+    if spans:
+        response.headers['Server-Timing'] = server_timing(spans)
+    return response
 
 app.include_router(
     message_router,
@@ -11,6 +56,12 @@ app.include_router(
     tags=['message']
     )
 
+app.include_router(
+    session_router,
+    prefix='/session',
+    tags=['session']
+)
+
 app.include_router(
     debug_router,
     prefix='/debug',
@@ -0,0 +1,296 @@
+"""Appointment slot inventory."""
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from .policy import POLICY_TABLE
+from ..env_settings import BOOKING_WAL_PATH, BOOKING_WAL_FSYNC, BOOKING_LOCK_STRIPES
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+# appointment durations (minutes) by type, from the policy prompt; EXISTING is what the tools call ESTABLISHED
+APPOINTMENT_MINUTES = {**POLICY_TABLE.durations, 'EXISTING': POLICY_TABLE.durations['ESTABLISHED']}
+
+# optimistic reservation attempts before giving up on a contended day
+MAX_CAS_ATTEMPTS = 16
+
+# byte-range locks on the write-ahead log that (provider, day)s are spread over;
+# reservations of days in different ranges don't wait on each other
+LOG_LOCK_RANGES = 1 << 16
+
+
+def on_slot(ts: datetime) -> bool:
+    """Whether `ts` is the start of a 15-minute slot."""
+    return ts.minute % SLOT_MINUTES == 0 and not ts.second and not ts.microsecond
+
+
+def ends_by_midnight(ts: datetime, duration: int) -> bool:
+    """Whether an appointment at `ts` ends on the day it starts, so it has a `slot_mask`."""
+    return ts.hour * 60 + ts.minute + duration <= SLOTS_PER_DAY * SLOT_MINUTES
+
+
+def slot_mask(ts: datetime, duration: int) -> int:
+    """Bitmap of the 15-minute slots an appointment occupies on its day."""
+    start = (ts.hour * 60 + ts.minute) // SLOT_MINUTES
+    end = -(-(ts.hour * 60 + ts.minute + duration) // SLOT_MINUTES)
+    if not ends_by_midnight(ts, duration):
+        raise ValueError("Appointment must end on the day it starts")
+
+    return ((1 << (end - start)) - 1) << start
+
+
+class Booking(NamedTuple):
+    """Reserved appointment."""
+    id: str
+    provider_id: int
+    department: str
+    patient_id: int
+    start: datetime
+    duration: int
+
+
+class _Day(NamedTuple):
+    # occupancy of one provider on one day; replaced, never mutated
+    version: int
+    bitmap: int
+
+
+class BookingStore:
+    """Per-provider, per-day slot occupancy with optimistic check-and-reserve.
+
+    Each (provider, day) holds a versioned 96-bit bitmap of 15-minute slots.
+    A reservation reads the day without locking, checks for overlap and then
+    compare-and-swaps the new bitmap under one of `stripes` locks (chosen by
+    key), retrying if the day changed in between. Bookings for different
+    providers or days never contend. Providers are keyed without their
+    department, so a provider can't be booked in two places at once.
+
+    With `wal_path`, every reservation and cancellation is appended to a
+    write-ahead log (one JSON line per `os.write` on an O_APPEND descriptor),
+    and `open` replays it. Worker processes can share one log: a reservation
+    or cancellation locks its (provider, day) with an exclusive `lockf` on
+    one byte of the log (out of LOG_LOCK_RANGES) and first applies what other
+    processes appended, so a slot can't be booked twice while other days
+    are booked concurrently, and `refresh` brings reads up to date.
+
+    Args:
+        wal_path (Optional[str]): Write-ahead log file; in-memory only if None or empty
+        stripes (int): Lock stripes
+        fsync (bool): Whether to fsync the log after every write
+    """
+    def __init__(self, wal_path: Optional[str] = None, stripes: int = 64, fsync: bool = False):
+        self.wal_path = wal_path
+        self.fsync = fsync
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._days: Dict[Tuple[int, date], _Day] = {}
+        self._bookings: Dict[str, Booking] = {}
+        self._wal: Optional[int] = None
+        self._offset = 0
+        self._writer = ''
+        self._read_lock = threading.Lock()
+        self._write_locks = [threading.Lock() for _ in range(stripes)]
+        self.conflicts = 0
+        self.retries = 0
+
+    def _lock(self, key: Tuple[int, date]) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def open(self) -> None:
+        """Open and replay the write-ahead log."""
+        if not self.wal_path or self._wal is not None:
+            return
+
+        self._wal = os.open(self.wal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        # tags this process's log entries, so it doesn't apply them twice
+        self._writer = uuid.uuid4().hex
+        self._offset = 0
+        self.refresh()
+        logger.info("Replayed %s bookings from %s", len(self._bookings), self.wal_path)
+
+    def close(self) -> None:
+        """Close the write-ahead log."""
+        if self._wal is not None:
+            os.close(self._wal)
+            self._wal = None
+
+    def refresh(self) -> None:
+        """Apply the log entries other processes appended since the last refresh."""
+        if self._wal is None:
+            return
+
+        with self._read_lock:
+            size = os.fstat(self._wal).st_size
+            if size <= self._offset:
+                return
+
+            data = os.pread(self._wal, size - self._offset, self._offset)
+            # a line still being written is read on the next refresh
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                self._replay(line)
+            self._offset += end
+
+    def _replay(self, line: bytes) -> None:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            # a torn line from a crash mid-write
+            logger.warning("Skipping unreadable booking log line")
+            return
+
+        if entry.get('writer') == self._writer:
+            return
+
+        if entry['op'] == 'reserve':
+            booking = Booking(**{**entry['booking'], 'start': datetime.fromisoformat(entry['booking']['start'])})
+            self._apply(booking, reserve=True)
+        elif entry['op'] == 'cancel' and entry['id'] in self._bookings:
+            self._apply(self._bookings[entry['id']], reserve=False)
+
+    def _apply(self, booking: Booking, reserve: bool) -> None:
+        key = (booking.provider_id, booking.start.date())
+        mask = slot_mask(booking.start, booking.duration)
+        with self._lock(key):
+            day = self._days.get(key, _Day(0, 0))
+            self._days[key] = _Day(day.version + 1, day.bitmap | mask if reserve else day.bitmap & ~mask)
+        if reserve:
+            self._bookings[booking.id] = booking
+        else:
+            self._bookings.pop(booking.id, None)
+
+    @contextmanager
+    def _exclusive(self, key: Tuple[int, date]) -> Iterator[None]:
+        """Hold a (provider, day) against other threads' and processes' writes,
+        after applying what other processes logged. Without a log, writers only
+        synchronize through `_swap`."""
+        if self._wal is None:
+            yield
+            return
+
+        # the same byte for a key in every process (unlike `hash`, which is salted per process)
+        offset = (key[0] * 1_000_003 + key[1].toordinal()) % LOG_LOCK_RANGES
+        # record locks are held by the process, so its threads also take a lock of their own
+        with self._write_locks[offset % len(self._write_locks)]:
+            fcntl.lockf(self._wal, fcntl.LOCK_EX, 1, offset)
+            try:
+                self.refresh()
+                yield
+            finally:
+                fcntl.lockf(self._wal, fcntl.LOCK_UN, 1, offset)
+
+    def _log(self, entry: dict) -> None:
+        if self._wal is None:
+            return
+
+        entry = {**entry, 'writer': self._writer}
+        os.write(self._wal, (json.dumps(entry, default=str) + '\n').encode('utf-8'))
+        if self.fsync:
+            os.fsync(self._wal)
+
+    def is_free(self, provider_id: int, start: datetime, duration: int) -> bool:
+        """Whether none of the slots of an appointment are taken."""
+        day = self._days.get((provider_id, start.date()))
+        return day is None or not day.bitmap & slot_mask(start, duration)
+
+    def day(self, provider_id: int, day: date) -> int:
+        """Occupancy bitmap of a provider's day (bit i = slot starting at i * 15 minutes)."""
+        return self._days.get((provider_id, day), _Day(0, 0)).bitmap
+
+    def _swap(self, key: Tuple[int, date], update) -> Optional[_Day]:
+        """Optimistically replace a day with `update(day)`; None if `update` refuses."""
+        for _ in range(MAX_CAS_ATTEMPTS):
+            day = self._days.get(key, _Day(0, 0))
+            bitmap = update(day.bitmap)
+            if bitmap is None:
+                return None
+
+            with self._lock(key):
+                if self._days.get(key, _Day(0, 0)).version == day.version:
+                    new = _Day(day.version + 1, bitmap)
+                    self._days[key] = new
+                    return new
+
+            self.retries += 1
+
+        raise RuntimeError(f"Too much contention booking {key}")
+
+    def reserve(
+        self,
+        provider_id: int,
+        department: str,
+        patient_id: int,
+        start: datetime,
+        duration: int,
+        ) -> Optional[Booking]:
+        """Atomically reserve the slots of an appointment.
+
+        Args:
+            provider_id (int): Provider
+            department (str): Department name
+            patient_id (int): Patient
+            start (datetime): Appointment start
+            duration (int): Minutes
+
+        Returns:
+            Optional[Booking]: Booking, or None if a slot is already taken
+        """
+        mask = slot_mask(start, duration)
+        key = (provider_id, start.date())
+        booking = Booking(uuid.uuid4().hex, provider_id, department, patient_id, start, duration)
+
+        def take(bitmap: int) -> Optional[int]:
+            return None if bitmap & mask else bitmap | mask
+
+        with self._exclusive(key):
+            if self._swap(key, take) is None:
+                self.conflicts += 1
+                return None
+
+            self._bookings[booking.id] = booking
+            self._log({'op': 'reserve', 'time': time.time(), 'booking': booking._asdict()})
+
+        return booking
+
+    def cancel(self, booking_id: str) -> bool:
+        """Release a booking's slots; False if there is no such booking."""
+        self.refresh()
+        booking = self._bookings.get(booking_id)
+        if booking is None:
+            return False
+
+        with self._exclusive((booking.provider_id, booking.start.date())):
+            # another process may have cancelled it meanwhile
+            if self._bookings.pop(booking_id, None) is None:
+                return False
+
+            mask = slot_mask(booking.start, booking.duration)
+            self._swap((booking.provider_id, booking.start.date()), lambda bitmap: bitmap & ~mask)
+            self._log({'op': 'cancel', 'time': time.time(), 'id': booking_id})
+
+        return True
+
+    def bookings(self, patient_id: Optional[int] = None) -> Iterator[Booking]:
+        """Current bookings, optionally of one patient."""
+        return (i for i in list(self._bookings.values()) if patient_id is None or i.patient_id == patient_id)
+
+    def stats(self) -> dict:
+        """Booking counts."""
+        return {
+            'bookings': len(self._bookings),
+            'days': len(self._days),
+            'conflicts': self.conflicts,
+            'retries': self.retries,
+            'wal': self.wal_path,
+        }
+
+
+BOOKINGS = BookingStore(BOOKING_WAL_PATH, stripes=BOOKING_LOCK_STRIPES, fsync=BOOKING_WAL_FSYNC)
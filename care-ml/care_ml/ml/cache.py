@@ -0,0 +1,102 @@
+"""In-process caches."""
+from typing import Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+import threading
+import time
+from collections import OrderedDict
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe bounded cache with per-entry TTL and LRU eviction.
+
+    Args:
+        maxsize (int): Maximum number of entries
+        ttl (float): Seconds an entry stays valid after it was set
+        on_evict (Optional[Callable[[K, V], None]]): Called with entries evicted
+            to make room (not with expired or invalidated ones)
+    """
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        on_evict: Optional[Callable[[K, V], None]] = None
+        ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: K, count: bool = True) -> Optional[V]:
+        """Get a live entry, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = None
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        """Set an entry, evicting the least recently used one if full."""
+        evicted = []
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                evicted_key, (expires, evicted_value) = self._data.popitem(last=False)
+                if expires >= time.monotonic():
+                    evicted.append((evicted_key, evicted_value))
+
+        if self.on_evict:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def items(self) -> List[Tuple[K, V]]:
+        """Snapshot of live entries, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires, value) in self._data.items() if expires >= now]
+
+    def invalidate(self, key: K) -> None:
+        """Drop an entry."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Size and hit/miss counters."""
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,152 @@
+"""Deterministic LLM completion cache."""
+from typing import Dict, Iterable, Optional
+import hashlib
+import json
+import time
+from collections import defaultdict
+from .cache import TTLCache
+from .shared import SQLiteFile
+from ..env_settings import (
+    COMPLETION_CACHE_ENABLED,
+    COMPLETION_CACHE_SIZE,
+    COMPLETION_CACHE_TTL,
+    COMPLETION_CACHE_PATH,
+    COMPLETION_CACHE_STAGES,
+    COMPLETION_CACHE_TOOL_CALLS,
+)
+
+
+def completion_key(stage: str, params: dict) -> str:
+    """Stable hash of a pipeline stage and its completion request
+    (model, sampling parameters, tool schemas and rendered messages)."""
+    payload = json.dumps(
+        {'stage': stage, **params},
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=str,
+        )
+
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CompletionStore:
+    """SQLite tier of the completion cache, shareable between worker processes.
+
+    Args:
+        path (str): SQLite database file
+        ttl (float): Seconds an entry stays valid
+    """
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._db = SQLiteFile(path, (
+            'CREATE TABLE IF NOT EXISTS completions '
+            '(key TEXT PRIMARY KEY, message TEXT NOT NULL, expires_at REAL NOT NULL)',
+            ))
+
+    def get(self, key: str) -> Optional[dict]:
+        """Live entry, or None."""
+        rows = self._db.execute(
+            'SELECT message FROM completions WHERE key = ? AND expires_at >= ?',
+            (key, time.time()),
+            )
+
+        return json.loads(rows[0][0]) if rows else None
+
+    def set(self, key: str, message: dict) -> None:
+        """Store an entry."""
+        self._db.execute(
+            'INSERT OR REPLACE INTO completions VALUES (?, ?, ?)',
+            (key, json.dumps(message), time.time() + self.ttl),
+            )
+
+    def purge(self) -> None:
+        """Drop expired entries."""
+        self._db.execute('DELETE FROM completions WHERE expires_at < ?', (time.time(),))
+
+    def close(self) -> None:
+        """Close the file."""
+        self._db.close()
+
+
+class CompletionCache:
+    """Two-tier cache of completion messages keyed by `completion_key`.
+
+    Only runs at temperature 0 are deterministic enough to replay, so callers
+    should only consult it for those. Completions that call tools are not
+    stored unless `cache_tool_calls` is set, so a patient-specific action is
+    never replayed from cache.
+
+    Args:
+        maxsize (int): In-memory entries
+        ttl (float): Seconds an entry stays valid
+        stages (Iterable[str]): Pipeline stages that may use the cache
+        cache_tool_calls (bool): Whether completions with tool calls are stored
+        store (Optional[CompletionStore]): Shared on-disk tier
+    """
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stages: Iterable[str],
+        cache_tool_calls: bool = False,
+        store: Optional[CompletionStore] = None,
+        ):
+        self.stages = frozenset(stages)
+        self.cache_tool_calls = cache_tool_calls
+        self.store = store
+        self._memory: TTLCache[str, dict] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def enabled(self, stage: str) -> bool:
+        """Whether a stage uses the cache."""
+        return stage in self.stages
+
+    def get(self, stage: str, key: str) -> Optional[dict]:
+        """Cached completion message (as a dict), or None."""
+        message = self._memory.get(key)
+
+        if message is None and self.store:
+            message = self.store.get(key)
+            if message is not None:
+                self._memory.set(key, message)
+
+        self._counts[stage]['hits' if message is not None else 'misses'] += 1
+
+        return message
+
+    def set(self, key: str, message: dict) -> None:
+        """Store a completion message, unless it calls tools and those are not cached."""
+        if message.get('tool_calls') and not self.cache_tool_calls:
+            return
+
+        self._memory.set(key, message)
+
+        if self.store:
+            self.store.set(key, message)
+
+    def stats(self) -> Dict[str, dict]:
+        """Hit rates per stage."""
+        return {
+            stage: {
+                **counts,
+                'hit_rate': counts['hits'] / (counts['hits'] + counts['misses'])
+                    if counts['hits'] + counts['misses'] else 0.0,
+            }
+            for stage, counts in self._counts.items()
+        }
+
+    def close(self) -> None:
+        """Close the on-disk tier."""
+        if self.store:
+            self.store.close()
+
+
+COMPLETION_CACHE = CompletionCache(
+    maxsize=COMPLETION_CACHE_SIZE,
+    ttl=COMPLETION_CACHE_TTL,
+    stages=COMPLETION_CACHE_STAGES if COMPLETION_CACHE_ENABLED else (),
+    cache_tool_calls=COMPLETION_CACHE_TOOL_CALLS,
+    store=CompletionStore(COMPLETION_CACHE_PATH, ttl=COMPLETION_CACHE_TTL)
+        if COMPLETION_CACHE_ENABLED and COMPLETION_CACHE_PATH else None,
+    )
@@ -1,13 +1,103 @@
 """Database."""
+from typing import Iterator, Optional
+import logging
+import queue
+import threading
 from contextlib import contextmanager
 import duckdb
-from ..env_settings import DB_FILE
+from ..env_settings import DB_FILE, DB_POOL_SIZE, DB_POOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Process-wide read-only DuckDB connection handing out pooled cursors.
+
+    The database is opened once; each cursor is a separate DuckDB connection to
+    the same database instance and is used by one thread at a time.
+
+    Args:
+        database (str): Database file
+        size (int): Number of cursors
+        timeout (float): Seconds to wait for a free cursor
+    """
+    def __init__(self, database: Optional[str], size: int, timeout: float):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._conn: Optional[duckdb.DuckDBPyConnection] = None
+        self._cursors: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the database is open."""
+        return self._conn is not None
+
+    def open(self) -> None:
+        """Open the database and fill the pool. No-op if already open."""
+        with self._lock:
+            if self._conn is not None:
+                return
+
+            self._conn = duckdb.connect(database=self.database, read_only=True)
+            for _ in range(self.size):
+                self._cursors.put_nowait(self._conn.cursor())
+
+            logger.info("Opened %s with %s cursors", self.database, self.size)
+
+    def close(self) -> None:
+        """Close all cursors and the database."""
+        with self._lock:
+            if self._conn is None:
+                return
+
+            while not self._cursors.empty():
+                self._cursors.get_nowait().close()
+
+            self._conn.close()
+            self._conn = None
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Check out a cursor, opening the database on first use.
+
+        Raises:
+            TimeoutError: if no cursor frees up within the pool timeout
+        """
+        if self._conn is None:
+            self.open()
+
+        try:
+            cur = self._cursors.get(timeout=self.timeout)
+        except queue.Empty as err:
+            raise TimeoutError(f"No database cursor available after {self.timeout}s") from err
+
+        try:
+            yield cur
+        except duckdb.Error:
+            # don't hand a cursor in an unknown state to the next caller
+            cur.close()
+            cur = self._conn.cursor()
+            raise
+        finally:
+            self._cursors.put_nowait(cur)
+
+    def healthy(self) -> bool:
+        """Run a trivial query on a pooled cursor."""
+        try:
+            with self.cursor() as cur:
+                return cur.execute('SELECT 1').fetchone() == (1,)
+        except (duckdb.Error, TimeoutError) as err:
+            logger.error("Database health check failed: %s", err)
+            return False
+
+
+DB_POOL = ConnectionPool(DB_FILE, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+
 
 @contextmanager
-def init_db():
-    """Initialize database."""
-    try:
-        conn = duckdb.connect(database=DB_FILE)
-        yield conn
-    finally:
-        conn.close()
+def init_db() -> Iterator[duckdb.DuckDBPyConnection]:
+    """Check out a cursor from the shared connection pool."""
+    with DB_POOL.cursor() as cur:
+        yield cur
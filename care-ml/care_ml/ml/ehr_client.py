@@ -0,0 +1,115 @@
+"""Pooled async EHR API client."""
+import asyncio
+import logging
+import random
+from functools import cached_property
+from typing import List, Optional
+import httpx
+from pydantic import BaseModel
+from .timing import span
+from ..env_settings import (
+    API_URL,
+    EHR_CONNECT_TIMEOUT,
+    EHR_READ_TIMEOUT,
+    EHR_MAX_CONNECTIONS,
+    EHR_MAX_KEEPALIVE,
+    EHR_MAX_RETRIES,
+    EHR_RETRY_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EHRClient(BaseModel):
+    """Async EHR client sharing one keep-alive connection pool across requests."""
+    base_url: str = API_URL or ''
+    connect_timeout: float = EHR_CONNECT_TIMEOUT
+    read_timeout: float = EHR_READ_TIMEOUT
+    max_connections: int = EHR_MAX_CONNECTIONS
+    max_keepalive: int = EHR_MAX_KEEPALIVE
+    max_retries: int = EHR_MAX_RETRIES
+    retry_backoff: float = EHR_RETRY_BACKOFF
+
+    @cached_property
+    def http_client(self) -> httpx.AsyncClient:
+        """HTTP client."""
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(
+                self.read_timeout,
+                connect=self.connect_timeout,
+                ),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                ),
+            )
+
+    async def _backoff(self, attempt: int) -> None:
+        # full jitter so that concurrent retries don't hit the API in lockstep
+        await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    async def get(self, path: str, params: Optional[dict] = None) -> httpx.Response:
+        """GET request, retried with jittered backoff on 5xx and transport errors.
+
+        Args:
+            path (str): Path relative to the EHR API base URL
+            params (Optional[dict]): Query parameters
+
+        Raises:
+            err: HTTPStatusError if request fails
+
+        Returns:
+            httpx.Response: Response
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+
+            try:
+                with span('ehr'):
+                    response = await self.http_client.get(path, params=params)
+            except httpx.TransportError as err:
+                if last_attempt:
+                    raise err
+                logger.warning("EHR request %s failed (%s), retrying", path, err)
+                await self._backoff(attempt)
+                continue
+
+            if response.status_code >= 500 and not last_attempt:
+                logger.warning("EHR request %s returned %s, retrying", path, response.status_code)
+                await self._backoff(attempt)
+                continue
+
+            break
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as err:
+            logger.error(
+                "[%s] %s",
+                response.status_code,
+                response.text
+                )
+            raise err
+
+        return response
+
+    async def get_patient(self, idx: int) -> dict:
+        """Get raw patient record by ID."""
+        response = await self.get(f"/patient/{idx}")
+
+        return response.json()
+
+    async def search_patients(self, name: str, dob: str) -> List[dict]:
+        """Get raw records of the patients with a full name and date of birth (MM/DD/YYYY)."""
+        response = await self.get("/patient/search", params={'name': name, 'dob': dob})
+
+        return response.json()
+
+    async def aclose(self) -> None:
+        """Close the connection pool."""
+        if 'http_client' in self.__dict__:
+            await self.__dict__.pop('http_client').aclose()
+
+
+EHR_CLIENT = EHRClient()
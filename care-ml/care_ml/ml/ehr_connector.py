@@ -1,12 +1,18 @@
 """EHR System Connector."""
-from typing import List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
+import bisect
 import logging
 import re
+from collections import defaultdict
+from functools import lru_cache
 from datetime import datetime, time, timedelta
 from enum import StrEnum
-import requests
-from pydantic import BaseModel, Field
-from ..env_settings import API_URL
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+from .ehr_client import EHR_CLIENT
+from .cache import TTLCache
+from .shared import SharedCache
+from .trace import record, tracing
+from ..env_settings import PATIENT_CACHE_SIZE, PATIENT_CACHE_TTL, SHARED_STATE_DB
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +22,13 @@ def subtract_minutes_from_time(t: time, minutes: int) -> time:
 
     return dt.time()
 
+DATE_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{2})$')
+TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})([ap]m)$')
+
+# name parts that are not part of a provider's first or last name
+PROVIDER_TITLES = frozenset({'dr', 'md', 'do', 'np', 'fnp', 'pa', 'phd', 'rn'})
+
+@lru_cache(maxsize=8192)
 def convert_to_timestamp(date_str: str, time_str: str) -> datetime:
     """
     Convert date string (MM/DD/YY) and time string (H:MMam/pm) to a timestamp.
@@ -30,32 +43,40 @@ def convert_to_timestamp(date_str: str, time_str: str) -> datetime:
     Raises:
         ValueError: If date or time format is invalid
     """
-    # Validate date format
-    if not re.match(r'^\d{1,2}/\d{1,2}/\d{2}$', date_str):
+    date_match = DATE_PATTERN.match(date_str)
+    if not date_match:
         raise ValueError("Date must be in format MM/DD/YY")
-    
-    # Validate time format
-    if not re.match(r'^\d{1,2}:\d{2}[ap]m$', time_str.lower()):
+
+    time_match = TIME_PATTERN.match(time_str.lower())
+    if not time_match:
         raise ValueError("Time must be in format H:MMam or H:MMpm")
-    
-    # Parse date components
-    month, day, year = map(int, date_str.split('/'))
-    year = 2000 + year if year < 100 else year  # Convert 2-digit year to 4-digit
-    
-    # Parse time components
-    time_str = time_str.lower()
-    hour, minute = time_str[:-2].split(':')
-    hour = int(hour)
-    minute = int(minute)
-    
+
+    month, day, year = map(int, date_match.groups())
+    year = 2000 + year  # Convert 2-digit year to 4-digit
+
+    hour, minute = int(time_match.group(1)), int(time_match.group(2))
+
     # Adjust hour for PM
-    if 'pm' in time_str and hour != 12:
+    if time_match.group(3) == 'pm' and hour != 12:
         hour += 12
-    elif 'am' in time_str and hour == 12:
+    elif time_match.group(3) == 'am' and hour == 12:
         hour = 0
-        
+
     return datetime(year, month, day, hour, minute)
 
+@lru_cache(maxsize=1024)
+def normalize_provider_name(name: str) -> str:
+    """Lowercased "first last" form of a provider name, without titles.
+
+    Handles both "Dr. Gregory House" and "House, Gregory MD".
+    """
+    if ',' in name:
+        last, _, first = name.partition(',')
+        name = f"{first} {last}"
+
+    parts = (part.strip('.').lower() for part in name.split())
+    return ' '.join(part for part in parts if part and part not in PROVIDER_TITLES)
+
 class Status(StrEnum):
     """Appointment status."""
     BOOKED = "booked"
@@ -81,37 +102,35 @@ class Appointment(BaseModel):
     time: str
     provider: str
     status: str
+    # parsed from `date` and `time` once, at validation; not part of the record
+    timestamp: datetime = Field(default=None, exclude=True, repr=False)
 
-    @property
-    def timestamp(self) -> datetime:
-        """Parse date and time and return a datetime object. Used Claude for this."""
-        # Validate date format
-        date_str = self.date
-        time_str = self.time
-        if not re.match(r'^\d{1,2}/\d{1,2}/\d{2}$', date_str):
-            raise ValueError("Date must be in format MM/DD/YY")
-
-        # Validate time format
-        if not re.match(r'^\d{1,2}:\d{2}[ap]m$', time_str.lower()):
-            raise ValueError("Time must be in format H:MMam or H:MMpm")
+    @model_validator(mode='before')
+    @classmethod
+    def parse_timestamp(cls, data: Any) -> Any:
+        """Parse `date` and `time`, so malformed values fail validation."""
+        if isinstance(data, dict) and 'date' in data and 'time' in data:
+            data = {**data, 'timestamp': convert_to_timestamp(data['date'], data['time'])}
 
-        # Parse date components
-        month, day, year = map(int, date_str.split('/'))
-        year = 2000 + year if year < 100 else year  # Convert 2-digit year to 4-digit
+        return data
 
-        # Parse time components
-        time_str = time_str.lower()
-        hour, minute = time_str[:-2].split(':')
-        hour = int(hour)
-        minute = int(minute)
 
-        # Adjust hour for PM
-        if 'pm' in time_str and hour != 12:
-            hour += 12
-        elif 'am' in time_str and hour == 12:
-            hour = 0
+class AppointmentHistory(NamedTuple):
+    """Sorted appointment times, overall and by normalized provider name."""
+    times: List[datetime]
+    by_provider: Dict[str, List[datetime]]
 
-        return datetime(year, month, day, hour, minute)
+    @classmethod
+    def build(cls, appointments: List[Appointment]) -> 'AppointmentHistory':
+        """Index appointments."""
+        by_provider = defaultdict(list)
+        for appt in appointments:
+            by_provider[normalize_provider_name(appt.provider)].append(appt.timestamp)
+
+        return cls(
+            times=sorted(appt.timestamp for appt in appointments),
+            by_provider={name: sorted(times) for name, times in by_provider.items()},
+            )
 
 
 class Patient(BaseModel):
@@ -123,33 +142,95 @@ class Patient(BaseModel):
     ehr_id: str = Field(alias="ehrId")
     referred_providers: List[Referral]
     appointments: List[Appointment]
+    _history: AppointmentHistory = PrivateAttr()
+
+    def model_post_init(self, __context) -> None:
+        self._history = AppointmentHistory.build(self.appointments)
+
+    def seen_since(self, since: datetime, provider: Optional[str] = None) -> bool:
+        """Whether the patient has an appointment after `since`, optionally with a provider.
+
+        Args:
+            since (datetime): Earliest time (exclusive)
+            provider (Optional[str]): Provider name, in any form `normalize_provider_name` handles
+
+        Returns:
+            bool: Whether there is such an appointment
+        """
+        if provider is None:
+            times = self._history.times
+        else:
+            times = self._history.by_provider.get(normalize_provider_name(provider), [])
+
+        return bisect.bisect_right(times, since) < len(times)
 
     @classmethod
-    def get_by_id(cls, idx: int) -> 'Patient':
-        """Get patient by ID
+    async def get_by_id(cls, idx: int) -> 'Patient':
+        """Get patient by ID, served from PATIENT_CACHE when possible.
 
         Args:
             idx (int): Patient ID
 
         Raises:
-            err: HTTPError if request fails
+            err: HTTPStatusError if request fails
 
         Returns:
             Patient: Patient object
         """
-        response = requests.get(
-            f"{API_URL}/patient/{idx}",
-            timeout=30,
-            )
+        patient = PATIENT_CACHE.get(idx)
+        cached = patient is not None
+
+        if not cached:
+            patient = cls(**await EHR_CLIENT.get_patient(idx))
+            PATIENT_CACHE.set(idx, patient)
 
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            logger.error(
-                "[%s] %s",
-                response.status_code,
-                response.text
-                )
-            raise err
-
-        return cls(**response.json())
+        if tracing():
+            record('ehr', patient_id=idx, record=patient.model_dump(by_alias=True), cached=cached)
+        return patient
+
+    @classmethod
+    async def find(cls, name: str, dob: str) -> List['Patient']:
+        """Find patients by name and date of birth, caching them in PATIENT_CACHE.
+
+        Args:
+            name (str): Full name, case insensitive
+            dob (str): Date of birth, MM/DD/YYYY
+
+        Raises:
+            err: HTTPStatusError if request fails
+
+        Returns:
+            List[Patient]: Matching patients, by ID
+        """
+        records = await EHR_CLIENT.search_patients(name, dob)
+        patients = [cls(**i) for i in records]
+
+        for patient in patients:
+            PATIENT_CACHE.set(patient.id, patient)
+
+        if tracing():
+            record('ehr_search', name=name, dob=dob, records=records)
+        return patients
+
+    @staticmethod
+    def invalidate(idx: int) -> None:
+        """Drop a cached patient record, e.g. after it was changed by a booking."""
+        PATIENT_CACHE.invalidate(idx)
+
+
+# parsed patient records by patient ID; shared by worker processes with SHARED_STATE_DB,
+# so a booking's invalidation reaches all of them, with the parsed records also kept in each process
+if SHARED_STATE_DB:
+    PATIENT_CACHE: SharedCache[int, Patient] = SharedCache(
+        SHARED_STATE_DB,
+        'patient',
+        ttl=PATIENT_CACHE_TTL,
+        dumps=lambda patient: patient.model_dump_json(by_alias=True),
+        loads=Patient.model_validate_json,
+        local_size=PATIENT_CACHE_SIZE,
+        )
+else:
+    PATIENT_CACHE: TTLCache[int, Patient] = TTLCache(
+        maxsize=PATIENT_CACHE_SIZE,
+        ttl=PATIENT_CACHE_TTL,
+        )
@@ -0,0 +1,84 @@
+"""Tool executor."""
+from typing import Any, Callable, Dict, List, Tuple
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field
+from .timing import span
+from .trace import record
+from ..env_settings import TOOL_WORKERS, TOOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# bounded pool for tools that do blocking I/O (EHR requests, DuckDB queries)
+TOOL_POOL = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix='tool')
+
+
+async def run_blocking(fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+    """Run a blocking function on the tool thread pool without blocking the event loop.
+
+    The function runs in a copy of the caller's context, so it records timing
+    spans for the current request.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(TOOL_POOL, functools.partial(context.run, fn, *args, **kwargs))
+
+
+class ToolExecutor(BaseModel):
+    """Runs the tool calls of a single completion concurrently.
+
+    Coroutine tools are awaited directly; plain functions are sent to the
+    bounded tool thread pool. Every call is bounded by its own timeout.
+    """
+    tool_map: Dict[str, Callable[..., Any]]
+    timeouts: Dict[str, float] = Field(default_factory=dict)
+    default_timeout: float = TOOL_TIMEOUT
+
+    async def run(self, fn_name: str, arguments: dict) -> Any:
+        """Run a single tool call.
+
+        Args:
+            fn_name (str): Tool name
+            arguments (dict): Tool arguments
+
+        Returns:
+            Any: Tool result, or an error message if the tool timed out
+        """
+        fn = self.tool_map[fn_name]
+        timeout = self.timeouts.get(fn_name, self.default_timeout)
+
+        if inspect.iscoroutinefunction(fn):
+            call = fn(**arguments)
+        else:
+            call = run_blocking(fn, **arguments)
+
+        try:
+            with span('tool', tool=fn_name):
+                result = await asyncio.wait_for(call, timeout=timeout)
+        except asyncio.TimeoutError:
+            # the worker thread of a blocking tool can't be interrupted, but we stop waiting on it
+            logger.error("Tool call %s timed out after %ss", fn_name, timeout)
+            result = f'{fn_name} timed out. Try again.'
+
+        record('tool', name=fn_name, arguments=arguments, result=result)
+        return result
+
+    async def __call__(self, calls: List[Tuple[str, dict]]) -> List[Tuple[str, Any]]:
+        """Run tool calls concurrently.
+
+        Args:
+            calls (List[Tuple[str, dict]]): (tool name, arguments) pairs
+
+        Returns:
+            List[Tuple[str, Any]]: (tool name, result) pairs, in the order they were given
+        """
+        with span('tools'):
+            results = await asyncio.gather(
+                *(self.run(fn_name, arguments) for fn_name, arguments in calls)
+                )
+
+        return [(fn_name, result) for (fn_name, _), result in zip(calls, results)]
@@ -0,0 +1,150 @@
+"""Fuzzy matching of provider directory names."""
+from typing import Dict, Iterable, List, Set, Tuple
+import itertools
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from .ehr_connector import PROVIDER_TITLES
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+# shortest query word matched as a prefix ("ortho" -> "orthopedics")
+MIN_PREFIX = 3
+
+# names sharing the most trigrams with a query that are scored, and of those,
+# also compared by edit similarity
+SCORED = 50
+RERANK = 10
+
+# trigrams in more than this share of names (and at least COMMON_MIN names) don't
+# pick candidates, unless a query has no other trigrams
+COMMON_SHARE = 0.05
+COMMON_MIN = 32
+
+# common ways of asking for a specialty, by specialty
+SPECIALTY_ALIASES = {
+    'orthopedics': ('ortho', 'orthopaedics', 'orthopedic', 'orthopedist', 'orthopaedic', 'bone and joint'),
+    'primary care': ('primary', 'pcp', 'gp', 'general practice', 'general practitioner', 'family medicine',
+                     'family practice', 'family doctor', 'internal medicine'),
+    'surgery': ('surgeon', 'surgical', 'general surgery'),
+}
+
+# words that don't tell department names apart
+GENERIC_WORDS = frozenset({
+    'hospital', 'department', 'clinic', 'center', 'centre', 'medical', 'health', 'care', 'the', 'of', 'and',
+})
+
+
+def normalize(text: str) -> str:
+    """Lowercase words of a name without punctuation or titles ("Dr. House" -> "house")."""
+    return ' '.join(word for word in WORD_PATTERN.findall(text.lower()) if word not in PROVIDER_TITLES)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so word starts and ends count."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def department_aliases(names: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+    """Department names without their generic words ("jefferson hospital" -> "jefferson"), by name."""
+    aliases = {}
+
+    for name in names:
+        core = ' '.join(word for word in normalize(name).split() if word not in GENERIC_WORDS)
+        if core and core != normalize(name):
+            aliases[name] = (core,)
+
+    return aliases
+
+
+class FuzzyIndex:
+    """Trigram and word index over a set of names.
+
+    A query is normalized and looked up in the alias table first (score 1).
+    Otherwise the names sharing the most (reasonably rare) trigrams with it
+    are scored by the
+    largest of their trigram Dice coefficient, their word overlap (query
+    words that equal, or with at least three letters begin, a word of the
+    name) and, for the closest few, their edit similarity, so misspellings,
+    swapped letters, partial names and extra words all still match.
+
+    Args:
+        names (Iterable[str]): Names to match, returned as given
+        aliases (Dict[str, Iterable[str]]): Alternative names, by name
+    """
+    def __init__(self, names: Iterable[str], aliases: Dict[str, Iterable[str]] = None):
+        self.names: List[str] = []
+        self._normalized: List[str] = []
+        self._words: List[Set[str]] = []
+        self._trigrams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._aliases: Dict[str, Set[int]] = defaultdict(set)
+
+        for i, name in enumerate(dict.fromkeys(names)):
+            normalized = normalize(name)
+            grams = trigrams(normalized)
+            self.names.append(name)
+            self._normalized.append(normalized)
+            self._words.append(set(normalized.split()))
+            self._trigrams.append(grams)
+            for gram in grams:
+                self._postings[gram].append(i)
+
+            self._aliases[normalized].add(i)
+            for alias in (aliases or {}).get(name, ()):
+                self._aliases[normalize(alias)].add(i)
+
+        self._common = max(COMMON_MIN, int(len(self.names) * COMMON_SHARE))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _word_score(self, words: List[str], i: int) -> float:
+        name_words = self._words[i]
+        matched = 0.0
+
+        for word in words:
+            if word in name_words:
+                matched += 1
+            elif len(word) >= MIN_PREFIX and any(j.startswith(word) for j in name_words):
+                matched += 0.8
+
+        return 0.5 + 0.5 * matched / max(len(words), len(name_words)) if matched else 0.0
+
+    def match(self, query: str, limit: int = 5, min_score: float = 0.5) -> List[Tuple[str, float]]:
+        """Names similar to `query`.
+
+        Args:
+            query (str): Name as typed
+            limit (int): Most names to return
+            min_score (float): Lowest score to return, between 0 and 1
+
+        Returns:
+            List[Tuple[str, float]]: Names and scores, best first
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        aliased = self._aliases.get(normalized)
+        if aliased:
+            return sorted((self.names[i], 1.0) for i in aliased)[:limit]
+
+        grams = trigrams(normalized)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        rare = [i for i in postings if len(i) <= self._common]
+        shared = Counter(itertools.chain.from_iterable(rare or postings))
+        words = normalized.split()
+
+        scores = []
+        for rank, (i, _) in enumerate(shared.most_common(SCORED)):
+            dice = 2 * len(grams & self._trigrams[i]) / (len(grams) + len(self._trigrams[i]))
+            score = max(dice, self._word_score(words, i))
+            if rank < RERANK:
+                score = max(score, SequenceMatcher(None, normalized, self._normalized[i]).ratio())
+            if score >= min_score:
+                scores.append((-score, self.names[i]))
+
+        scores.sort()
+        return [(name, round(-score, 3)) for score, name in scores[:limit]]
@@ -0,0 +1,217 @@
+"""Places and nearest-department search."""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import heapq
+import math
+import re
+from collections import defaultdict
+from .fuzzy import FuzzyIndex
+from .queries import ZipCode
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.05
+
+# grid cell side; a few miles keeps cells small in cities and few statewide
+GRID_CELL_MILES = 5.0
+
+# candidate sets up to this size are searched exhaustively rather than on the grid
+EXHAUSTIVE_MAX = 64
+
+ZIP_PATTERN = re.compile(r'^\s*(\d{5})(-\d{4})?\s*$')
+PLACE_PATTERN = re.compile(r'^(.*?)[\s,]+([a-z]{2})$')
+
+Point = Tuple[float, float]
+
+
+class Place(NamedTuple):
+    """Resolved ZIP code or city."""
+    name: str
+    point: Point
+
+
+def haversine_miles(a: Point, b: Point) -> float:
+    """Great-circle distance between two (latitude, longitude) points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+def city_key(city: str) -> str:
+    """Lowercase words of a city name ("Winston-Salem" -> "winston salem")."""
+    return ' '.join(re.findall(r'[a-z0-9]+', city.lower()))
+
+
+class Places:
+    """Resolves a ZIP code or city ("27401", "Greensboro", "Greensboro, NC")
+    to coordinates, from a ZIP code centroid table.
+
+    Cities are located at the mean of their ZIP code centroids; a city name
+    without a state goes to the state with the most ZIP codes of that name.
+    A misspelled city name is only resolved if it is at least `min_score`
+    similar to a known one, as a looser match is as likely another city
+    ("Boston" is not "Boone"); `candidates` suggests those.
+
+    Args:
+        zip_codes (Iterable[ZipCode]): ZIP code centroids
+        min_score (float): Lowest fuzzy score a misspelled city is resolved at
+    """
+    def __init__(self, zip_codes: Iterable[ZipCode], min_score: float = 0.9):
+        self.min_score = min_score
+        self.by_zip: Dict[str, Place] = {}
+        centroids = defaultdict(list)
+        names = {}
+
+        for row in zip_codes:
+            self.by_zip[row.zip] = Place(f"{row.zip} ({row.city}, {row.state})", (row.latitude, row.longitude))
+            key = city_key(row.city), row.state.lower()
+            centroids[key].append((row.latitude, row.longitude))
+            names.setdefault(key, f"{row.city}, {row.state}")
+
+        self.by_city: Dict[Tuple[str, str], Place] = {
+            key: Place(
+                names[key],
+                (sum(i[0] for i in points) / len(points), sum(i[1] for i in points) / len(points)),
+                )
+            for key, points in centroids.items()
+            }
+
+        # state of each city name with the most ZIP codes
+        self.by_name: Dict[str, str] = {}
+        for (city, state), points in sorted(centroids.items(), key=lambda item: len(item[1])):
+            self.by_name[city] = state
+        self.cities = FuzzyIndex(self.by_name)
+
+    def __len__(self) -> int:
+        return len(self.by_zip)
+
+    def locate(self, place: str) -> Optional[Place]:
+        """A ZIP code or city, or None if it is unknown or only loosely matches a city."""
+        match = ZIP_PATTERN.match(place)
+        if match:
+            return self.by_zip.get(match.group(1))
+
+        key = city_key(place)
+        match = PLACE_PATTERN.match(key)
+        if match and (match.group(1), match.group(2)) in self.by_city:
+            return self.by_city[match.group(1), match.group(2)]
+        if match and match.group(1) in self.by_name:
+            # an unknown state, e.g. a typo; trust the city name
+            key = match.group(1)
+
+        if key not in self.by_name:
+            found = self.cities.match(match.group(1) if match else key, limit=1, min_score=self.min_score)
+            if not found:
+                return None
+            key = found[0][0]
+
+        return self.by_city[key, self.by_name[key]]
+
+    def candidates(self, place: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Names of the cities most similar to a place, with their scores, best first."""
+        key = city_key(place)
+        match = PLACE_PATTERN.match(key)
+
+        return [
+            (self.by_city[name, self.by_name[name]].name, score)
+            for name, score in self.cities.match(match.group(1) if match else key, limit=limit)
+            ]
+
+
+class GridIndex:
+    """Uniform grid over points, for k-nearest searches.
+
+    Points are projected to miles on a plane at their mean latitude, which
+    is accurate to about a percent across a state. A search scans rings of
+    cells outwards from the query's cell until the next ring can't hold
+    anything closer than the 2k-th point found, then ranks those 2k by
+    great-circle distance.
+
+    Args:
+        points (Iterable[Tuple[int, float, float]]): Point ID, latitude and longitude
+        cell_miles (float): Grid cell side
+    """
+    def __init__(self, points: Iterable[Tuple[int, float, float]], cell_miles: float = GRID_CELL_MILES):
+        points = list(points)
+        self.cell_miles = cell_miles
+        self.locations: Dict[int, Point] = {i: (lat, lon) for i, lat, lon in points}
+        mean_latitude = sum(lat for _, lat, _ in points) / len(points) if points else 0.0
+        self._x_scale = MILES_PER_DEGREE * math.cos(math.radians(mean_latitude))
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = defaultdict(list)
+
+        for i, lat, lon in points:
+            x, y = self._project(lat, lon)
+            self._cells[self._cell(x, y)].append((i, x, y))
+
+        self._cells = dict(self._cells)
+        self._bounds = (
+            min((cell[0] for cell in self._cells), default=0),
+            max((cell[0] for cell in self._cells), default=0),
+            min((cell[1] for cell in self._cells), default=0),
+            max((cell[1] for cell in self._cells), default=0),
+            )
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def _project(self, lat: float, lon: float) -> Point:
+        return lon * self._x_scale, lat * MILES_PER_DEGREE
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_miles), math.floor(y / self.cell_miles)
+
+    def _ring(self, cx: int, cy: int, radius: int) -> Iterable[Tuple[int, int]]:
+        if radius == 0:
+            yield cx, cy
+            return
+
+        for dx in range(-radius, radius + 1):
+            yield cx + dx, cy - radius
+            yield cx + dx, cy + radius
+        for dy in range(-radius + 1, radius):
+            yield cx - radius, cy + dy
+            yield cx + radius, cy + dy
+
+    def nearest(self, location: Point, k: int, allowed: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """The k points nearest to a location.
+
+        Args:
+            location (Point): Latitude and longitude
+            k (int): Points to return
+            allowed (Optional[Set[int]]): Only consider these point IDs
+
+        Returns:
+            List[Tuple[int, float]]: Point IDs and their distances in miles, nearest first
+        """
+        qx, qy = self._project(*location)
+        # max-heap of the 2k nearest so far (by planar distance), as (-distance, -id)
+        best: List[Tuple[float, int]] = []
+        pool = 2 * k
+
+        def consider(i: int, x: float, y: float) -> None:
+            item = (-math.hypot(x - qx, y - qy), -i)
+            if len(best) < pool:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+
+        if allowed is not None and len(allowed) <= EXHAUSTIVE_MAX:
+            for i in allowed:
+                if i in self.locations:
+                    consider(i, *self._project(*self.locations[i]))
+        else:
+            cx, cy = self._cell(qx, qy)
+            min_x, max_x, min_y, max_y = self._bounds
+            last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+
+            for radius in range(last_ring + 1):
+                for cell in self._ring(cx, cy, radius):
+                    for i, x, y in self._cells.get(cell, ()):
+                        if allowed is None or i in allowed:
+                            consider(i, x, y)
+
+                # anything in later rings is at least `radius` cells away
+                if len(best) == pool and -best[0][0] <= radius * self.cell_miles:
+                    break
+
+        distances = sorted((haversine_miles(location, self.locations[-i]), -i) for _, i in best)
+        return [(i, round(distance, 1)) for distance, i in distances[:k]]
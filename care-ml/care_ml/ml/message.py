@@ -1,13 +1,68 @@
 """Message models."""
-from typing import List, Optional
+from typing import Dict, List, Optional
+import math
 from functools import cached_property
-from importlib import resources as ir
 from enum import StrEnum
 import jinja2 as j2
 from pydantic import BaseModel, RootModel
+from ..env_settings import PROMPTS_HOT_RELOAD
 
-JINJA_ENV = j2.Environment()
 PROMPTS_PATH = 'care_ml.prompts'
+TOOL_CALLS_TAG = '[TOOL CALLS]'
+
+# rough token estimate: ~4 characters per token plus per-message overhead
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# tool results up to this many characters survive compaction as-is
+SHORT_TOOL_RESULT_CHARS = 120
+
+
+class TemplateRegistry:
+    """Prompt templates of a package, loaded and compiled once.
+
+    Renders without kwargs are memoized, so static prompts are the exact same
+    string on every request. With `auto_reload`, edited templates are picked up
+    on the next render (dev mode).
+
+    Args:
+        package (str): Dotted path of the package holding the `.j2` templates
+        auto_reload (bool): Whether to check templates for changes on every render
+    """
+    def __init__(self, package: str, auto_reload: bool = False):
+        package_name, package_path = package.rsplit('.', 1)
+        self.auto_reload = auto_reload
+        self.env = j2.Environment(
+            loader=j2.PackageLoader(package_name, package_path),
+            auto_reload=auto_reload,
+            cache_size=-1,
+            )
+        self._static: Dict[str, tuple] = {}
+
+        for name in self.env.list_templates(extensions=['j2']):
+            self.env.get_template(name)
+
+    def get(self, template_id: str) -> j2.Template:
+        """Compiled template."""
+        return self.env.get_template(f"{template_id}.j2")
+
+    def render(self, template_id: str, prompt_kwargs: Optional[dict] = None) -> str:
+        """Render template."""
+        if prompt_kwargs:
+            return self.get(template_id).render(prompt_kwargs)
+
+        static = self._static.get(template_id)
+
+        if static is None or self.auto_reload:
+            template = self.get(template_id)
+            if static is None or static[0] is not template:
+                static = (template, template.render())
+                self._static[template_id] = static
+
+        return static[1]
+
+
+PROMPTS = TemplateRegistry(PROMPTS_PATH, auto_reload=PROMPTS_HOT_RELOAD)
 
 class Role(StrEnum):
     """Message role"""
@@ -21,6 +76,28 @@ class Message(BaseModel):
     content: str
     role: Role
 
+    @cached_property
+    def token_count(self) -> int:
+        """Estimated prompt tokens, computed once per message."""
+        return MESSAGE_OVERHEAD_TOKENS + math.ceil(len(self.content) / CHARS_PER_TOKEN)
+
+    @property
+    def is_tool_calls(self) -> bool:
+        """Whether this message holds flattened tool call results."""
+        return self.content.startswith(TOOL_CALLS_TAG)
+
+    def collapse_tool_calls(self) -> 'Message':
+        """Keep the tool names and short results of a tool call message, drop long results."""
+        lines = [TOOL_CALLS_TAG]
+
+        for line in self.content.splitlines()[1:]:
+            fn_name, _, result = line.partition(': ')
+            if len(result) > SHORT_TOOL_RESULT_CHARS:
+                result = '[stale result omitted]'
+            lines.append(f"{fn_name}: {result}")
+
+        return Message(role=self.role, content='\n'.join(lines))
+
     def switch(self) -> 'Message':
         """Switch role."""
         if self.role == Role.USER:
@@ -37,14 +114,7 @@ class Message(BaseModel):
         prompt_kwargs: Optional[dict] = None
         ) -> 'Message':
         """New message from template."""
-        with ir.path(PROMPTS_PATH, f"{template_id}.j2") as path:
-            text = (
-                JINJA_ENV
-                .from_string(path.read_text(encoding='utf-8'))
-                .render(prompt_kwargs or {})
-                )
-
-        return Message(role=role, content=text)
+        return Message(role=role, content=PROMPTS.render(template_id, prompt_kwargs))
 
 
 class ChatHistory(RootModel[List[Message]]):
@@ -67,31 +137,89 @@ class ChatHistory(RootModel[List[Message]]):
         """Switch role of all messages in history."""
         return ChatHistory([i.switch() for i in iter(self.root)])
 
+    def compact(self, budget: int) -> List[Message]:
+        """Messages that fit into a token budget, by a deterministic policy.
+
+        If the history is over budget, first the results of every tool call
+        message but the latest are collapsed (oldest first), then the oldest
+        messages are dropped and replaced by a note. The latest message is
+        always kept.
+
+        Args:
+            budget (int): Token budget for the history
+
+        Returns:
+            List[Message]: Compacted messages
+        """
+        messages = list(self.root)
+        total = sum(i.token_count for i in messages)
+
+        if total <= budget:
+            return messages
+
+        tool_calls = [i for i, message in enumerate(messages) if message.is_tool_calls]
+
+        for i in tool_calls[:-1]:
+            if total <= budget:
+                break
+            collapsed = messages[i].collapse_tool_calls()
+            total -= messages[i].token_count - collapsed.token_count
+            messages[i] = collapsed
+
+        dropped = 0
+        while total > budget and dropped < len(messages) - 1:
+            total -= messages[dropped].token_count
+            dropped += 1
+
+        if dropped:
+            note = Message(
+                role=Role.USER,
+                content=f"[EARLIER CONVERSATION OMITTED: {dropped} messages]"
+                )
+            messages = [note, *messages[dropped:]]
+
+        return messages
+
     def render(
         self,
         system_prompt_id: Optional[str] = None,
         system_kwargs: Optional[dict] = None,
         user_prompt_id: Optional[str] = None,
-        user_kwargs: Optional[dict] = None
+        user_kwargs: Optional[dict] = None,
+        token_budget: Optional[int] = None
         ) -> List[dict]:
-        """Add system message to history."""
+        """Add system message to history.
+
+        With `token_budget`, the history is compacted so that the whole prompt
+        fits into roughly that many tokens.
+        """
         messages = []
+        system_message = user_message = None
 
         if system_prompt_id:
-            messages.append(
-                Message
-                .from_template(system_prompt_id, Role.SYSTEM, prompt_kwargs=system_kwargs)
-                .model_dump()
+            system_message = Message.from_template(
+                system_prompt_id,
+                Role.SYSTEM,
+                prompt_kwargs=system_kwargs
                 )
-
-        if self.root:
-            messages.extend(self.model_dump())
+            messages.append(system_message.model_dump())
 
         if user_prompt_id:
-            messages.append(
-                Message
-                .from_template(user_prompt_id, Role.USER, prompt_kwargs=user_kwargs)
-                .model_dump()
+            user_message = Message.from_template(
+                user_prompt_id,
+                Role.USER,
+                prompt_kwargs=user_kwargs
+                )
+
+        if self.root and token_budget:
+            budget = token_budget - sum(
+                i.token_count for i in (system_message, user_message) if i is not None
                 )
+            messages.extend(i.model_dump() for i in self.compact(budget))
+        elif self.root:
+            messages.extend(self.model_dump())
+
+        if user_message:
+            messages.append(user_message.model_dump())
 
         return messages
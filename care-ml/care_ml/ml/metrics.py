@@ -0,0 +1,101 @@
+"""In-process metrics in the Prometheus text format."""
+from typing import Dict, List, Sequence, Tuple
+import bisect
+import threading
+
+# seconds; covers sub-millisecond local work up to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(key: LabelKey, **extra: str) -> str:
+    pairs = [*key, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+        )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels."""
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Add to the series of `labels`."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        """Prometheus text lines."""
+        with self._lock:
+            values = dict(self._values)
+
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            *(f"{self.name}{_labels(key)} {value}" for key, value in sorted(values.items())),
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # per series: bucket counts (non-cumulative, last one is +Inf), sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record a value in the series of `labels`."""
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def expose(self) -> List[str]:
+        """Prometheus text lines."""
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key, le=str(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+
+        return lines
+
+
+SPAN_SECONDS = Histogram(
+    'care_ml_span_seconds',
+    'Duration of pipeline spans (prompt render, completions, tools, EHR requests, database queries).',
+    )
+LLM_TOKENS = Counter(
+    'care_ml_llm_tokens_total',
+    'Tokens used by completions, by pipeline stage and kind (prompt or completion).',
+    )
+
+METRICS = [SPAN_SECONDS, LLM_TOKENS]
+
+
+def expose() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
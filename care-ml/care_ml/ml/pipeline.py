@@ -1,15 +1,114 @@
 """Pipeline."""
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 import json
+import logging
 from functools import cached_property
 from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletionMessage
 from pydantic import BaseModel
-from .message import Message, ChatHistory, Role
-from .tools import TOOL_CALL_MAP, CONFIRM_NAME_DOB, SEARCH_PROVIDER, BOOK_APPOINTMENT
-from ..env_settings import OPENAI_API_KEY
+from .message import Message, ChatHistory, Role, TOOL_CALLS_TAG, PROMPTS
+from .tools import (
+    TOOL_CALL_MAP,
+    TOOL_TIMEOUTS,
+    FAST_PATH_TEMPLATES,
+    CONFIRM_NAME_DOB,
+    SEARCH_PROVIDER,
+    FIND_EARLIEST_SLOTS,
+    BOOK_APPOINTMENT,
+)
+from .executor import ToolExecutor
+from .completion_cache import COMPLETION_CACHE, completion_key
+from .policy import POLICY, POLICY_TABLE
+from .timing import span
+from .metrics import LLM_TOKENS
+from .trace import record, tracing
+from ..env_settings import (
+    OPENAI_API_KEY,
+    TOOL_CALL_TOKEN_BUDGET,
+    SUMMARIZATION_TOKEN_BUDGET,
+    PIPELINE_MODE,
+    MAX_TOOL_STEPS,
+)
+
+COMPLETION_PARAMS = {
+    'model': 'gpt-4o',
+    'temperature': 0,
+    'top_p': 1,
+    'max_tokens': 512,
+}
+
+TOOLS = [CONFIRM_NAME_DOB, SEARCH_PROVIDER, FIND_EARLIEST_SLOTS, BOOK_APPOINTMENT]
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEvent(BaseModel):
+    """Pipeline stream event.
+
+    `status` events report progress, `token` events carry a piece of the
+    response and the final `done` event carries the full response message.
+    """
+    event: str
+    data: dict
+
+
+class ToolCall(BaseModel):
+    """Tool call requested by a completion."""
+    id: str
+    name: str
+    arguments: str
+
+    def to_openai(self) -> dict:
+        """Tool call as it appears in an assistant message."""
+        return {
+            'id': self.id,
+            'type': 'function',
+            'function': {'name': self.name, 'arguments': self.arguments},
+        }
+
+
+def record_usage(stage: str, usage: Optional[CompletionUsage]) -> None:
+    """Count the tokens a completion used."""
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens, stage=stage, kind='prompt')
+        LLM_TOKENS.inc(usage.completion_tokens, stage=stage, kind='completion')
+
+
+def render(history: ChatHistory, **kwargs) -> List[dict]:
+    """Render a prompt (see `ChatHistory.render`), timed as the `render` span."""
+    with span('render'):
+        return history.render(**kwargs)
+
+
+def fast_path_reply(tool_calls: List[ToolCall], results: List[Tuple[str, Any]]) -> Optional[str]:
+    """Templated reply for a single tool call with a deterministic outcome, if there is one."""
+    if len(tool_calls) != 1:
+        return None
+
+    (fn_name, result), = results
+    template_id = FAST_PATH_TEMPLATES.get((fn_name, result)) if isinstance(result, str) else None
+
+    if template_id is None:
+        return None
+
+    # durations and arrival times come from the same policy table as the system prompts
+    kwargs = {'durations': POLICY_TABLE.durations, 'arrival': POLICY_TABLE.arrival}
+
+    return PROMPTS.render(template_id, {**kwargs, **json.loads(tool_calls[0].arguments)})
+
 
 class Pipeline(BaseModel):
-    """"ML pipeline class."""
+    """"ML pipeline class.
+
+    In `two_stage` mode, one completion picks tools and a second, separate
+    completion summarizes their results. In `single_loop` mode, tool results
+    are fed back to the same conversation as tool messages until the model
+    answers, for at most `max_tool_steps` completions.
+    """
+    mode: Literal['two_stage', 'single_loop'] = PIPELINE_MODE
+    max_tool_steps: int = MAX_TOOL_STEPS
+
     @cached_property
     def openai_client(self) -> AsyncOpenAI:
         """OpenAI client."""
@@ -19,87 +118,376 @@ class Pipeline(BaseModel):
             max_retries=2,
         )
 
+    @cached_property
+    def tool_executor(self) -> ToolExecutor:
+        """Tool executor."""
+        return ToolExecutor(tool_map=TOOL_CALL_MAP, timeouts=TOOL_TIMEOUTS)
+
+    async def run_tools(self, tool_calls: List[Tuple[str, str]]) -> Message:
+        """Run tool calls and flatten their results into a [TOOL CALLS] message.
+
+        Args:
+            tool_calls (List[Tuple[str, str]]): (tool name, JSON arguments) pairs
+
+        Returns:
+            Message: Tool call results
+        """
+        data = await self.tool_executor(
+            [(fn_name, json.loads(arguments)) for fn_name, arguments in tool_calls]
+            )
+        msg = '\n'.join(f"{fn_name}: {result}" for fn_name, result in data)
+
+        return Message(content=f"{TOOL_CALLS_TAG}\n{msg}", role=Role.ASSISTANT)
+
+    async def complete(self, stage: str, messages: List[dict], **kwargs) -> ChatCompletionMessage:
+        """Chat completion for a pipeline stage, served from the completion cache when possible.
+
+        Args:
+            stage (str): Pipeline stage
+            messages (List[dict]): Rendered messages
+            **kwargs: Extra completion parameters (tools, tool_choice)
+
+        Returns:
+            ChatCompletionMessage: Completion message
+        """
+        params = {'messages': messages, **kwargs, **COMPLETION_PARAMS}
+        key = completion_key(stage, params) if COMPLETION_CACHE.enabled(stage) else None
+        cached = COMPLETION_CACHE.get(stage, key) if key else None
+
+        if cached is not None:
+            record('llm', stage=stage, request=params, response=cached, cached=True)
+            return ChatCompletionMessage.model_validate(cached)
+
+        with span(stage):
+            completion = await self.openai_client.chat.completions.create(**params)
+        record_usage(stage, completion.usage)
+        message = completion.choices[0].message
+        if tracing():
+            record('llm', stage=stage, request=params, response=message.model_dump(exclude_none=True), cached=False)
+
+        if key:
+            COMPLETION_CACHE.set(key, message.model_dump(exclude_none=True))
+
+        return message
+
     async def tool_call(self, messages: ChatHistory) -> ChatHistory:
         """Call method for tool call."""
-        completion = await (
-            self
-            .openai_client
-            .chat
-            .completions
-            .create(
-                messages=messages.render(system_prompt_id='tool_call_system'),
-                model='gpt-4o',
-                temperature=0,
-                top_p=1,
-                max_tokens=512,
-                tools=[CONFIRM_NAME_DOB, SEARCH_PROVIDER, BOOK_APPOINTMENT]
+        reply = await self.complete(
+            'tool_call',
+            render(
+                messages,
+                system_prompt_id='tool_call_system',
+                token_budget=TOOL_CALL_TOKEN_BUDGET
+                ),
+            tools=TOOLS,
             )
-        )
 
         new_messages = messages
 
-        if completion.choices[0].message.tool_calls:
-            data = []
-            for tool_call in completion.choices[0].message.tool_calls:
-                fn_name = tool_call.function.name
-                arguments = json.loads(tool_call.function.arguments)
-                data.append(
-                    (
-                        fn_name,
-                        TOOL_CALL_MAP[fn_name](**arguments)
-                        )
-                    )
-            msg = '\n'.join(f"{fn_name}: {result}" for fn_name, result in data)
+        if reply.tool_calls:
             new_messages.append(
-                Message(content=f"[TOOL CALLS]\n{msg}", role=Role.ASSISTANT)
+                await self.run_tools(
+                    [
+                        (tool_call.function.name, tool_call.function.arguments)
+                        for tool_call in reply.tool_calls
+                        ]
+                    )
                 )
         else:
             new_messages.append(
                 Message(
-                    content=completion.choices[0].message.content,
+                    content=reply.content,
                     role=Role.ASSISTANT
                     )
                 )
 
-        print(new_messages[-1].content)
+        logger.debug("Tool call stage result", extra={'content': new_messages[-1].content})
         return new_messages
 
     async def summarization_call(self, messages: ChatHistory) -> ChatHistory:
         """Call method for summarization call."""
-        completion = await (
-            self
-            .openai_client
-            .chat
-            .completions
-            .create(
-                messages=messages.render(system_prompt_id='summarization_system'),
-                model='gpt-4o',
-                temperature=0,
-                top_p=1,
-                max_tokens=512,
+        reply = await self.complete(
+            'summarization',
+            render(
+                messages,
+                system_prompt_id='summarization_system',
+                token_budget=SUMMARIZATION_TOKEN_BUDGET
+                ),
             )
-        )
 
         new_messages = messages
 
         new_messages.append(
             Message(
-                content=completion.choices[0].message.content,
+                content=reply.content,
                 role=Role.ASSISTANT
             )
         )
 
         return new_messages
 
+    async def _run_loop_tools(self, rendered: List[dict], tool_calls: List[ToolCall]) -> Optional[str]:
+        """Run the tool calls of a loop step.
+
+        Returns a templated reply if the outcome is deterministic, otherwise
+        appends the tool calls and their results to `rendered` and returns None.
+        """
+        results = await self.tool_executor(
+            [(tool_call.name, json.loads(tool_call.arguments)) for tool_call in tool_calls]
+            )
+        reply = fast_path_reply(tool_calls, results)
+
+        if reply is None:
+            rendered.append(
+                {
+                    'role': 'assistant',
+                    'content': None,
+                    'tool_calls': [tool_call.to_openai() for tool_call in tool_calls],
+                }
+                )
+            rendered.extend(
+                {'role': 'tool', 'tool_call_id': tool_call.id, 'content': f"{result}"}
+                for tool_call, (_, result) in zip(tool_calls, results)
+                )
+
+        return reply
+
+    async def tool_loop(self, messages: ChatHistory) -> Message:
+        """Call method for single-loop mode."""
+        rendered = render(
+            messages,
+            system_prompt_id='tool_call_system',
+            token_budget=TOOL_CALL_TOKEN_BUDGET
+            )
+
+        for step in range(self.max_tool_steps):
+            reply = await self.complete(
+                'tool_loop',
+                rendered,
+                tools=TOOLS,
+                # the last step must answer
+                tool_choice='none' if step == self.max_tool_steps - 1 else 'auto',
+                )
+
+            if not reply.tool_calls:
+                return Message(content=reply.content or '', role=Role.ASSISTANT)
+
+            content = await self._run_loop_tools(
+                rendered,
+                [
+                    ToolCall(id=i.id, name=i.function.name, arguments=i.function.arguments)
+                    for i in reply.tool_calls
+                    ]
+                )
+
+            if content is not None:
+                return Message(content=content, role=Role.ASSISTANT)
+
+        raise RuntimeError(f"No answer after {self.max_tool_steps} tool steps")
+
+    def policy_answer(self, messages: List[Message]) -> Optional[Message]:
+        """Local answer to a static policy question in the last message, if confident."""
+        if POLICY is None or not messages:
+            return None
+
+        with span('policy'):
+            return POLICY.answer(messages[-1])
+
     async def __call__(self, messages: List[Message]) -> Message:
         """Call method for pipeline."""
+        answer = self.policy_answer(messages)
+        if answer is not None:
+            return answer
+
         history = ChatHistory(messages)
 
+        if self.mode == 'single_loop':
+            return await self.tool_loop(history)
+
         # run tool call
         history = await self.tool_call(history)
 
         # if tool calls were ran, run summarization
-        if '[TOOL CALLS]' in history[-1].content:
+        if TOOL_CALLS_TAG in history[-1].content:
             history = await self.summarization_call(history.switch())
 
         return history[-1]
+
+    async def _stream_completion(
+        self,
+        stage: str,
+        rendered: List[dict],
+        content: List[str],
+        tool_calls: Dict[int, ToolCall],
+        **kwargs
+        ) -> AsyncIterator[StreamEvent]:
+        """Stream a completion, yielding response tokens and collecting its text
+        into `content` and its tool calls into `tool_calls`.
+
+        A cached completion is replayed as a single token event. The assembled
+        message is recorded in the request's trace like a non-streamed one.
+        """
+        params = {'messages': rendered, **kwargs, **COMPLETION_PARAMS}
+        key = completion_key(stage, params) if COMPLETION_CACHE.enabled(stage) else None
+        cached = COMPLETION_CACHE.get(stage, key) if key else None
+
+        if cached is not None:
+            record('llm', stage=stage, request=params, response=cached, cached=True)
+            for i, tool_call in enumerate(cached.get('tool_calls') or []):
+                tool_calls[i] = ToolCall(
+                    id=tool_call['id'],
+                    name=tool_call['function']['name'],
+                    arguments=tool_call['function']['arguments'],
+                    )
+            if cached.get('content') and not tool_calls:
+                content.append(cached['content'])
+                yield StreamEvent(event='token', data={'content': cached['content']})
+            return
+
+        with span(stage):
+            async for event in self._stream_chunks(stage, params, content, tool_calls):
+                yield event
+
+        message = {
+            'role': 'assistant',
+            'content': None if tool_calls else ''.join(content),
+            'tool_calls': [tool_calls[i].to_openai() for i in sorted(tool_calls)],
+        }
+        record('llm', stage=stage, request=params, response=message, cached=False)
+
+        if key:
+            COMPLETION_CACHE.set(key, message)
+
+    async def _stream_chunks(
+        self,
+        stage: str,
+        params: dict,
+        content: List[str],
+        tool_calls: Dict[int, ToolCall]
+        ) -> AsyncIterator[StreamEvent]:
+        chunks = await self.openai_client.chat.completions.create(
+            stream=True,
+            stream_options={'include_usage': True},
+            **params
+            )
+
+        async for chunk in chunks:
+            # usage comes in a final chunk without choices
+            record_usage(stage, chunk.usage)
+            if not chunk.choices:
+                continue
+
+            delta = chunk.choices[0].delta
+
+            for delta_call in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    delta_call.index,
+                    ToolCall(id='', name='', arguments='')
+                    )
+                tool_call.id += delta_call.id or ''
+                tool_call.name += delta_call.function.name or ''
+                tool_call.arguments += delta_call.function.arguments or ''
+
+            # once the model starts calling tools, its text is not the response
+            if delta.content and not tool_calls:
+                content.append(delta.content)
+                yield StreamEvent(event='token', data={'content': delta.content})
+
+    async def _stream_two_stage(self, history: ChatHistory) -> AsyncIterator[StreamEvent]:
+        content, tool_calls = [], {}
+
+        yield StreamEvent(event='status', data={'stage': 'tool_call'})
+        async for event in self._stream_completion(
+            'tool_call',
+            render(
+                history,
+                system_prompt_id='tool_call_system',
+                token_budget=TOOL_CALL_TOKEN_BUDGET
+                ),
+            content,
+            tool_calls,
+            tools=TOOLS,
+            ):
+            yield event
+
+        if tool_calls:
+            calls = [tool_calls[i] for i in sorted(tool_calls)]
+            yield StreamEvent(
+                event='status',
+                data={'stage': 'tools', 'tools': [i.name for i in calls]}
+                )
+            history.append(await self.run_tools([(i.name, i.arguments) for i in calls]))
+
+            content = []
+            yield StreamEvent(event='status', data={'stage': 'summarization'})
+            async for event in self._stream_completion(
+                'summarization',
+                render(
+                    history.switch(),
+                    system_prompt_id='summarization_system',
+                    token_budget=SUMMARIZATION_TOKEN_BUDGET
+                    ),
+                content,
+                {},
+                ):
+                yield event
+
+        message = Message(content=''.join(content), role=Role.ASSISTANT)
+        yield StreamEvent(event='done', data={'message': message.model_dump()})
+
+    async def _stream_loop(self, history: ChatHistory) -> AsyncIterator[StreamEvent]:
+        rendered = render(
+            history,
+            system_prompt_id='tool_call_system',
+            token_budget=TOOL_CALL_TOKEN_BUDGET
+            )
+
+        for step in range(self.max_tool_steps):
+            content, tool_calls = [], {}
+
+            yield StreamEvent(event='status', data={'stage': 'tool_call', 'step': step})
+            async for event in self._stream_completion(
+                'tool_loop',
+                rendered,
+                content,
+                tool_calls,
+                tools=TOOLS,
+                tool_choice='none' if step == self.max_tool_steps - 1 else 'auto',
+                ):
+                yield event
+
+            if not tool_calls:
+                break
+
+            calls = [tool_calls[i] for i in sorted(tool_calls)]
+            yield StreamEvent(
+                event='status',
+                data={'stage': 'tools', 'tools': [i.name for i in calls]}
+                )
+            reply = await self._run_loop_tools(rendered, calls)
+
+            if reply is not None:
+                content = [reply]
+                yield StreamEvent(event='token', data={'content': reply})
+                break
+
+        message = Message(content=''.join(content), role=Role.ASSISTANT)
+        yield StreamEvent(event='done', data={'message': message.model_dump()})
+
+    async def stream(self, messages: List[Message]) -> AsyncIterator[StreamEvent]:
+        """Streaming version of the pipeline.
+
+        Tokens of the user-facing response are yielded as they arrive, with
+        status events as stages start and tools run.
+        """
+        answer = self.policy_answer(messages)
+        if answer is not None:
+            yield StreamEvent(event='token', data={'content': answer.content})
+            yield StreamEvent(event='done', data={'message': answer.model_dump()})
+            return
+
+        history = ChatHistory(messages)
+        events = self._stream_loop(history) if self.mode == 'single_loop' else self._stream_two_stage(history)
+
+        async for event in events:
+            yield event
@@ -0,0 +1,188 @@
+"""Local answerer for static policy questions."""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import re
+from pydantic import BaseModel
+from .message import Message, Role, PROMPTS
+from ..env_settings import POLICY_FAST_PATH_ENABLED, POLICY_MIN_CONFIDENCE
+
+# prompt the policy table is extracted from; both system prompts include it
+POLICY_SOURCE_TEMPLATE = 'policy'
+
+# anything that hints at a specific patient, their history or status, a booking or a
+# medical question goes to the LLM
+VETO_PATTERN = re.compile(
+    r"\d|\b(book|schedul\w*|reschedul\w*|cancel\w*|appointment for|he|she|his|her|him|"
+    r"they|them|their|covered|cover|procedure|medication|symptom\w*|pain|"
+    r"(the|this|that|my|our|your|a) patient|patient's|dr|doctor|mr|mrs|ms|"
+    r"been|seen|seeing|yet|already|still|late|last|history|wait ?list\w*|going up|increas\w*|chang\w*|status)\b",
+    re.IGNORECASE,
+    )
+
+# openers stripped before matching a question ("Hi, quick question: ...")
+LEAD_PATTERN = re.compile(r"^((hi|hello|hey|ok|okay|thanks) )*((can|could) you tell me |quick question )?")
+
+# messages longer than this are likely about more than one thing
+MAX_WORDS = 20
+
+
+class PolicyTable(BaseModel):
+    """Static policy facts stated in the system prompts."""
+    insurances: List[str]
+    self_pay: Dict[str, int]
+    durations: Dict[str, int]
+    arrival: Dict[str, int]
+
+    @staticmethod
+    def _section(text: str, header: str) -> List[str]:
+        """Bullet items listed under a `header:` line."""
+        lines = text.splitlines()
+        start = next(i for i, line in enumerate(lines) if line.strip() == f"{header}:")
+        items = []
+
+        for line in lines[start + 1:]:
+            if not line.strip().startswith('- '):
+                break
+            items.append(line.strip()[2:])
+
+        return items
+
+    @classmethod
+    def from_template(cls, template_id: str = POLICY_SOURCE_TEMPLATE) -> 'PolicyTable':
+        """Extract the policy table from the policy prompt, so the prompt stays the single source."""
+        text = PROMPTS.render(template_id)
+
+        self_pay = {}
+        for item in cls._section(text, 'Self-pay'):
+            specialty, _, price = item.partition(':')
+            self_pay[specialty.strip()] = int(price.strip().lstrip('$'))
+
+        durations = {
+            appointment_type: int(minutes)
+            for appointment_type, minutes in re.findall(
+                r"(NEW|ESTABLISHED) appointment is (\d+) minutes long", text
+                )
+        }
+
+        arrival = {}
+        for item in cls._section(text, 'Arrival'):
+            minutes = re.search(r"(\d+) minutes", item)
+            if minutes:
+                arrival['NEW' if item.lower().startswith('new') else 'ESTABLISHED'] = int(minutes.group(1))
+
+        return cls(
+            insurances=cls._section(text, 'Accepted Insurances'),
+            self_pay=self_pay,
+            durations=durations,
+            arrival=arrival,
+            )
+
+
+class Intent(NamedTuple):
+    """Policy question intent; `pattern` must match the whole question, in `question_form`."""
+    name: str
+    pattern: re.Pattern
+
+
+def question_form(text: str) -> str:
+    """Lowercase words of a message, without punctuation and openers ("Hi! How long is a NEW visit?"
+    -> "how long is a new visit")."""
+    return LEAD_PATTERN.sub('', ' '.join(re.findall(r"[a-z0-9'$-]+", text.lower().replace('\u2019', "'"))))
+
+
+# parts of the questions the intents match
+_INSURER = r"(medicaid|united( health( ?care)?)?|blue cross( blue shield)?( of north carolina)?|bcbs|aetna|cigna)"
+_CLINIC = r"(you|you all|the clinic|the office|this clinic|this office)"
+_VISIT = (r"((a|an|the) )?((new|established) (patient )?)?"
+          r"((primary care|orthopedics?|orthopaedics?|ortho|surgery|surgical)( (visit|appointment|consult)s?)?"
+          r"|(visit|appointment|consult)s?)")
+_PAYING = r"( (for|with|as) (self[- ]pay(ing)?|cash)| if (i|we|you) (self[- ]pay|pay (in )?cash)| without insurance| out of pocket)?"
+_WHO = r"(i|we|you|(new |established )?patients|(a|an) (new|established) patient)"
+_ARRIVE = r"(arrive|get there|get here|come in|show up|be there|be here)"
+
+INTENTS = [
+    Intent('insurance', re.compile(
+        rf"(what|which) (kinds? of |types? of )?(insurances?|insurance plans?|plans|insurers) (do|does|will) {_CLINIC} (accept|take)"
+        rf"|(do|does|will) {_CLINIC} (accept|take) (any )?(insurance|{_INSURER}( insurance| plans?)?)"
+        rf"|(is|are) {_INSURER}( insurance| plans?)? (accepted|taken)"
+        rf"|(what|which) (insurances?|insurance plans?) (is|are) (accepted|taken)"
+        )),
+    Intent('self_pay', re.compile(
+        rf"how much (is|does|do|would|will) (it cost (to (see|get|book) )?)?{_VISIT}( cost)?{_PAYING}"
+        rf"|how much (is|does it cost to) self[- ]pay( (for|at) {_VISIT})?"
+        rf"|(what|what's) (is |are )?the (self[- ]pay |cash )?(price|rate|cost|fee)s?( (for|of) {_VISIT})?{_PAYING}"
+        rf"|what does {_VISIT} cost{_PAYING}"
+        )),
+    Intent('arrival', re.compile(
+        rf"(how early|when|what time) should {_WHO} {_ARRIVE}( for {_VISIT})?"
+        rf"|how early (do|does) {_WHO} (need|have) to {_ARRIVE}( for {_VISIT})?"
+        )),
+    Intent('duration', re.compile(
+        rf"(how long|how many minutes|how much time) (is|are|does|do|will) {_VISIT}( (take|last))?"
+        rf"|(what|what's) (is |are )?the (duration|length) of {_VISIT}"
+        )),
+]
+
+
+class PolicyAnswerer(BaseModel):
+    """Answers static policy questions (insurances, self-pay prices, arrival
+    times, appointment durations) from the policy table without the LLM.
+
+    A question is answered only if it is asked in one of the forms of exactly
+    one intent ("How early should new patients arrive?"), nothing in it points
+    at a specific patient, their history or status, or a booking, and it is
+    short; anything else falls through to the pipeline.
+    """
+    table: PolicyTable
+    min_confidence: float = POLICY_MIN_CONFIDENCE
+
+    def classify(self, text: str) -> Optional[Tuple[str, float]]:
+        """(intent name, confidence) of a message, or None unless exactly one intent matches."""
+        question = question_form(text)
+        matches = [intent.name for intent in INTENTS if intent.pattern.fullmatch(question)]
+
+        if len(matches) != 1:
+            return None
+
+        confidence = 0.9
+        if len(text.split()) > MAX_WORDS:
+            confidence -= 0.3
+        if VETO_PATTERN.search(text):
+            confidence = 0.0
+
+        return matches[0], confidence
+
+    @staticmethod
+    def _mentioned(text: str, names: Iterable[str], words: int = 2) -> List[str]:
+        """Names whose first `words` words appear in the text (e.g. "Blue Cross")."""
+        text = text.lower()
+        return [name for name in names if ' '.join(name.lower().split()[:words]) in text]
+
+    def answer(self, message: Message) -> Optional[Message]:
+        """Answer a user message from the policy table, or None to fall through."""
+        if message.role != Role.USER:
+            return None
+
+        classified = self.classify(message.content)
+
+        if classified is None or classified[1] < self.min_confidence:
+            return None
+
+        intent, _ = classified
+        text = message.content
+        # narrow the answer to what was asked about, or list everything
+        types = self._mentioned(text, self.table.durations, words=1) or list(self.table.durations)
+        specialties = self._mentioned(text, self.table.self_pay) or list(self.table.self_pay)
+        kwargs = {
+            'insurances': self.table.insurances,
+            'mentioned_insurances': self._mentioned(text, self.table.insurances),
+            'self_pay': {i: self.table.self_pay[i] for i in specialties},
+            'durations': {i: self.table.durations[i] for i in types},
+            'arrival': {i: self.table.arrival[i] for i in types if i in self.table.arrival},
+        }
+
+        return Message(role=Role.ASSISTANT, content=PROMPTS.render(f"policy_{intent}", kwargs))
+
+
+POLICY_TABLE = PolicyTable.from_template()
+
+POLICY = PolicyAnswerer(table=POLICY_TABLE) if POLICY_FAST_PATH_ENABLED else None
@@ -0,0 +1,348 @@
+"""In-memory provider availability index."""
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from .db import init_db
+from .queries import ProviderRow, ZipCode, all_providers, all_zip_codes
+from .fuzzy import FuzzyIndex, SPECIALTY_ALIASES, department_aliases
+from .geo import GridIndex, Place, Places
+from ..env_settings import FUZZY_MIN_SCORE, FUZZY_CANDIDATES, PLACE_MIN_SCORE
+
+logger = logging.getLogger(__name__)
+
+DAYS = 7
+HOURS = 24
+
+
+def availability_bitmap(start_day: int, end_day: int, start_hour: int, end_hour: int) -> int:
+    """Weekday x hour availability bitmap; bit `day * 24 + hour` is set if the hour is open."""
+    hours = sum(1 << hour for hour in range(start_hour, end_hour))
+
+    return sum(hours << (day * HOURS) for day in range(start_day, end_day + 1))
+
+
+def set_bits(mask: int, limit: Optional[int] = None) -> List[int]:
+    """Positions of the set bits of a bitset, lowest first, at most `limit` of them."""
+    # bit i is character i, so the scan runs in C
+    bits = bin(mask)[:1:-1]
+    found = []
+    i = bits.find('1')
+    while i >= 0 and (limit is None or len(found) < limit):
+        found.append(i)
+        i = bits.find('1', i + 1)
+
+    return found
+
+
+def bitset(entries: Collection[int]) -> int:
+    """Bitset with the bits of `entries` set."""
+    bits = bytearray(max(entries, default=-1) // 8 + 1)
+    for i in entries:
+        bits[i >> 3] |= 1 << (i & 7)
+
+    return int.from_bytes(bits, 'little')
+
+
+def required_hours(ts: datetime, duration: int) -> range:
+    """Hours of the day the minutes of an appointment at `ts` fall into, so all
+    of them must be open (same rule as the SQL search); an appointment
+    crossing midnight includes hour 24, which is never open."""
+    return range(ts.hour, math.ceil((ts.hour * 60 + ts.minute + duration) / 60))
+
+
+def provider_dict(row: ProviderRow) -> dict:
+    """Format a provider/department row as returned by search_available_providers."""
+    return {
+        'provider_id': row.provider_id,
+        'first_name': row.first_name,
+        'last_name': row.last_name,
+        'specialty': row.specialty,
+        'certification': row.certification,
+        'department': {
+            'name': row.department_name,
+            'phone_number': row.phone_number,
+            'address': row.address,
+            'hours': f"{row.start_hour}:00-{row.end_hour}:00",
+            'days': f"{row.start_day}-{row.end_day}"
+        }
+    }
+
+
+class _IndexState(NamedTuple):
+    rows: List[ProviderRow]
+    bitmaps: List[int]
+    # bitsets of entries (bit i for entry i) open in each weekday x hour slot, and of each specialty's entries
+    slot_masks: List[int]
+    specialty_masks: Dict[str, int]
+    by_first_name: Dict[str, Set[int]]
+    by_last_name: Dict[str, Set[int]]
+    by_specialty: Dict[str, Set[int]]
+    by_location: Dict[str, Set[int]]
+    fuzzy: Dict[str, FuzzyIndex]
+    places: Places
+    grid: GridIndex
+
+
+class ProviderIndex:
+    """Provider/department rows with hash maps on lowercased names and
+    per-department availability bitmaps, so a search is a few set intersections.
+    Filters that match large parts of the directory (times and specialties)
+    are bitsets over all entries instead, so they are ANDed without visiting
+    the entries, and a limited search only visits the entries it returns.
+
+    A name with no exact match is looked up in a fuzzy index of that field
+    instead ("Dr. House", "ortho", "Jefferson"), and results are ranked by
+    how well they matched. Given a ZIP code or city to search near, results
+    are instead the nearest matching departments, found on a grid of
+    department locations.
+
+    Entries are provider/department pairs, in department ID order.
+    """
+    def __init__(self):
+        self._state: Optional[_IndexState] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the index has been built."""
+        return self._state is not None
+
+    def __len__(self) -> int:
+        return len(self._state.rows) if self._state else 0
+
+    def build(self, rows: List[ProviderRow], zip_codes: Iterable[ZipCode] = ()) -> None:
+        """(Re)build the index from provider/department rows (and the ZIP code
+        centroids places are located with) and swap it in atomically."""
+        bitmaps = []
+        slot_bits = [[] for _ in range(DAYS * HOURS)]
+        by_first_name = defaultdict(set)
+        by_last_name = defaultdict(set)
+        by_specialty = defaultdict(set)
+        by_location = defaultdict(set)
+
+        for i, row in enumerate(rows):
+            bitmap = availability_bitmap(row.start_day, row.end_day, row.start_hour, row.end_hour)
+            bitmaps.append(bitmap)
+
+            for slot in range(DAYS * HOURS):
+                if bitmap >> slot & 1:
+                    slot_bits[slot].append(i)
+
+            by_first_name[row.first_name.lower()].add(i)
+            by_last_name[row.last_name.lower()].add(i)
+            by_specialty[row.specialty.lower()].add(i)
+            by_location[row.department_name.lower()].add(i)
+
+        with self._lock:
+            self._state = _IndexState(
+                rows=rows,
+                bitmaps=bitmaps,
+                slot_masks=[bitset(i) for i in slot_bits],
+                specialty_masks={name: bitset(entries) for name, entries in by_specialty.items()},
+                by_first_name=dict(by_first_name),
+                by_last_name=dict(by_last_name),
+                by_specialty=dict(by_specialty),
+                by_location=dict(by_location),
+                fuzzy={
+                    'first_name': FuzzyIndex(by_first_name),
+                    'last_name': FuzzyIndex(by_last_name),
+                    'specialty': FuzzyIndex(by_specialty, SPECIALTY_ALIASES),
+                    'location': FuzzyIndex(by_location, department_aliases(by_location)),
+                },
+                places=Places(zip_codes, PLACE_MIN_SCORE),
+                grid=GridIndex(
+                    (i, row.latitude, row.longitude) for i, row in enumerate(rows) if row.latitude is not None
+                    ),
+                )
+
+    def load(self) -> None:
+        """Build the index from the provider database."""
+        with init_db() as conn:
+            rows = all_providers(conn)
+            zip_codes = all_zip_codes(conn)
+
+        self.build(rows, zip_codes)
+        logger.info("Indexed %s provider departments, %s located", len(rows), len(self._state.grid))
+
+    def locate(self, place: str) -> Optional[Place]:
+        """A ZIP code or city, or None if it is unknown."""
+        return self._state.places.locate(place)
+
+    def place_candidates(self, place: str) -> List[Tuple[str, float]]:
+        """Cities most similar to a place that didn't resolve, with their scores."""
+        return self._state.places.candidates(place)
+
+    def search(
+        self,
+        duration: int,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        location: Optional[str] = None,
+        specialty: Optional[str] = None,
+        ts: Optional[datetime] = None,
+        near: Optional[str] = None,
+        nearest: int = 5,
+        limit: Optional[int] = None,
+        ) -> Tuple[List[dict], int]:
+        """Search the index; same filters and results as the SQL provider search.
+
+        Args:
+            duration (int): Appointment duration in minutes
+            first_name (Optional[str]): Provider's first name, case insensitive
+            last_name (Optional[str]): Provider's last name, case insensitive
+            location (Optional[str]): Department name, case insensitive
+            specialty (Optional[str]): Provider's specialty, case insensitive
+            ts (Optional[datetime]): Desired appointment time
+            near (Optional[str]): ZIP code or city; return the `nearest` matches to it, nearest first
+            nearest (int): Results to return with `near`
+            limit (Optional[int]): Most results to return (all if None)
+
+        Returns:
+            Tuple[List[dict], int]: Available providers with their departments, and how many
+            match in all; with `near`, each department has its distance from the place `near`
+            resolved to
+        """
+        state = self._state
+        results = []
+
+        place = state.places.locate(near) if near is not None else None
+        if near is not None and place is None:
+            return [], 0
+
+        matches, total = self._match(
+            state, duration, first_name, last_name, location, specialty, ts, place, nearest, limit
+            )
+        for i, score, distance in matches:
+            result = provider_dict(state.rows[i])
+            if score < 1:
+                # tell the model this was an approximate match
+                result['match_score'] = score
+            if distance is not None:
+                result['department']['distance_miles'] = distance
+                result['department']['distance_from'] = place.name
+            results.append(result)
+
+        return results, total
+
+    def match(
+        self,
+        duration: int,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        location: Optional[str] = None,
+        specialty: Optional[str] = None,
+        ts: Optional[datetime] = None,
+        near: Optional[str] = None,
+        nearest: int = 5,
+        ) -> List[ProviderRow]:
+        """Provider/department rows matching the `search` filters, best match (or nearest) first."""
+        state = self._state
+        place = state.places.locate(near) if near is not None else None
+        if near is not None and place is None:
+            return []
+
+        matches, _ = self._match(state, duration, first_name, last_name, location, specialty, ts, place, nearest)
+
+        return [state.rows[i] for i, _, _ in matches]
+
+    @staticmethod
+    def _match(
+        state: _IndexState,
+        duration: int,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        location: Optional[str] = None,
+        specialty: Optional[str] = None,
+        ts: Optional[datetime] = None,
+        place: Optional[Place] = None,
+        nearest: int = 5,
+        limit: Optional[int] = None,
+        ) -> Tuple[List[Tuple[int, float, Optional[float]]], int]:
+        """Matching entries with their scores (the product of the fuzzy field scores)
+        and distances (miles, with `place`), by score and then department ID, or
+        the `nearest` to `place` by distance; at most `limit` of them, with the
+        number of matching entries."""
+        candidates = []
+        # fuzzy fields, as the row attribute and the matched names' scores
+        fuzzy = []
+        specialties: Optional[Dict[str, float]] = None
+        slots: List[int] = []
+
+        for field, attr, value, lookup in (
+            ('first_name', 'first_name', first_name, state.by_first_name),
+            ('last_name', 'last_name', last_name, state.by_last_name),
+            ('specialty', 'specialty', specialty, state.by_specialty),
+            ('location', 'department_name', location, state.by_location),
+            ):
+            if not value:
+                continue
+
+            exact = lookup.get(value.lower())
+            if exact is not None:
+                names = {value.lower(): 1.0}
+            else:
+                names = dict(state.fuzzy[field].match(value, FUZZY_CANDIDATES, FUZZY_MIN_SCORE))
+                fuzzy.append((attr, names))
+
+            if field == 'specialty' and ts:
+                # ANDed with the time's slots as bitsets, as it matches a large part of the directory
+                specialties = names
+            elif exact is not None:
+                candidates.append(exact)
+            else:
+                candidates.append(set().union(*(lookup[name] for name in names)))
+
+        if ts:
+            hours = required_hours(ts, duration)
+            if hours.stop > HOURS:
+                return [], 0
+            slots = [ts.weekday() * HOURS + hour for hour in hours]
+
+        if candidates:
+            # names are selective, so the few entries left are checked one by one
+            candidates.sort(key=len)
+            matches = candidates[0].intersection(*candidates[1:])
+            if specialties is not None:
+                matches = {i for i in matches if state.rows[i].specialty.lower() in specialties}
+            if slots:
+                needed = sum(1 << slot for slot in slots)
+                matches = {i for i in matches if state.bitmaps[i] & needed == needed}
+        elif specialties is not None or slots:
+            mask = -1
+            if specialties is not None:
+                mask = 0
+                for name in specialties:
+                    mask |= state.specialty_masks[name]
+            for slot in slots:
+                mask &= state.slot_masks[slot]
+            if place is None and not fuzzy:
+                # already in ID order, so only the returned entries are visited
+                return [(i, 1.0, None) for i in set_bits(mask, limit)], mask.bit_count()
+            matches = set(set_bits(mask))
+        else:
+            # all entries
+            matches = None
+
+        def score(i: int) -> float:
+            product = 1.0
+            for attr, names in fuzzy:
+                product *= names.get(getattr(state.rows[i], attr).lower(), 1.0)
+            return product
+
+        total = len(matches) if matches is not None else len(state.rows)
+        if place is not None:
+            found = [(i, score(i), distance) for i, distance in state.grid.nearest(place.point, nearest, matches)]
+        elif matches is None:
+            found = [(i, 1.0, None) for i in range(total)[:limit]]
+        elif not fuzzy:
+            found = [(i, 1.0, None) for i in sorted(matches)]
+        else:
+            found = sorted(((i, score(i), None) for i in matches), key=lambda item: (-item[1], item[0]))
+
+        return found[:limit], total
+
+
+PROVIDER_INDEX = ProviderIndex()
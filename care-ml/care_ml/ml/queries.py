@@ -0,0 +1,146 @@
+"""Provider directory queries."""
+from typing import List, NamedTuple, Optional
+import logging
+from functools import lru_cache
+import duckdb
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_COLUMNS = """
+        SELECT
+            p.id as provider_id,
+            p.first_name,
+            p.last_name,
+            p.specialty,
+            p.certification,
+            d.name as department_name,
+            d.phone_number,
+            d.address,
+            d.start_day,
+            d.end_day,
+            d.start_hour,
+            d.end_hour,
+            d.latitude,
+            d.longitude
+        FROM providers p
+        JOIN departments d ON p.id = d.provider_id
+"""
+
+# optional provider search filters, in statement order
+SEARCH_FILTERS = {
+    'day': " AND d.start_day <= $day AND d.end_day >= $day",
+    'hour': " AND d.start_hour <= $hour AND d.end_hour >= $min_end_hour",
+    'first_name': " AND p.first_name ilike $first_name",
+    'last_name': " AND p.last_name ilike $last_name",
+    'specialty': " AND p.specialty ilike $specialty",
+    'location': " AND d.name ilike $location",
+}
+
+
+class ProviderRow(NamedTuple):
+    """Provider/department row."""
+    provider_id: int
+    first_name: str
+    last_name: str
+    specialty: str
+    certification: str
+    department_name: str
+    phone_number: str
+    address: str
+    start_day: int
+    end_day: int
+    start_hour: int
+    end_hour: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class ZipCode(NamedTuple):
+    """ZIP code centroid."""
+    zip: str
+    city: str
+    state: str
+    latitude: float
+    longitude: float
+
+
+@lru_cache(maxsize=None)
+def search_statement(filters: frozenset) -> str:
+    """Parameterized provider search statement for a combination of filters.
+
+    There is one fixed statement text per filter combination, so the set of
+    statements DuckDB ever sees is bounded and no argument is spliced into SQL.
+    """
+    unknown = filters - SEARCH_FILTERS.keys()
+    if unknown:
+        raise ValueError(f"Unknown provider search filters: {sorted(unknown)}")
+
+    return (
+        PROVIDER_COLUMNS
+        + "        WHERE 1=1"
+        + ''.join(clause for name, clause in SEARCH_FILTERS.items() if name in filters)
+        + "\n        ORDER BY d.id"
+        )
+
+
+def search_providers(
+    conn: duckdb.DuckDBPyConnection,
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+    location: Optional[str] = None,
+    specialty: Optional[str] = None,
+    day: Optional[int] = None,
+    hour: Optional[int] = None,
+    minute: int = 0,
+    duration: int = 30,
+    ) -> List[ProviderRow]:
+    """Search providers and their departments.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Pooled cursor
+        first_name (Optional[str]): Provider's first name, case insensitive
+        last_name (Optional[str]): Provider's last name, case insensitive
+        location (Optional[str]): Department name, case insensitive
+        specialty (Optional[str]): Provider's specialty, case insensitive
+        day (Optional[int]): Weekday the department must be open (0 = Monday)
+        hour (Optional[int]): Hour the appointment starts at
+        minute (int): Minute of the hour the appointment starts at, used with `hour`
+        duration (int): Appointment duration in minutes, used with `hour`
+
+    Returns:
+        List[ProviderRow]: Matching provider/department rows
+    """
+    params = {
+        'first_name': first_name or None,
+        'last_name': last_name or None,
+        'specialty': specialty or None,
+        'location': location or None,
+        'day': day,
+        'hour': hour,
+        }
+    params = {name: value for name, value in params.items() if value is not None}
+
+    if 'hour' in params:
+        # the department must stay open until the appointment's last minute
+        params['min_end_hour'] = hour + (minute + duration) / 60
+
+    statement = search_statement(frozenset(params) - {'min_end_hour'})
+    logger.debug("Provider search %s", params)
+
+    with span('db', query='search_providers'):
+        rows = conn.execute(statement, params).fetchall()
+
+    return [ProviderRow(*row) for row in rows]
+
+
+def all_providers(conn: duckdb.DuckDBPyConnection) -> List[ProviderRow]:
+    """All provider/department rows, in department ID order."""
+    return search_providers(conn)
+
+
+def all_zip_codes(conn: duckdb.DuckDBPyConnection) -> List[ZipCode]:
+    """All ZIP code centroids."""
+    rows = conn.execute("SELECT zip, city, state, latitude, longitude FROM zip_codes ORDER BY zip").fetchall()
+
+    return [ZipCode(*row) for row in rows]
@@ -0,0 +1,238 @@
+"""Server-side conversation sessions."""
+from typing import List, Optional
+import time
+import uuid
+from .cache import TTLCache
+from .message import ChatHistory, Message
+from .shared import SQLiteFile
+from ..env_settings import SESSION_MAX, SESSION_TTL, SESSION_SPILL_PATH, SHARED_STATE_DB
+
+
+class SessionSpill:
+    """SQLite file holding sessions evicted from memory.
+
+    Args:
+        path (str): SQLite database file
+        ttl (float): Seconds a spilled session stays loadable
+    """
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._db = SQLiteFile(path, (
+            'CREATE TABLE IF NOT EXISTS sessions '
+            '(id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)',
+            ))
+
+    def put(self, session_id: str, history: ChatHistory) -> None:
+        """Spill a session."""
+        self._db.execute(
+            'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+            (session_id, history.model_dump_json(), time.time()),
+            )
+
+    def append(self, session_id: str, messages: List[Message]) -> bool:
+        """Append messages to a live session in one statement, so concurrent appends all land.
+
+        Returns:
+            bool: Whether the session exists and hadn't expired
+        """
+        history = ChatHistory([])
+        for message in messages:
+            # validates them like a full history
+            history.append(message)
+
+        now = time.time()
+        appends = ", '$[#]', json(?)" * len(history.root)
+        rows = self._db.execute(
+            f"UPDATE sessions SET messages = json_insert(messages{appends}), updated_at = ? "
+            'WHERE id = ? AND updated_at >= ? RETURNING id',
+            (*(i.model_dump_json() for i in history.root), now, session_id, now - self.ttl),
+            )
+
+        return bool(rows)
+
+    def get(self, session_id: str) -> Optional[ChatHistory]:
+        """A spilled session, or None if missing or expired."""
+        rows = self._db.execute(
+            'SELECT messages FROM sessions WHERE id = ? AND updated_at >= ?',
+            (session_id, time.time() - self.ttl),
+            )
+
+        return ChatHistory.model_validate_json(rows[0][0]) if rows else None
+
+    def take(self, session_id: str) -> Optional[ChatHistory]:
+        """Remove a spilled session and return it, or None if missing or expired."""
+        rows = self._db.execute(
+            'SELECT messages, updated_at FROM sessions WHERE id = ?',
+            (session_id,),
+            )
+        self._db.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+        if not rows or rows[0][1] < time.time() - self.ttl:
+            return None
+
+        return ChatHistory.model_validate_json(rows[0][0])
+
+    def count(self) -> int:
+        """Number of live sessions."""
+        return self._db.execute(
+            'SELECT count(*) FROM sessions WHERE updated_at >= ?',
+            (time.time() - self.ttl,),
+            )[0][0]
+
+    def purge(self) -> None:
+        """Drop expired sessions."""
+        self._db.execute('DELETE FROM sessions WHERE updated_at < ?', (time.time() - self.ttl,))
+
+    def close(self) -> None:
+        """Close the file."""
+        self._db.close()
+
+
+class SessionStore:
+    """Bounded in-process conversation store with LRU/TTL eviction.
+
+    Sessions evicted to make room are spilled to `spill` if it is set and
+    loaded back into memory on their next access.
+
+    Args:
+        maxsize (int): Maximum number of sessions kept in memory
+        ttl (float): Seconds a session stays alive after its last update
+        spill (Optional[SessionSpill]): Overflow storage
+    """
+    def __init__(self, maxsize: int, ttl: float, spill: Optional[SessionSpill] = None):
+        self.spill = spill
+        self._sessions: TTLCache[str, ChatHistory] = TTLCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            on_evict=spill.put if spill else None,
+            )
+
+    def create(self, messages: Optional[List[Message]] = None) -> str:
+        """Start a session, optionally seeded with earlier messages.
+
+        Returns:
+            str: Session ID
+        """
+        history = ChatHistory([])
+        for message in messages or []:
+            history.append(message)
+
+        session_id = uuid.uuid4().hex
+        self._sessions.set(session_id, history)
+
+        return session_id
+
+    def get(self, session_id: str) -> Optional[ChatHistory]:
+        """Conversation history, or None if the session doesn't exist or expired."""
+        history = self._sessions.get(session_id)
+
+        if history is None and self.spill:
+            history = self.spill.take(session_id)
+            if history is not None:
+                self._sessions.set(session_id, history)
+
+        return history
+
+    def extend(self, session_id: str, *messages: Message) -> None:
+        """Append messages to a session and refresh its TTL.
+
+        Raises:
+            KeyError: If the session doesn't exist or expired
+        """
+        history = self.get(session_id)
+
+        if history is None:
+            raise KeyError(session_id)
+
+        for message in messages:
+            history.append(message)
+
+        self._sessions.set(session_id, history)
+
+    def delete(self, session_id: str) -> None:
+        """End a session."""
+        self._sessions.invalidate(session_id)
+
+        if self.spill:
+            self.spill.take(session_id)
+
+    def stats(self) -> dict:
+        """Session counts."""
+        return self._sessions.stats()
+
+    def purge(self) -> None:
+        """Drop expired spilled sessions."""
+        if self.spill:
+            self.spill.purge()
+
+    def close(self) -> None:
+        """Spill live sessions so they survive a restart, and close the spill file."""
+        if self.spill:
+            for session_id, history in self._sessions.items():
+                self.spill.put(session_id, history)
+            self.spill.close()
+
+
+class SharedSessionStore:
+    """Conversation store kept entirely in a SQLite file, so that any worker
+    process can continue any session. Same interface as `SessionStore`.
+
+    Args:
+        table (SessionSpill): Session table, expiring sessions after its TTL
+    """
+    def __init__(self, table: SessionSpill):
+        self.table = table
+
+    def create(self, messages: Optional[List[Message]] = None) -> str:
+        """Start a session, optionally seeded with earlier messages.
+
+        Returns:
+            str: Session ID
+        """
+        history = ChatHistory([])
+        for message in messages or []:
+            history.append(message)
+
+        session_id = uuid.uuid4().hex
+        self.table.put(session_id, history)
+
+        return session_id
+
+    def get(self, session_id: str) -> Optional[ChatHistory]:
+        """Conversation history, or None if the session doesn't exist or expired."""
+        return self.table.get(session_id)
+
+    def extend(self, session_id: str, *messages: Message) -> None:
+        """Append messages to a session and refresh its TTL.
+
+        Raises:
+            KeyError: If the session doesn't exist or expired
+        """
+        if not self.table.append(session_id, list(messages)):
+            raise KeyError(session_id)
+
+    def delete(self, session_id: str) -> None:
+        """End a session."""
+        self.table.take(session_id)
+
+    def stats(self) -> dict:
+        """Session counts."""
+        return {'size': self.table.count(), 'shared': True}
+
+    def purge(self) -> None:
+        """Drop expired sessions."""
+        self.table.purge()
+
+    def close(self) -> None:
+        """Close the session file."""
+        self.table.close()
+
+
+if SHARED_STATE_DB:
+    SESSIONS = SharedSessionStore(SessionSpill(SHARED_STATE_DB, ttl=SESSION_TTL))
+else:
+    SESSIONS = SessionStore(
+        maxsize=SESSION_MAX,
+        ttl=SESSION_TTL,
+        spill=SessionSpill(SESSION_SPILL_PATH, ttl=SESSION_TTL) if SESSION_SPILL_PATH else None,
+        )
@@ -0,0 +1,228 @@
+"""State shared between worker processes."""
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, NamedTuple, Optional, TypeVar
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from .cache import TTLCache
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+# a SharedCache drops expired entries every this many sets
+PURGE_EVERY = 1000
+
+
+class SQLiteFile:
+    """SQLite database file used from many threads and worker processes.
+
+    Each process opens its own connection on first use, so an instance created
+    before a fork (e.g. by a preloading server) is safe to use in the
+    children. Statements of one process are serialized by a lock; in WAL mode
+    other processes keep reading while one writes.
+
+    Args:
+        path (str): Database file
+        schema (Iterable[str]): Statements run once per connection, e.g. CREATE TABLE IF NOT EXISTS
+        timeout (float): Seconds to wait for another process's write lock
+    """
+    def __init__(self, path: str, schema: Iterable[str] = (), timeout: float = 5):
+        self.path = path
+        self.schema = tuple(schema)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # a connection inherited through fork belongs to the parent; never use or close it
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.timeout)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                self._conn.execute(statement)
+            self._pid = os.getpid()
+
+        return self._conn
+
+    def execute(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        """Run a statement and return its rows."""
+        with self._lock:
+            return self._connect().execute(sql, tuple(params)).fetchall()
+
+    def data_version(self) -> int:
+        """Number that changes whenever another connection (e.g. another process) commits to the file."""
+        return self.execute('PRAGMA data_version')[0][0]
+
+    def close(self) -> None:
+        """Close this process's connection."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+
+class _Local(NamedTuple):
+    # deserialized entry kept in process, with the version of the shared entry it was read from
+    # and the file's data version it was last known to be current at
+    version: str
+    value: object
+    expires_at: float
+    checked: int
+
+
+class SharedCache(Generic[K, V]):
+    """TTL cache in a SQLite file, so all worker processes share its entries.
+
+    Drop-in for `TTLCache` where entries must be shared or invalidated across
+    processes; values are stored serialized, and expired entries are dropped
+    every PURGE_EVERY sets rather than by LRU eviction. Hit and miss counts are per process.
+
+    With `local_size`, up to that many deserialized values are also kept in
+    the process. Every shared entry has a version, replaced on each set; a
+    local hit is served without reading the file while nothing else has
+    committed to it, and otherwise only after checking that the shared entry
+    still has the version the local one was read from, so an invalidation or
+    newer value in another process is never missed. Values are only
+    deserialized when the shared entry changed.
+
+    Args:
+        path (str): SQLite database file
+        namespace (str): Name of this cache within the file
+        ttl (float): Seconds an entry stays valid after it was set
+        dumps (Callable[[V], str]): Serializes a value
+        loads (Callable[[str], V]): Deserializes a value
+        local_size (int): Deserialized values kept in the process (0 for none)
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS cache '
+        '(namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, '
+        'version TEXT NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID',
+    )
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        ttl: float,
+        dumps: Callable[[V], str],
+        loads: Callable[[str], V],
+        local_size: int = 0,
+        ):
+        self.db = SQLiteFile(path, self.SCHEMA)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.local: Optional[TTLCache[K, _Local]] = TTLCache(maxsize=local_size, ttl=ttl) if local_size else None
+        self.hits = 0
+        self.misses = 0
+        self.local_hits = 0
+        self._sets = 0
+        # bumped by this process's invalidations, which don't change its own view of the data version
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return self.db.execute(
+            'SELECT count(*) FROM cache WHERE namespace = ? AND expires_at >= ?',
+            (self.namespace, time.time()),
+            )[0][0]
+
+    def _count(self, hit: bool, count: bool, local: bool = False) -> None:
+        if count:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if local:
+                self.local_hits += 1
+
+    def get(self, key: K, count: bool = True) -> Optional[V]:
+        """Get a live entry, or None if it is missing or expired."""
+        now = time.time()
+        local = self.local.get(key, count=False) if self.local is not None else None
+        if local is not None and local.expires_at < now:
+            local = None
+
+        # read before the entry, so a commit after the read is noticed on the next get
+        checked = self.db.data_version() if self.local is not None else 0
+        if local is not None and local.checked == checked:
+            self._count(True, count, local=True)
+            return local.value
+
+        generation = self._generation
+
+        rows = self.db.execute(
+            'SELECT version, expires_at, CASE WHEN version = ? THEN NULL ELSE value END '
+            'FROM cache WHERE namespace = ? AND key = ? AND expires_at >= ?',
+            (local.version if local is not None else '', self.namespace, str(key), now),
+            )
+        if not rows:
+            self._count(False, count)
+            if local is not None:
+                self.local.invalidate(key)
+            return None
+
+        version, expires_at, serialized = rows[0]
+        # unchanged since the local value was read from it
+        self._count(True, count, local=serialized is None)
+        value = local.value if serialized is None else self.loads(serialized)
+
+        if self.local is not None and generation == self._generation:
+            self.local.set(key, _Local(version, value, expires_at, checked))
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        """Set an entry."""
+        version = uuid.uuid4().hex
+        expires_at = time.time() + self.ttl
+        checked = self.db.data_version() if self.local is not None else 0
+        self.db.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (self.namespace, str(key), self.dumps(value), expires_at, version),
+            )
+        if self.local is not None:
+            self.local.set(key, _Local(version, value, expires_at, checked))
+
+        self._sets += 1
+        if self._sets % PURGE_EVERY == 0:
+            self.purge()
+
+    def invalidate(self, key: K) -> None:
+        """Drop an entry, in every process."""
+        self._generation += 1
+        if self.local is not None:
+            self.local.invalidate(key)
+        self.db.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, str(key)))
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._generation += 1
+        if self.local is not None:
+            self.local.clear()
+        self.db.execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+
+    def purge(self) -> None:
+        """Drop expired entries."""
+        self.db.execute('DELETE FROM cache WHERE namespace = ? AND expires_at < ?', (self.namespace, time.time()))
+
+    def close(self) -> None:
+        """Close the file."""
+        self.db.close()
+
+    def stats(self) -> Dict[str, float]:
+        """Size and this process's hit/miss counters."""
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self),
+            'shared': True,
+            'local_size': len(self.local) if self.local is not None else 0,
+            'hits': self.hits,
+            'local_hits': self.local_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,116 @@
+"""Earliest open appointment slots."""
+from typing import Iterator, List, Tuple
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from .booking import BOOKINGS, SLOT_MINUTES
+from .queries import ProviderRow
+
+
+def next_slot(ts: datetime) -> datetime:
+    """Start of the first slot at or after `ts`."""
+    midnight = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    minutes = -(-(ts - midnight) // timedelta(minutes=SLOT_MINUTES)) * SLOT_MINUTES
+
+    return midnight + timedelta(minutes=minutes)
+
+
+def office_slots(
+    schedule: Tuple[int, int, int, int],
+    start: datetime,
+    duration: int,
+    days: int,
+    ) -> Iterator[Tuple[datetime, int]]:
+    """Appointment starts that fit into a weekly schedule, in time order.
+
+    Args:
+        schedule (Tuple[int, int, int, int]): Start day, end day, start hour, end hour
+        start (datetime): Earliest start, on a slot boundary
+        duration (int): Appointment duration in minutes
+        days (int): Days from `start` to look through
+
+    Yields:
+        Tuple[datetime, int]: Start and its slot of the day
+    """
+    start_day, end_day, start_hour, end_hour = schedule
+    first = start_hour * 60 // SLOT_MINUTES
+    last = end_hour * 60 // SLOT_MINUTES - -(-duration // SLOT_MINUTES)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    from_slot = (start - midnight) // timedelta(minutes=SLOT_MINUTES)
+
+    for offset in range(days):
+        day = midnight + timedelta(days=offset)
+        if start_day <= day.weekday() <= end_day:
+            for slot in range(max(first, from_slot) if offset == 0 else first, last + 1):
+                yield day + timedelta(minutes=slot * SLOT_MINUTES), slot
+
+
+def open_slots(
+    rows: List[ProviderRow],
+    members: List[int],
+    schedule: Tuple[int, int, int, int],
+    start: datetime,
+    duration: int,
+    days: int,
+    ) -> Iterator[Tuple[datetime, int]]:
+    """Open starts of departments sharing a schedule, by time and then department.
+
+    Yields:
+        Tuple[datetime, int]: Start and the index of a department not booked then
+    """
+    needed = (1 << -(-duration // SLOT_MINUTES)) - 1
+
+    for ts, slot in office_slots(schedule, start, duration, days):
+        day = ts.date()
+        for i in members:
+            if not BOOKINGS.day(rows[i].provider_id, day) >> slot & needed:
+                yield ts, i
+
+
+def earliest_slots(
+    rows: List[ProviderRow],
+    start: datetime,
+    duration: int,
+    count: int,
+    days: int,
+    ) -> List[Tuple[datetime, ProviderRow]]:
+    """The `count` earliest open slots across departments.
+
+    Departments are grouped by weekly schedule, and the groups' slot streams
+    are merged lazily on a heap, so the work grows with the number of distinct
+    schedules and slots returned rather than with the number of departments.
+    Ties go to the earlier row; a provider open at the same time in two
+    departments is returned once.
+
+    Args:
+        rows (List[ProviderRow]): Candidate provider/departments, best match first
+        start (datetime): Earliest start
+        duration (int): Appointment duration in minutes
+        count (int): Slots to return
+        days (int): Days from `start` to look through
+
+    Returns:
+        List[Tuple[datetime, ProviderRow]]: Slot starts and their departments, earliest first
+    """
+    start = next_slot(start)
+    groups = defaultdict(list)
+    for i, row in enumerate(rows):
+        groups[row.start_day, row.end_day, row.start_hour, row.end_hour].append(i)
+
+    merged = heapq.merge(*(
+        open_slots(rows, members, schedule, start, duration, days)
+        for schedule, members in groups.items()
+        ))
+
+    slots = []
+    seen = set()
+    for ts, i in merged:
+        if (ts, rows[i].provider_id) in seen:
+            continue
+
+        seen.add((ts, rows[i].provider_id))
+        slots.append((ts, rows[i]))
+        if len(slots) == count:
+            break
+
+    return slots
@@ -0,0 +1,44 @@
+"""Per-request timing spans."""
+from typing import Dict, Iterator, Optional
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .metrics import SPAN_SECONDS
+
+# span durations (ms) of the current request, by name
+SPANS: ContextVar[Optional[Dict[str, float]]] = ContextVar('spans', default=None)
+
+
+def start_request() -> Dict[str, float]:
+    """Start collecting spans for the current request.
+
+    Tasks and threads started from the request copy its context, so spans
+    they record land in the returned dict.
+    """
+    spans: Dict[str, float] = {}
+    SPANS.set(spans)
+    return spans
+
+
+@contextmanager
+def span(name: str, **labels: str) -> Iterator[None]:
+    """Time a block.
+
+    The duration is recorded in the span histogram (with `labels`) and added
+    to the current request's `name` span, if any (repeated spans add up).
+    """
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.observe(duration, span=name, **labels)
+        spans = SPANS.get()
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + duration * 1000
+
+
+def server_timing(spans: Dict[str, float]) -> str:
+    """Spans as a `Server-Timing` header value."""
+    return ', '.join(f"{name};dur={duration:.1f}" for name, duration in spans.items())
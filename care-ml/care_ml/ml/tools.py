@@ -1,8 +1,34 @@
 """Tool definitions."""
-from typing import Optional, Literal
+from typing import List, Optional, Literal, Tuple, Union
 from datetime import datetime, timedelta
 from .ehr_connector import Patient
 from .db import init_db
+from .queries import search_providers
+from .provider_index import PROVIDER_INDEX, provider_dict
+from .executor import run_blocking
+from .booking import BOOKINGS, APPOINTMENT_MINUTES, ends_by_midnight, on_slot
+from .slots import earliest_slots
+from .fuzzy import normalize
+from ..env_settings import SLOT_SEARCH_DAYS, NEAREST_DEPARTMENTS, FUZZY_CANDIDATES, SEARCH_LIMIT
+
+PATIENT_NOT_FOUND = 'Patient not found. Make sure you entered the correct name and date of birth.'
+PROVIDER_UNAVAILABLE = 'Provider not found or not available at that time. Try again.'
+NEW_APPOINTMENT_REQUIRED = 'Patient has not seen provider in last 5 years. You must schedule a NEW appointment.'
+EXISTING_APPOINTMENT_REQUIRED = 'Patient has had an appointment in the last 5 years. You must schedule an EXISTING appointment.'
+APPOINTMENT_SCHEDULED = 'Appointment scheduled.'
+SLOT_TAKEN = 'That time was just booked for this provider. Try another time.'
+TIME_OFF_GRID = 'Appointments start on the quarter hour (:00, :15, :30 or :45). Try another time.'
+PAST_MIDNIGHT = 'Appointments must end by midnight of the day they start. Try an earlier time.'
+PLACE_NOT_FOUND = ('Place not found. Ask the user whether they meant one of the candidates, '
+                   'or use a city name or a 5-digit ZIP code.')
+SEVERAL_PATIENTS_FOUND = 'Several patients have that name and date of birth. Ask for the patient\'s EHR ID.'
+MORE_PROVIDERS = ('Showing {shown} of {total} matching providers. If none of these suit the user, '
+                  'narrow the search by name, location, time or place.')
+CONFIRM_PROVIDER = ('No provider and location match those names exactly. Ask the user to confirm one of the candidates, '
+                    'then book it with its names as listed.')
+
+# most slots find_earliest_slots returns
+MAX_SLOTS = 10
 
 CONFIRM_NAME_DOB = {
     'type': 'function',
@@ -24,6 +50,10 @@ CONFIRM_NAME_DOB = {
                     'type': 'string',
                     'description': 'Date of birth of the patient. Format: MM/DD/YYYY.'
                 },
+                'ehr_id': {
+                    'type': 'string',
+                    'description': 'EHR ID of the patient. Optional. Only needed if several patients share the name and date of birth.'
+                },
             }
         }
     },
@@ -33,7 +63,7 @@ SEARCH_PROVIDER = {
     'type': 'function',
     'function': {
         'name': 'search_available_providers',
-        'description': 'Search for a provider.',
+        'description': 'Search for a provider. Names may be partial or misspelled; approximate matches have a match_score.',
         'parameters': {
             'type': 'object',
             'properties': {
@@ -61,6 +91,51 @@ SEARCH_PROVIDER = {
                     'type': 'string',
                     'description': 'Desired appointment timestamp. Optional. Format: MM/DD/YYYY HH:MM:SS.'
                 },
+                'near': {
+                    'type': 'string',
+                    'description': f'City or ZIP code. Optional. Returns the {NEAREST_DEPARTMENTS} nearest departments with their distance.'
+                },
+            }
+        }
+    }
+}
+
+FIND_EARLIEST_SLOTS = {
+    'type': 'function',
+    'function': {
+        'name': 'find_earliest_slots',
+        'description': 'Find the earliest open appointment times. Use this instead of guessing timestamps.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'appointment_type': {
+                    'type': 'string',
+                    'description': 'Appointment type. Optional. Either NEW or EXISTING.'
+                },
+                'first_name': {
+                    'type': 'string',
+                    'description': 'First name of the provider. Optional. Case insensitive.'
+                },
+                'last_name': {
+                    'type': 'string',
+                    'description': 'Last name of the provider. Optional. Case insensitive.'
+                },
+                'location': {
+                    'type': 'string',
+                    'description': 'Location name. Optional. Case insensitive.'
+                },
+                'specialty': {
+                    'type': 'string',
+                    'description': 'Provider\'s specialty. Optional. Case insensitive.'
+                },
+                'after': {
+                    'type': 'string',
+                    'description': 'Earliest acceptable appointment time. Optional, defaults to now. Format: MM/DD/YYYY HH:MM:SS.'
+                },
+                'count': {
+                    'type': 'integer',
+                    'description': f'Number of times to return. Optional, defaults to 5, at most {MAX_SLOTS}.'
+                },
             }
         }
     }
@@ -70,10 +145,26 @@ BOOK_APPOINTMENT = {
     'type': 'function',
     'function': {
         'name': 'book_appointment',
-        'description': 'Book an appointment.',
+        'description': 'Book an appointment for a patient confirmed with confirm_name_dob.',
         'parameters': {
             'type': 'object',
             'properties': {
+                'first_name': {
+                    'type': 'string',
+                    'description': 'First name of the patient, as confirmed. Case insensitive.'
+                },
+                'last_name': {
+                    'type': 'string',
+                    'description': 'Last name of the patient, as confirmed. Case insensitive.'
+                },
+                'dob': {
+                    'type': 'string',
+                    'description': 'Date of birth of the patient, as confirmed. Format: MM/DD/YYYY.'
+                },
+                'ehr_id': {
+                    'type': 'string',
+                    'description': 'EHR ID of the patient. Optional. Only needed if several patients share the name and date of birth.'
+                },
                 'provider_first_name': {
                     'type': 'string',
                     'description': 'First name of the provider. Case insensitive.'
@@ -94,29 +185,64 @@ BOOK_APPOINTMENT = {
                     'type': 'string',
                     'description': 'Desired appointment timestamp. Must use the format: MM/DD/YYYY HH:MM:SS.'
                 },
-            }
+            },
+            'required': [
+                'first_name',
+                'last_name',
+                'dob',
+                'provider_first_name',
+                'provider_last_name',
+                'location',
+                'appointment_type',
+                'timestamp',
+            ],
         }
     }
 }
 
-def confirm_name_dob(first_name: str, last_name: str, dob: str) -> dict:
+async def confirm_name_dob(first_name: str, last_name: str, dob: str, ehr_id: Optional[str] = None) -> dict:
     """
     Confirm the name and date of birth of the patient.
 
+    Looked up with the EHR's name and date of birth index, so any patient can be confirmed.
+
     Args:
         first_name: First name of the patient. Case insensitive.
         last_name: Last name of the patient. Case insensitive.
         dob: Date of birth of the patient. Format: MM/DD/YYYY.
+        ehr_id: EHR ID, to tell apart patients sharing a name and date of birth (optional)
 
     Returns:
-        True if the name and date of birth match, False otherwise
+        The patient record if exactly one patient matches, otherwise a message
+    """
+    patient = await find_patient(first_name, last_name, dob, ehr_id)
+    if isinstance(patient, str):
+        return patient
+
+    return patient.model_dump()
+
+async def find_patient(first_name: str, last_name: str, dob: str, ehr_id: Optional[str] = None) -> Union[Patient, str]:
     """
-    patient = Patient.get_by_id(1)
+    The one patient with a name and date of birth (and EHR ID, if given).
 
-    if patient.name.lower() == f"{first_name} {last_name}".lower() and patient.dob == dob:
-        return patient.model_dump()
+    Returns:
+        The patient, or PATIENT_NOT_FOUND or SEVERAL_PATIENTS_FOUND unless exactly one matches
+    """
+    try:
+        datetime.strptime(dob, '%m/%d/%Y')
+    except ValueError:
+        return PATIENT_NOT_FOUND
 
-    return 'Patient not found. Make sure you entered the correct name and date of birth.'
+    patients = await Patient.find(f"{first_name} {last_name}", dob)
+    if ehr_id:
+        patients = [i for i in patients if i.ehr_id.lower() == ehr_id.strip().lower()]
+
+    if not patients:
+        return PATIENT_NOT_FOUND
+    if len(patients) > 1:
+        return SEVERAL_PATIENTS_FOUND
+
+    return patients[0]
 
 def search_available_providers(
     appointment_type: Literal['NEW', 'EXISTING'] = 'NEW',
@@ -124,11 +250,14 @@ def search_available_providers(
     last_name: Optional[str] = None,
     location: Optional[str] = None,
     specialty: Optional[str] = None,
-    timestamp: Optional[str] = None
-) -> list:
+    timestamp: Optional[str] = None,
+    near: Optional[str] = None,
+) -> Union[list, dict]:
     """
-    Search for available providers based on given criteria using raw SQL.
-    
+    Search for available providers based on given criteria.
+
+    Served from the in-memory provider index once it is loaded, otherwise falls back to a
+    parameterized SQL query (which matches names exactly and ignores `near`).
     Used Claude for this.
     
     Args:
@@ -138,124 +267,274 @@ def search_available_providers(
         location: Department address (optional)
         specialty: Provider's specialty (optional)
         timestamp: Desired appointment timestamp in the format 'MM/DD/YYYY HH:MM:SS' (optional)
+        near: City or ZIP code to return the nearest departments to (optional)
     
     Returns:
-        List of available providers with their departments
+        List of available providers with their departments; if more than SEARCH_LIMIT match,
+        the first of them under 'providers', with a message giving how many match in all;
+        or PLACE_NOT_FOUND with 'candidates' if `near` names no known place
     """
 
     ts = timestamp and datetime.strptime(timestamp, '%m/%d/%Y %H:%M:%S')
 
-    # Set appointment duration based on type
-    duration = 30 if appointment_type == 'NEW' else 15
-
-    # Build the base query
-    query = """
-        SELECT 
-            p.id as provider_id,
-            p.first_name,
-            p.last_name,
-            p.specialty,
-            p.certification,
-            d.name as department_name,
-            d.phone_number,
-            d.address,
-            d.start_day,
-            d.end_day,
-            d.start_hour,
-            d.end_hour
-        FROM providers p
-        JOIN departments d ON p.id = d.provider_id
-        WHERE 1=1
+    if near and PROVIDER_INDEX.ready and PROVIDER_INDEX.locate(near) is None:
+        return {
+            'message': PLACE_NOT_FOUND,
+            'candidates': [
+                {'place': name, 'match_score': score} for name, score in PROVIDER_INDEX.place_candidates(near)
+                ],
+        }
+
+    providers, total = available_providers(
+        appointment_type, first_name, last_name, location, specialty, ts, near, SEARCH_LIMIT
+        )
+    if total > len(providers):
+        return {'message': MORE_PROVIDERS.format(shown=len(providers), total=total), 'providers': providers}
+
+    return providers
+
+def available_providers(
+    appointment_type: Literal['NEW', 'EXISTING'],
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+    location: Optional[str] = None,
+    specialty: Optional[str] = None,
+    ts: Optional[datetime] = None,
+    near: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[List[dict], int]:
+    """
+    Providers matching the search_available_providers criteria and not booked at `ts`.
+
+    Args:
+        limit: Most providers to return (all if None)
+
+    Returns:
+        The providers, best match first, and how many match in all (at most
+        NEAREST_DEPARTMENTS with `near`)
     """
-    # Not parameterizing the query is totally unacceptable and a massive security issue, but would be
-    # easily solved when this code is refactored to use an ORM
+    # Set appointment duration based on type
+    duration = APPOINTMENT_MINUTES.get(appointment_type, APPOINTMENT_MINUTES['ESTABLISHED'])
+    # see bookings other worker processes made
+    BOOKINGS.refresh()
+
+    if PROVIDER_INDEX.ready:
+        providers, total = PROVIDER_INDEX.search(
+            duration,
+            first_name=first_name,
+            last_name=last_name,
+            location=location,
+            specialty=specialty,
+            ts=ts,
+            near=near or None,
+            nearest=NEAREST_DEPARTMENTS,
+            limit=limit,
+            )
+        # with `near` only the nearest are returned, so those are all there is to show
+        if near:
+            total = min(total, NEAREST_DEPARTMENTS)
+    else:
+        with init_db() as conn:
+            results = search_providers(
+                conn,
+                first_name=first_name,
+                last_name=last_name,
+                location=location,
+                specialty=specialty,
+                day=ts.weekday() if ts else None,
+                hour=ts.hour if ts else None,
+                minute=ts.minute if ts else 0,
+                duration=duration,
+                )
 
-    # Add time-based filters only if timestamp is provided
+        # Convert results to more readable format
+        total = len(results)
+        providers = [provider_dict(row) for row in results[:limit]]
+
+    # drop providers already booked at that time
     if ts:
-        day_of_week = ts.weekday()
-        hour = ts.hour
-
-        query += f"""
-            AND d.start_day <= {day_of_week}
-            AND d.end_day >= {day_of_week}
-            AND d.start_hour <= {hour}
-            AND d.end_hour >= {hour + (duration / 60)}
-        """
-
-    # Add optional filters
-    if first_name:
-        query += f" AND p.first_name ilike '{first_name}'"
-
-    if last_name:
-        query += f" AND p.last_name ilike '{last_name}'"
-
-    if specialty:
-        query += f" AND p.specialty ilike '{specialty}'"
-
-    if location:
-        query += f" AND d.name ilike '{location}'"
-
-    # Execute query using the connection
-    with init_db() as conn:
-        print(query)
-        results = conn.execute(query).fetchall()
-
-    # Convert results to more readable format
-    available_providers = []
-    for row in results:
-        provider = {
-            'provider_id': row[0],
-            'first_name': row[1],
-            'last_name': row[2],
-            'specialty': row[3],
-            'certification': row[4],
-            'department': {
-                'name': row[5],
-                'phone_number': row[6],
-                'address': row[7],
-                'hours': f"{row[10]}:00-{row[11]}:00",  # Using correct indices for hours
-                'days': f"{row[8]}-{row[9]}"  # Using correct indices for days
-            }
-        }
-        available_providers.append(provider)
+        free = [i for i in providers if BOOKINGS.is_free(i['provider_id'], ts, duration)]
+        total -= len(providers) - len(free)
+        providers = free
+
+    return providers, total
+
+def find_earliest_slots(
+    appointment_type: Literal['NEW', 'EXISTING'] = 'NEW',
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+    location: Optional[str] = None,
+    specialty: Optional[str] = None,
+    after: Optional[str] = None,
+    count: int = 5,
+) -> list:
+    """
+    Find the earliest open appointment times across matching providers and departments.
+
+    Args:
+        appointment_type: Type of appointment ('NEW' or 'EXISTING')
+        first_name: Provider's first name (optional)
+        last_name: Provider's last name (optional)
+        location: Department name (optional)
+        specialty: Provider's specialty (optional)
+        after: Earliest start in the format 'MM/DD/YYYY HH:MM:SS' (optional, defaults to now)
+        count: Number of times to return
+
+    Returns:
+        List of open times, earliest first, with the book_appointment arguments for each
+    """
+    start = datetime.strptime(after, '%m/%d/%Y %H:%M:%S') if after else datetime.now()
+    duration = APPOINTMENT_MINUTES.get(appointment_type, APPOINTMENT_MINUTES['ESTABLISHED'])
+    filters = {'first_name': first_name, 'last_name': last_name, 'location': location, 'specialty': specialty}
+    BOOKINGS.refresh()
+
+    if PROVIDER_INDEX.ready:
+        rows = PROVIDER_INDEX.match(duration, **filters)
+    else:
+        with init_db() as conn:
+            rows = search_providers(conn, **filters)
+
+    slots = earliest_slots(rows, start, duration, max(1, min(count, MAX_SLOTS)), SLOT_SEARCH_DAYS)
 
-    return available_providers
+    return [
+        {
+            'timestamp': ts.strftime('%m/%d/%Y %H:%M:%S'),
+            'provider_first_name': row.first_name,
+            'provider_last_name': row.last_name,
+            'specialty': row.specialty,
+            'location': row.department_name,
+        }
+        for ts, row in slots
+    ]
 
-def book_appointment(
+async def book_appointment(
+    first_name: str,
+    last_name: str,
+    dob: str,
     provider_first_name: str,
     provider_last_name: str,
     location: str,
     appointment_type: Literal['NEW', 'EXISTING'],
     timestamp: str,
+    ehr_id: Optional[str] = None,
     ):
-    # confirm provider is available
-    providers = search_available_providers(
-        appointment_type=appointment_type,
+    """
+    Book an appointment for a confirmed patient.
+
+    The patient is looked up again by name and date of birth, as the ID confirm_name_dob
+    returned isn't kept past the turn that confirmed them; nothing is booked unless
+    exactly one patient matches.
+
+    Args:
+        first_name: Patient's first name
+        last_name: Patient's last name
+        dob: Patient's date of birth in the format MM/DD/YYYY
+        provider_first_name: Provider's first name
+        provider_last_name: Provider's last name
+        location: Department name
+        appointment_type: Type of appointment ('NEW' or 'EXISTING')
+        timestamp: Appointment start in the format 'MM/DD/YYYY HH:MM:SS'
+        ehr_id: Patient's EHR ID, to tell apart patients sharing a name and date of birth (optional)
+
+    Returns:
+        A message saying whether the appointment was booked, or the closest providers for the
+        user to confirm if none is named exactly
+    """
+    ts = datetime.strptime(timestamp, '%m/%d/%Y %H:%M:%S')
+    duration = APPOINTMENT_MINUTES.get(appointment_type, APPOINTMENT_MINUTES['ESTABLISHED'])
+    if not on_slot(ts):
+        return TIME_OFF_GRID
+    if not ends_by_midnight(ts, duration):
+        return PAST_MIDNIGHT
+
+    # confirm provider is available for the whole appointment
+    providers, _ = await run_blocking(
+        available_providers,
+        appointment_type,
         first_name=provider_first_name,
         last_name=provider_last_name,
         location=location,
-        timestamp=timestamp
+        ts=ts,
         )
 
     if not providers:
-        return 'Provider not found or not available at that time. Try again.'
+        return PROVIDER_UNAVAILABLE
+
+    # only book a provider and department named exactly; the search also returns approximate
+    # matches ("Houser" -> House), which the user has to confirm first
+    exact = [
+        i for i in providers
+        if normalize(f"{i['first_name']} {i['last_name']}") == normalize(f"{provider_first_name} {provider_last_name}")
+        and normalize(i['department']['name']) == normalize(location)
+        ]
+    if not exact:
+        return {
+            'message': CONFIRM_PROVIDER,
+            'candidates': [
+                {
+                    'provider_first_name': i['first_name'],
+                    'provider_last_name': i['last_name'],
+                    'location': i['department']['name'],
+                    'match_score': i.get('match_score', 1.0),
+                }
+                for i in providers[:FUZZY_CANDIDATES]
+                ],
+        }
+
+    patient_data = await find_patient(first_name, last_name, dob, ehr_id)
+    if isinstance(patient_data, str):
+        return patient_data
 
     # if existing appointment, make sure patient has seen provider before in last 5 years
-    patient_data = Patient.get_by_id(1)
-    ts = datetime.strptime(timestamp, '%m/%d/%Y %H:%M:%S')
+    since = ts - timedelta(days=1825)
+    provider = exact[0]
     if appointment_type == 'EXISTING':
-        if not any(appt.timestamp > ts - timedelta(days=1825) for appt in patient_data.appointments if f"{provider_first_name} {provider_last_name}" in appt.provider):
-            return 'Patient has not seen provider in last 5 years. You must schedule a NEW appointment.'
+        if not patient_data.seen_since(since, provider=f"{provider['first_name']} {provider['last_name']}"):
+            return NEW_APPOINTMENT_REQUIRED
 
     # if new appointment, make sure patient has not had an appointment in the last 5 years
     if appointment_type == 'NEW':
-        if any(appt.timestamp > ts - timedelta(days=1825) for appt in patient_data.appointments):
-            return 'Patient has had an appointment in the last 5 years. You must schedule an EXISTING appointment.'
+        if patient_data.seen_since(since):
+            return EXISTING_APPOINTMENT_REQUIRED
 
-    return 'Appointment scheduled.'
+    # may wait on other processes' bookings and write the booking log, so off the event loop
+    booking = await run_blocking(
+        BOOKINGS.reserve,
+        provider['provider_id'],
+        provider['department']['name'],
+        patient_data.id,
+        ts,
+        duration,
+        )
+
+    # another booking took the slot since the availability check
+    if booking is None:
+        return SLOT_TAKEN
+
+    # the booking changes the patient's record, so the next read must go to the EHR
+    Patient.invalidate(patient_data.id)
+
+    return APPOINTMENT_SCHEDULED
 
 TOOL_CALL_MAP = {
     'confirm_name_dob': confirm_name_dob,
     'search_available_providers': search_available_providers,
+    'find_earliest_slots': find_earliest_slots,
     'book_appointment': book_appointment
 }
+
+# per-tool timeouts (seconds)
+TOOL_TIMEOUTS = {
+    'confirm_name_dob': 10,
+    'search_available_providers': 5,
+    'find_earliest_slots': 5,
+    'book_appointment': 15,
+}
+
+# deterministic tool outcomes answered from a template instead of another completion
+FAST_PATH_TEMPLATES = {
+    ('confirm_name_dob', PATIENT_NOT_FOUND): 'fast_patient_not_found',
+    ('book_appointment', APPOINTMENT_SCHEDULED): 'fast_appointment_scheduled',
+    ('book_appointment', NEW_APPOINTMENT_REQUIRED): 'fast_new_appointment_required',
+    ('book_appointment', EXISTING_APPOINTMENT_REQUIRED): 'fast_existing_appointment_required',
+}
@@ -0,0 +1,154 @@
+"""Opt-in request trace recorder."""
+from typing import Any, Iterator, List, Optional
+import fcntl
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from pydantic import BaseModel
+from .timing import SPANS
+from ..env_settings import TRACE_ENABLED, TRACE_DIR, TRACE_MAX_BYTES, TRACE_BACKUPS
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = 'traces.jsonl.gz'
+# held while appending to or rotating the trace file, which worker processes share
+LOCK_FILE = '.traces.lock'
+
+# trace of the current request, if it is being recorded
+TRACE: ContextVar[Optional[dict]] = ContextVar('trace', default=None)
+
+
+def tracing() -> bool:
+    """Whether the current request is being recorded (check before building costly event data)."""
+    return TRACE.get() is not None
+
+
+def record(kind: str, **data: Any) -> None:
+    """Add an event (`llm`, `tool`, `ehr` or `ehr_search`) to the current request's trace, if any."""
+    trace = TRACE.get()
+
+    if trace is not None:
+        # snapshot, as e.g. a loop's rendered messages keep growing after the call
+        trace.setdefault(kind, []).append(json.loads(json.dumps(data, default=str)))
+
+
+class TraceRecorder:
+    """Writes request traces to gzip-compressed JSONL files.
+
+    Each trace holds the input messages, pipeline settings, every completion
+    request and response, tool arguments and results, EHR records and stage
+    timings of one request. Traces are written by a background thread; the
+    current file is rotated once it is `max_bytes` long, keeping the
+    `backups` newest rotated files.
+
+    Worker processes share the file: each trace is compressed into one gzip
+    member and appended with a single write, and appends and rotation happen
+    under an exclusive `lockf` on a lock file in the directory, so members
+    never interleave and the file is rotated once, by whichever process sees
+    it reach `max_bytes`.
+
+    Args:
+        directory (str): Trace directory
+        max_bytes (int): Size of the current (compressed) file at which it is rotated
+        backups (int): Rotated files to keep
+    """
+    def __init__(self, directory: str, max_bytes: int, backups: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace')
+
+    @property
+    def path(self) -> Path:
+        """Current trace file."""
+        return self.directory / TRACE_FILE
+
+    def _rotate(self) -> None:
+        self.path.rename(self.directory / f"traces-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.jsonl.gz")
+
+        for old in sorted(self.directory.glob('traces-*.jsonl.gz'), key=os.path.getmtime)[:-self.backups or None]:
+            old.unlink()
+
+    def _write(self, trace: dict) -> None:
+        try:
+            # one gzip member per trace, so a crash never corrupts earlier traces
+            member = gzip.compress((json.dumps(trace, default=str) + '\n').encode('utf-8'))
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            lock = os.open(self.directory / LOCK_FILE, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+                # reopened every time, as another process may have rotated the file
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, member)
+                    size = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+                if size >= self.max_bytes:
+                    self._rotate()
+            finally:
+                # closing releases the lock
+                os.close(lock)
+        except OSError:
+            logger.exception("Failed to write trace %s", trace.get('id'))
+
+    @contextmanager
+    def record(self, endpoint: str, messages: List[Any], pipeline: dict) -> Iterator[dict]:
+        """Record the request handled in the block; set `response` on the yielded trace."""
+        trace = {
+            'id': uuid.uuid4().hex,
+            'time': time.time(),
+            'endpoint': endpoint,
+            'pipeline': pipeline,
+            'messages': [i.model_dump() for i in messages],
+        }
+        token = TRACE.set(trace)
+
+        try:
+            yield trace
+        except Exception as err:
+            trace['error'] = repr(err)
+            raise
+        finally:
+            TRACE.reset(token)
+            trace['spans'] = dict(SPANS.get() or {})
+            self._writer.submit(self._write, trace)
+
+    def close(self) -> None:
+        """Flush pending traces."""
+        self._writer.shutdown(wait=True)
+
+
+TRACER = TraceRecorder(TRACE_DIR, TRACE_MAX_BYTES, TRACE_BACKUPS) if TRACE_ENABLED else None
+
+
+@contextmanager
+def traced(endpoint: str, messages: List[Any], pipeline: BaseModel) -> Iterator[dict]:
+    """Record a request with `TRACER` if tracing is enabled.
+
+    Yields:
+        dict: Trace to set the `response` on (discarded if tracing is off)
+    """
+    if TRACER is None:
+        yield {}
+        return
+
+    with TRACER.record(endpoint, messages, pipeline.model_dump()) as trace:
+        yield trace
+
+
+def read_traces(paths: List[str]) -> Iterator[dict]:
+    """Traces from trace files, in file order."""
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
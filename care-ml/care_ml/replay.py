@@ -0,0 +1,197 @@
+"""Replay recorded request traces offline.
+
+Re-runs traces written by the trace recorder (TRACE_ENABLED) through
+`Pipeline`, with the recorded completions, EHR records and patient searches
+substituted, so a slow or wrong turn can be reproduced and profiled without
+network access. Traces of streaming endpoints are re-run through
+`Pipeline.stream`, with each recorded completion streamed as one chunk.
+Tools and provider queries run for real against DB_FILE; bookings go to an
+empty in-memory store per trace, never to the service's booking log.
+
+Usage:
+    python -m care_ml.replay traces/traces.jsonl.gz [--id ID] [--repeat N] [--profile] [--out replay.prof]
+
+For a sampling profile, run the same command under an external sampler,
+e.g. `py-spy record -o replay.svg -- python -m care_ml.replay ...`.
+"""
+from typing import AsyncIterator, Dict, List
+import argparse
+import asyncio
+import cProfile
+import json
+import pstats
+import sys
+import time
+from collections import defaultdict, deque
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from .ml import ehr_connector, slots, tools
+from .ml.booking import BookingStore
+from .ml.completion_cache import COMPLETION_CACHE
+from .ml.db import DB_POOL
+from .ml.ehr_connector import PATIENT_CACHE
+from .ml.message import Message
+from .ml.pipeline import Pipeline
+from .ml.provider_index import PROVIDER_INDEX
+from .ml.trace import read_traces
+from .env_settings import PROVIDER_INDEX_ENABLED
+
+
+class ReplayCompletions:
+    """Serves the recorded completions of a trace, in order."""
+    def __init__(self, events: List[dict]):
+        self.events = deque(events)
+        self.mismatches = 0
+
+    async def create(self, stream: bool = False, stream_options: dict = None, **params) -> ChatCompletion:
+        """Next recorded completion; counts requests that differ from the recorded one."""
+        if not self.events:
+            raise RuntimeError("Trace has no more recorded completions")
+
+        event = self.events.popleft()
+        if json.loads(json.dumps(params, default=str)) != event['request']:
+            self.mismatches += 1
+
+        if stream:
+            return self._chunks(event)
+
+        return ChatCompletion.model_validate({
+            'id': 'replay',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': event['request'].get('model', 'replay'),
+            'choices': [{'index': 0, 'message': event['response'], 'finish_reason': 'stop'}],
+        })
+
+    @staticmethod
+    async def _chunks(event: dict) -> AsyncIterator[ChatCompletionChunk]:
+        response = event['response']
+        yield ChatCompletionChunk.model_validate({
+            'id': 'replay',
+            'object': 'chat.completion.chunk',
+            'created': 0,
+            'model': event['request'].get('model', 'replay'),
+            'choices': [{
+                'index': 0,
+                'delta': {
+                    'role': 'assistant',
+                    'content': response.get('content'),
+                    'tool_calls': [{'index': i, **call} for i, call in enumerate(response.get('tool_calls') or [])],
+                },
+                'finish_reason': 'stop',
+            }],
+        })
+
+
+class ReplayClient:
+    """Stands in for AsyncOpenAI."""
+    def __init__(self, events: List[dict]):
+        self.completions = ReplayCompletions(events)
+        self.chat = self
+
+
+class ReplayEHR:
+    """Serves the recorded patient records and searches of a trace, in order per patient or search."""
+    def __init__(self, events: List[dict], searches: List[dict] = ()):
+        self.records: Dict[int, deque] = defaultdict(deque)
+        for event in events:
+            self.records[event['patient_id']].append(event['record'])
+
+        self.searches: Dict[tuple, deque] = defaultdict(deque)
+        for event in searches:
+            self.searches[event['name'], event['dob']].append(event['records'])
+
+    async def get_patient(self, idx: int) -> dict:
+        """Next recorded record of a patient (the last one is reused)."""
+        records = self.records[idx]
+        if not records:
+            raise RuntimeError(f"Trace has no record of patient {idx}")
+
+        return records.popleft() if len(records) > 1 else records[0]
+
+    async def search_patients(self, name: str, dob: str) -> List[dict]:
+        """Next recorded result of a search (the last one is reused)."""
+        results = self.searches[name, dob]
+        if not results:
+            raise RuntimeError(f"Trace has no search for {name} {dob}")
+
+        return results.popleft() if len(results) > 1 else results[0]
+
+
+async def replay(trace: dict) -> dict:
+    """Re-run a trace and compare the result with the recorded one."""
+    client = ReplayClient(trace.get('llm', []))
+    ehr_connector.EHR_CLIENT = ReplayEHR(trace.get('ehr', []), trace.get('ehr_search', []))
+    PATIENT_CACHE.clear()
+    tools.BOOKINGS = slots.BOOKINGS = BookingStore(None)
+
+    pipeline = Pipeline(**trace['pipeline'])
+    pipeline.__dict__['openai_client'] = client
+
+    messages = [Message(**i) for i in trace['messages']]
+    start = time.perf_counter()
+    if trace['endpoint'].endswith('/stream'):
+        response = None
+        async for event in pipeline.stream(messages):
+            if event.event == 'done':
+                response = Message(**event.data['message'])
+    else:
+        response = await pipeline(messages)
+
+    return {
+        'id': trace['id'],
+        'endpoint': trace['endpoint'],
+        'replay_ms': round((time.perf_counter() - start) * 1000, 3),
+        'recorded_spans_ms': trace.get('spans', {}),
+        'same_response': response.model_dump() == trace.get('response'),
+        'request_mismatches': client.completions.mismatches,
+        'unused_completions': len(client.completions.events),
+    }
+
+
+def main() -> None:
+    """Replay CLI."""
+    parser = argparse.ArgumentParser(prog='python -m care_ml.replay', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Trace files')
+    parser.add_argument('--id', action='append', help='Only replay these trace IDs (repeatable)')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay every trace this many times')
+    parser.add_argument('--profile', action='store_true', help='Profile the replay with cProfile')
+    parser.add_argument('--sort', default='cumulative', help='pstats sort key')
+    parser.add_argument('--limit', type=int, default=40, help='Profile rows to print')
+    parser.add_argument('--out', help='Write the raw profile here (e.g. for snakeviz)')
+    args = parser.parse_args()
+
+    traces = [i for i in read_traces(args.paths) if not args.id or i['id'] in args.id]
+    if not traces:
+        parser.error('no matching traces')
+
+    # every completion must come from the trace
+    COMPLETION_CACHE.stages = frozenset()
+    DB_POOL.open()
+    if PROVIDER_INDEX_ENABLED:
+        PROVIDER_INDEX.load()
+
+    async def run() -> List[dict]:
+        return [await replay(trace) for _ in range(args.repeat) for trace in traces]
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    results = asyncio.run(run())
+    if profiler:
+        profiler.disable()
+
+    for result in results:
+        print(json.dumps(result))
+
+    if profiler:
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats(args.sort).print_stats(args.limit)
+        if args.out:
+            stats.dump_stats(args.out)
+
+    DB_POOL.close()
+
+
+if __name__ == '__main__':
+    main()
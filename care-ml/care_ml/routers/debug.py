@@ -2,8 +2,15 @@
 from typing import Optional
 from pydantic import BaseModel
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 from ..models import Patient
+from ..ml.ehr_connector import PATIENT_CACHE
+from ..ml.db import DB_POOL
+from ..ml.sessions import SESSIONS
+from ..ml.completion_cache import COMPLETION_CACHE
+from ..ml.booking import BOOKINGS
 from ..ml.message import Role, Message
+from ..ml import metrics as ml_metrics
 
 router = APIRouter()
 
@@ -14,9 +21,28 @@ class PromptRequest(BaseModel):
     prompt_kwargs: Optional[dict] = None
 
 @router.get('/user')
-def patient() -> Patient:
+async def patient() -> Patient:
     """Test API retrieval of patient data."""
-    return Patient.get_by_id(1).model_dump()
+    return await Patient.get_by_id(1)
+
+@router.get('/db')
+def db() -> dict:
+    """Database pool health."""
+    return {'open': DB_POOL.is_open, 'healthy': DB_POOL.healthy()}
+
+@router.get('/cache')
+def cache() -> dict:
+    """Cache statistics."""
+    return {
+        'patient': PATIENT_CACHE.stats(),
+        'sessions': SESSIONS.stats(),
+        'completions': COMPLETION_CACHE.stats(),
+    }
+
+@router.get('/bookings')
+def bookings() -> dict:
+    """Booking store statistics."""
+    return BOOKINGS.stats()
 
 @router.post('/prompt')
 def prompt(data: PromptRequest) -> Message:
@@ -26,3 +52,8 @@ def prompt(data: PromptRequest) -> Message:
         data.role,
         prompt_kwargs=data.prompt_kwargs
         )
+
+@router.get('/metrics', response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Span histograms and token counters in the Prometheus text format."""
+    return PlainTextResponse(ml_metrics.expose(), media_type='text/plain; version=0.0.4')
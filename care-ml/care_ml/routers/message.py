@@ -1,9 +1,16 @@
 """Message endpoints."""
-from typing import List
+from typing import AsyncIterator, List
+import json
+import logging
 from pydantic import BaseModel
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from ..ml.message import Message
+from ..ml.pipeline import StreamEvent
 from ..ml.services import PIPELINE
+from ..ml.trace import traced
+
+logger = logging.getLogger(__name__)
 
 
 class MessageRequest(BaseModel):
@@ -21,6 +28,39 @@ router = APIRouter()
 @router.post('/create')
 async def message(msg: MessageRequest) -> MessageResponse:
     """Message endpoint."""
-    return MessageResponse(
-        message=await PIPELINE(msg.messages)
+    with traced('/message/create', msg.messages, PIPELINE) as trace:
+        response = await PIPELINE(msg.messages)
+        trace['response'] = response.model_dump()
+
+    return MessageResponse(message=response)
+
+async def traced_stream(
+    endpoint: str,
+    messages: List[Message],
+    events: AsyncIterator[StreamEvent]
+    ) -> AsyncIterator[StreamEvent]:
+    """Record a streamed request with `traced`, its response taken from the `done` event."""
+    with traced(endpoint, messages, PIPELINE) as trace:
+        async for event in events:
+            if event.event == 'done':
+                trace['response'] = event.data['message']
+            yield event
+
+async def event_stream(events: AsyncIterator[StreamEvent]) -> AsyncIterator[str]:
+    """Format pipeline stream events as server-sent events."""
+    try:
+        async for event in events:
+            yield f"event: {event.event}\ndata: {json.dumps(event.data)}\n\n"
+    except Exception as err:  # pylint: disable=broad-except
+        # headers are already sent, so report the failure in-band
+        logger.exception("Message stream failed")
+        yield f"event: error\ndata: {json.dumps({'detail': str(err)})}\n\n"
+
+@router.post('/stream')
+async def stream(msg: MessageRequest) -> StreamingResponse:
+    """Streaming message endpoint (server-sent events)."""
+    return StreamingResponse(
+        event_stream(traced_stream('/message/stream', msg.messages, PIPELINE.stream(msg.messages))),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
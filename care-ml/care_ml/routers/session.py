@@ -0,0 +1,110 @@
+"""Session endpoints."""
+from typing import AsyncIterator, List
+import logging
+from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from ..ml.message import ChatHistory, Message, Role
+from ..ml.pipeline import StreamEvent
+from ..ml.services import PIPELINE
+from ..ml.sessions import SESSIONS
+from ..ml.trace import traced
+from .message import MessageRequest, MessageResponse, event_stream, traced_stream
+
+
+class SessionRequest(BaseModel):
+    """Session request"""
+    messages: List[Message] = []
+
+
+class SessionResponse(BaseModel):
+    """Session response"""
+    session_id: str
+
+
+class TurnRequest(BaseModel):
+    """New user message"""
+    content: str
+
+
+logger = logging.getLogger(__name__)
+
+# the session was deleted or expired while a turn was being answered
+SESSION_ENDED = 'Session ended or expired during the turn; the turn was not saved'
+
+router = APIRouter()
+
+def _history(session_id: str) -> ChatHistory:
+    history = SESSIONS.get(session_id)
+
+    if history is None:
+        raise HTTPException(status_code=404, detail='Session not found or expired')
+
+    return history
+
+@router.post('')
+def create(data: SessionRequest) -> SessionResponse:
+    """Start a session, optionally seeded with an existing conversation."""
+    try:
+        return SessionResponse(session_id=SESSIONS.create(data.messages))
+    except ValueError as err:
+        raise HTTPException(status_code=422, detail=str(err)) from err
+
+@router.get('/{session_id}')
+def get(session_id: str) -> MessageRequest:
+    """Session conversation history."""
+    return MessageRequest(messages=_history(session_id).root)
+
+@router.delete('/{session_id}')
+def delete(session_id: str) -> None:
+    """End a session."""
+    SESSIONS.delete(session_id)
+
+@router.post('/{session_id}/message')
+async def message(session_id: str, turn: TurnRequest) -> MessageResponse:
+    """Send the next user message of a session."""
+    user_message = Message(role=Role.USER, content=turn.content)
+    messages = [*_history(session_id).root, user_message]
+
+    with traced('/session/message', messages, PIPELINE) as trace:
+        response = await PIPELINE(messages)
+        trace['response'] = response.model_dump()
+
+    try:
+        SESSIONS.extend(session_id, user_message, response)
+    except KeyError as err:
+        raise HTTPException(status_code=410, detail=SESSION_ENDED) from err
+
+    return MessageResponse(message=response)
+
+async def _stream_turn(
+    session_id: str,
+    user_message: Message,
+    events: AsyncIterator[StreamEvent]
+    ) -> AsyncIterator[StreamEvent]:
+    async for event in events:
+        ended = False
+        if event.event == 'done':
+            try:
+                SESSIONS.extend(session_id, user_message, Message(**event.data['message']))
+            except KeyError:
+                logger.warning("Session %s ended during a streamed turn", session_id)
+                ended = True
+
+        # the client still gets the reply it has been streamed
+        yield event
+        if ended:
+            yield StreamEvent(event='error', data={'detail': SESSION_ENDED})
+
+@router.post('/{session_id}/stream')
+async def stream(session_id: str, turn: TurnRequest) -> StreamingResponse:
+    """Send the next user message of a session and stream the response."""
+    user_message = Message(role=Role.USER, content=turn.content)
+    messages = [*_history(session_id).root, user_message]
+    events = traced_stream('/session/stream', messages, PIPELINE.stream(messages))
+
+    return StreamingResponse(
+        event_stream(_stream_turn(session_id, user_message, events)),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,160 @@
+"""Serve the ML app from several worker processes.
+
+Loads the app and the provider index once, then forks WEB_CONCURRENCY
+uvicorn workers (by default one per CPU) that accept connections from one
+shared listening socket. Forked workers share the index's memory
+copy-on-write instead of each building its own. The parent restarts workers
+that die and stops them all on SIGTERM or SIGINT.
+
+With more than one worker, sessions and the patient and completion caches are
+kept in SHARED_STATE_DIR (a new temporary directory unless set), so every
+worker sees every session and cache entry; all workers append to the same
+booking log (BOOKING_WAL_PATH). With one worker the app runs in this process,
+with in-process state.
+
+Usage:
+    python -m care_ml.serve [--host 0.0.0.0] [--port 3050] [--workers N]
+"""
+from typing import Dict
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+
+logger = logging.getLogger('care_ml.serve')
+
+# a worker that dies sooner than this after starting is restarted after a pause,
+# so a crash at startup doesn't turn into a fork loop
+MIN_WORKER_LIFETIME = 1.0
+
+
+def listen(host: str, port: int) -> socket.socket:
+    """Bound, listening TCP socket the workers share."""
+    sock = socket.create_server((host, port), family=socket.AF_INET6 if ':' in host else socket.AF_INET, backlog=2048)
+    sock.set_inheritable(True)
+
+    return sock
+
+
+def preload() -> None:
+    """Build what every worker needs before forking, so it is built once and shared."""
+    from .ml.db import DB_POOL
+    from .ml.provider_index import PROVIDER_INDEX
+    from .env_settings import PROVIDER_INDEX_ENABLED
+
+    if PROVIDER_INDEX_ENABLED:
+        PROVIDER_INDEX.load()
+    # each worker opens its own database connections
+    DB_POOL.close()
+
+    # keep collections in workers from touching (and so copying) the preloaded objects' pages
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    """Serve on the shared socket until told to stop; runs in a forked child."""
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan='on'))
+    server.run(sockets=[sock])
+
+
+def spawn(app, sock: socket.socket, log_level: str) -> int:
+    """Fork a worker."""
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, log_level)
+        except BaseException:  # pylint: disable=broad-except
+            logger.exception("Worker %s failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)  # pylint: disable=protected-access
+
+    return pid
+
+
+def supervise(app, sock: socket.socket, workers: int, log_level: str) -> None:
+    """Keep `workers` workers running until SIGTERM or SIGINT, then stop them."""
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[spawn(app, sock, log_level)] = time.monotonic()
+    logger.info("Started %s workers", workers)
+
+    while children:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        logger.warning("Worker %s exited with status %s, restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        if not stopping:
+            children[spawn(app, sock, log_level)] = time.monotonic()
+
+
+def main() -> None:
+    """Server CLI."""
+    parser = argparse.ArgumentParser(prog='python -m care_ml.serve', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address')
+    parser.add_argument('--port', type=int, default=3050, help='Bind port')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY') or 0),
+                        help='Worker processes (default: WEB_CONCURRENCY, or one per CPU)')
+    parser.add_argument('--log-level', default='info', help='uvicorn log level')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    if workers > 1:
+        # before anything reads the settings
+        if not os.getenv('SHARED_STATE_DIR'):
+            os.environ['SHARED_STATE_DIR'] = tempfile.mkdtemp(prefix='care-ml-state-')
+        os.makedirs(os.environ['SHARED_STATE_DIR'], exist_ok=True)
+
+    from .main import app
+    from .log import setup_logging, stream_handler
+
+    if workers == 1:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    # log the preload, then stop the listener thread, which forks would copy without its state;
+    # the supervisor writes its few records directly
+    log_listener = setup_logging()
+    logger.info("Preloading for %s workers, shared state in %s", workers, os.environ['SHARED_STATE_DIR'])
+    preload()
+    log_listener.stop()
+    logger.handlers = [stream_handler()]
+    logger.propagate = False
+
+    sock = listen(args.host, args.port)
+    supervise(app, sock, workers, args.log_level)
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""Load-test harness for the ML service.
+
+Runs the FastAPI app against a local OpenAI-compatible mock and the Flask EHR
+stub, drives scripted conversations at a set concurrency and reports latency
+percentiles, throughput, error rate and per-stage timings as JSON.
+
+Usage (from `care-ml/`): `python -m loadtest --help`
+"""
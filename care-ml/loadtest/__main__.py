@@ -0,0 +1,69 @@
+"""Load-test CLI."""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from .harness import services, drive, report
+from .scenarios import SCENARIOS
+
+
+def main() -> None:
+    """Run a load test and print (or write) the JSON report."""
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description=__doc__)
+    parser.add_argument('--conversations', type=int, default=100, help='Conversations to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='Conversations in flight')
+    parser.add_argument('--warmup', type=int, default=len(SCENARIOS), help='Unmeasured conversations run first')
+    parser.add_argument('--latency', default='lognormal:800,0.4',
+                        help='Mock completion latency (ms): fixed:MS, uniform:LOW,HIGH, normal:MEAN,SD, lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--mode', choices=['two_stage', 'single_loop'], default='two_stage', help='Pipeline mode')
+    parser.add_argument('--workers', type=int, default=1, help='ML app worker processes')
+    parser.add_argument('--scenario', action='append', choices=[i.name for i in SCENARIOS],
+                        help='Only run these scenarios (repeatable)')
+    parser.add_argument('--completion-cache', action='store_true',
+                        help='Leave the completion cache on (scripted conversations repeat, so it skews results)')
+    parser.add_argument('--ehr-url', help='Use a running EHR stub instead of starting one')
+    parser.add_argument('--log-dir', type=Path, help='Directory for service logs (default: temporary)')
+    parser.add_argument('--out', type=Path, help='Write the report here instead of stdout')
+    args = parser.parse_args()
+
+    scenarios = [i for i in SCENARIOS if not args.scenario or i.name in args.scenario]
+    log_dir = args.log_dir or Path(tempfile.mkdtemp(prefix='loadtest-'))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    config = {
+        'conversations': args.conversations,
+        'concurrency': args.concurrency,
+        'latency': args.latency,
+        'mode': args.mode,
+        'workers': args.workers,
+        'scenarios': [i.name for i in scenarios],
+        'completion_cache': args.completion_cache,
+    }
+
+    with services(
+        args.latency,
+        args.mode,
+        log_dir,
+        ehr_url=args.ehr_url,
+        workers=args.workers,
+        env={'COMPLETION_CACHE_ENABLED': str(args.completion_cache).lower()},
+        ) as base_url:
+        if args.warmup:
+            asyncio.run(drive(base_url, scenarios, args.warmup, args.concurrency))
+
+        start = time.perf_counter()
+        samples = asyncio.run(drive(base_url, scenarios, args.conversations, args.concurrency))
+        result = report(samples, time.perf_counter() - start, config)
+
+    result['log_dir'] = str(log_dir)
+    output = json.dumps(result, indent=2)
+
+    if args.out:
+        args.out.write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
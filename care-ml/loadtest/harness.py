@@ -0,0 +1,255 @@
+"""Service processes, load driver and report."""
+from typing import Dict, Iterator, List, NamedTuple, Optional
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager, ExitStack
+from pathlib import Path
+import httpx
+from .scenarios import Scenario
+
+ML_ROOT = Path(__file__).resolve().parents[1]
+REPO_ROOT = ML_ROOT.parent
+EHR_STUB = REPO_ROOT / 'api' / 'flask-app.py'
+PROVIDER_DB = REPO_ROOT / 'data' / 'providers.db'
+
+
+class Sample(NamedTuple):
+    """One `/message/create` request."""
+    scenario: str
+    latency_ms: float
+    ok: bool
+    stages: Dict[str, float]
+    error: Optional[str] = None
+
+
+def free_port() -> int:
+    """Unused local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    """Wait until `url` answers, or fail if the process exits first."""
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+@contextmanager
+def service(name: str, args: List[str], url: str, log_dir: Path, env: Optional[dict] = None) -> Iterator[str]:
+    """Run a service process until the block exits.
+
+    Args:
+        name (str): Name of the log file
+        args (List[str]): Command
+        url (str): URL answering once the service is up
+        log_dir (Path): Directory for the service's output
+        env (Optional[dict]): Extra environment variables
+
+    Yields:
+        str: `url`
+    """
+    with open(log_dir / f"{name}.log", 'wb') as log:
+        process = subprocess.Popen(
+            args,
+            cwd=ML_ROOT,
+            env={**os.environ, **(env or {})},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            )
+        try:
+            wait_ready(url, process)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+@contextmanager
+def services(
+    latency: str,
+    mode: str,
+    log_dir: Path,
+    ehr_url: Optional[str] = None,
+    workers: int = 1,
+    env: Optional[dict] = None,
+    ) -> Iterator[str]:
+    """Start the mock OpenAI server, the EHR stub (unless `ehr_url` is given) and the ML app.
+
+    Yields:
+        str: ML app URL
+    """
+    with ExitStack() as stack:
+        port = free_port()
+        openai_url = stack.enter_context(service(
+            'openai',
+            [sys.executable, '-m', 'loadtest.mock_openai', '--port', str(port), '--latency', latency],
+            f"http://127.0.0.1:{port}",
+            log_dir,
+            ))
+
+        if ehr_url is None:
+            port = free_port()
+            ehr_url = stack.enter_context(service(
+                'ehr',
+                [sys.executable, '-m', 'flask', '--app', str(EHR_STUB), 'run', '--port', str(port)],
+                f"http://127.0.0.1:{port}",
+                log_dir,
+                ))
+
+        # every run starts without bookings
+        wal = log_dir / 'bookings.wal'
+        wal.unlink(missing_ok=True)
+
+        port = free_port()
+        yield stack.enter_context(service(
+            'ml',
+            [
+                sys.executable, '-m', 'care_ml.serve',
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+                ],
+            f"http://127.0.0.1:{port}",
+            log_dir,
+            env={
+                'OPENAI_BASE_URL': f"{openai_url}/v1",
+                'OPENAI_API_KEY': 'loadtest',
+                'API_URL': ehr_url,
+                'DB_FILE': str(PROVIDER_DB),
+                'BOOKING_WAL_PATH': str(wal),
+                'PIPELINE_MODE': mode,
+                **(env or {}),
+                },
+            ))
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Durations (ms) by name from a `Server-Timing` header."""
+    stages = {}
+
+    for metric in filter(None, (i.strip() for i in header.split(','))):
+        name, *params = metric.split(';')
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                stages[name.strip()] = float(value)
+
+    return stages
+
+
+async def run_conversation(client: httpx.AsyncClient, scenario: Scenario, samples: List[Sample]) -> None:
+    """Play a scenario turn by turn, stopping at the first failed turn."""
+    messages = []
+
+    for turn in scenario.turns:
+        messages.append({'role': 'user', 'content': turn.user})
+        start = time.perf_counter()
+
+        try:
+            response = await client.post('/message/create', json={'messages': messages})
+            latency_ms = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+        except httpx.HTTPError as err:
+            samples.append(Sample(scenario.name, (time.perf_counter() - start) * 1000, False, {}, repr(err)))
+            return
+
+        samples.append(Sample(
+            scenario.name,
+            latency_ms,
+            True,
+            parse_server_timing(response.headers.get('server-timing', '')),
+            ))
+        messages.append(response.json()['message'])
+
+
+async def drive(
+    base_url: str,
+    scenarios: List[Scenario],
+    conversations: int,
+    concurrency: int,
+    timeout: float = 60,
+    ) -> List[Sample]:
+    """Run `conversations` scenarios (cycling through `scenarios`) with `concurrency` in flight."""
+    queue = asyncio.Queue()
+    for scenario in itertools.islice(itertools.cycle(scenarios), conversations):
+        queue.put_nowait(scenario)
+
+    samples: List[Sample] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            while not queue.empty():
+                await run_conversation(client, queue.get_nowait(), samples)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return samples
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile (`q` in 0-100) of unsorted values."""
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> dict:
+    """Count, mean and percentiles (ms)."""
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 2) if values else 0.0,
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(max(values), 2) if values else 0.0,
+    }
+
+
+def report(samples: List[Sample], duration: float, config: dict) -> dict:
+    """Load-test report."""
+    ok = [i for i in samples if i.ok]
+    stages: Dict[str, List[float]] = {}
+    scenarios: Dict[str, List[float]] = {}
+
+    for sample in ok:
+        scenarios.setdefault(sample.scenario, []).append(sample.latency_ms)
+        for name, duration_ms in sample.stages.items():
+            stages.setdefault(name, []).append(duration_ms)
+
+    return {
+        'config': config,
+        'duration_s': round(duration, 3),
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'error_rate': round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(ok) / duration, 2) if duration else 0.0,
+        'latency_ms': summarize([i.latency_ms for i in ok]),
+        'stages_ms': {name: summarize(values) for name, values in sorted(stages.items())},
+        'scenarios_ms': {name: summarize(values) for name, values in sorted(scenarios.items())},
+        'sample_errors': sorted({i.error for i in samples if i.error})[:10],
+    }
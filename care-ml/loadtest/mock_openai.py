@@ -0,0 +1,146 @@
+"""OpenAI-compatible chat completions mock with configurable latency.
+
+Answers from the scripted turns in `scenarios.SCRIPT`, keyed by the last
+user message of the request. Run with
+`python -m loadtest.mock_openai --port 8100 --latency lognormal:800,0.4`.
+"""
+from typing import Callable, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from .scenarios import SCRIPT, DEFAULT_REPLY
+
+# streamed replies are split into chunks of this many characters
+STREAM_CHUNK_CHARS = 16
+
+
+def latency_sampler(spec: str) -> Callable[[], float]:
+    """Sampler of latencies (seconds) from a spec in milliseconds.
+
+    Args:
+        spec (str): `fixed:MS`, `uniform:LOW,HIGH`, `normal:MEAN,SD` or
+            `lognormal:MEDIAN,SIGMA`
+
+    Returns:
+        Callable[[], float]: Latency sampler
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(i) for i in args.split(',')] if args else []
+
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def scripted_message(body: dict) -> dict:
+    """Assistant message the script gives for a completion request."""
+    messages = body['messages']
+    user = next((i['content'] for i in reversed(messages) if i['role'] == 'user'), '')
+    turn = SCRIPT.get(user)
+
+    # tools are only called straight after the user message, once per turn
+    if (
+        turn and turn.tool_calls and body.get('tools')
+        and body.get('tool_choice') != 'none' and messages[-1]['role'] == 'user'
+        ):
+        return {
+            'role': 'assistant',
+            'content': None,
+            'tool_calls': [
+                {
+                    'id': f"call_{uuid.uuid4().hex[:24]}",
+                    'type': 'function',
+                    'function': {'name': name, 'arguments': json.dumps(arguments)},
+                }
+                for name, arguments in turn.tool_calls
+            ],
+        }
+
+    return {'role': 'assistant', 'content': turn.reply if turn else DEFAULT_REPLY}
+
+
+def create_app(latency: Callable[[], float]) -> FastAPI:
+    """Mock app.
+
+    Args:
+        latency (Callable[[], float]): Sampler of the delay before a response
+            (or before the first streamed chunk), in seconds
+    """
+    app = FastAPI()
+
+    def envelope(body: dict, obj: str, choices: List[dict]) -> dict:
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': obj,
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': choices,
+        }
+
+    @app.get('/')
+    async def index():
+        return 'ok'
+
+    @app.post('/v1/chat/completions')
+    async def completions(request: Request):
+        body = await request.json()
+        message = scripted_message(body)
+        finish_reason = 'tool_calls' if message.get('tool_calls') else 'stop'
+        await asyncio.sleep(latency())
+
+        if not body.get('stream'):
+            return {
+                **envelope(body, 'chat.completion', [
+                    {'index': 0, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}
+                    ]),
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            }
+
+        def chunk(delta: dict, reason: Optional[str] = None) -> str:
+            data = envelope(body, 'chat.completion.chunk', [
+                {'index': 0, 'delta': delta, 'finish_reason': reason, 'logprobs': None}
+                ])
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            yield chunk({'role': 'assistant', 'content': ''})
+            for i, tool_call in enumerate(message.get('tool_calls') or []):
+                yield chunk({'tool_calls': [{'index': i, **tool_call}]})
+            content = message.get('content') or ''
+            for start in range(0, len(content), STREAM_CHUNK_CHARS):
+                yield chunk({'content': content[start:start + STREAM_CHUNK_CHARS]})
+            yield chunk({}, finish_reason)
+            yield 'data: [DONE]\n\n'
+
+        return StreamingResponse(events(), media_type='text/event-stream')
+
+    return app
+
+
+def main() -> None:
+    """Serve the mock."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', default='fixed:0', help='Latency distribution (ms)')
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(latency_sampler(args.latency)), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Scripted conversations shared by the load driver and the mock OpenAI server."""
+from typing import Dict, List, NamedTuple, Tuple
+from datetime import date, timedelta
+
+DEFAULT_REPLY = 'Is there anything else I can help you with?'
+
+
+class Turn(NamedTuple):
+    """User message and the scripted model behaviour for it.
+
+    If `tool_calls` is set, the tool-calling completion answers with those
+    calls and every later completion of the turn answers with `reply`.
+    """
+    user: str
+    tool_calls: Tuple[Tuple[str, dict], ...] = ()
+    reply: str = DEFAULT_REPLY
+
+
+class Scenario(NamedTuple):
+    """Multi-turn conversation."""
+    name: str
+    turns: Tuple[Turn, ...]
+
+
+def next_weekday(weekday: int) -> date:
+    """Next date (after today) falling on `weekday` (0 = Monday)."""
+    today = date.today()
+    return today + timedelta(days=(weekday - today.weekday() - 1) % 7 + 1)
+
+
+MONDAY = next_weekday(0).strftime('%m/%d/%Y')
+
+SCENARIOS: List[Scenario] = [
+    Scenario(
+        name='schedule_established',
+        turns=(
+            Turn(
+                user='I need to schedule a follow up for John Doe, DOB 01/01/1975.',
+                tool_calls=(('confirm_name_dob', {'first_name': 'John', 'last_name': 'Doe', 'dob': '01/01/1975'}),),
+                reply='I found John Doe. Which provider does he need to see?',
+                ),
+            Turn(
+                user=f'He needs to see Dr. House at PPTH Orthopedics on {MONDAY} at 10am.',
+                tool_calls=((
+                    'search_available_providers',
+                    {
+                        'appointment_type': 'EXISTING',
+                        'last_name': 'House',
+                        'location': 'PPTH Orthopedics',
+                        'timestamp': f'{MONDAY} 10:00:00',
+                    },
+                    ),),
+                reply='Dr. Gregory House is available then. Should I book an ESTABLISHED appointment?',
+                ),
+            Turn(
+                user='Yes, please book it.',
+                tool_calls=((
+                    'book_appointment',
+                    {
+                        'first_name': 'John',
+                        'last_name': 'Doe',
+                        'dob': '01/01/1975',
+                        'provider_first_name': 'Gregory',
+                        'provider_last_name': 'House',
+                        'location': 'PPTH Orthopedics',
+                        'appointment_type': 'EXISTING',
+                        'timestamp': f'{MONDAY} 10:00:00',
+                    },
+                    ),),
+                reply='The appointment is booked.',
+                ),
+            Turn(user='Thanks!', reply='You are welcome!'),
+            ),
+        ),
+    Scenario(
+        name='patient_not_found',
+        turns=(
+            Turn(
+                user='Can you look up Jane Roe, born 02/03/1980?',
+                tool_calls=(('confirm_name_dob', {'first_name': 'Jane', 'last_name': 'Roe', 'dob': '02/03/1980'}),),
+                reply='I could not find that patient.',
+                ),
+            Turn(user='Never mind, thank you.'),
+            ),
+        ),
+    Scenario(
+        name='provider_search',
+        turns=(
+            Turn(
+                user='Which primary care providers are there?',
+                tool_calls=(('search_available_providers', {'specialty': 'Primary Care'}),),
+                reply='Here are the primary care providers.',
+                ),
+            Turn(user='What insurances do you accept?'),
+            ),
+        ),
+]
+
+# scripted turns by user message, for the mock server
+SCRIPT: Dict[str, Turn] = {turn.user: turn for scenario in SCENARIOS for turn in scenario.turns}
@@ -0,0 +1,127 @@
+"""Shared fixtures: a small provider directory, an in-memory EHR, a fresh booking store and a scripted LLM."""
+import copy
+import json
+import pytest
+import httpx
+from openai.types.chat import ChatCompletion
+from care_ml.ml import slots, tools
+from care_ml.ml.booking import BookingStore
+from care_ml.ml.ehr_client import EHRClient
+from care_ml.ml.ehr_connector import PATIENT_CACHE
+from care_ml.ml.provider_index import PROVIDER_INDEX
+from care_ml.ml.queries import ProviderRow, ZipCode
+
+# a Monday
+MONDAY = '10/19/2026'
+
+PROVIDERS = [
+    ProviderRow(1, 'Meredith', 'Grey', 'Primary Care', 'MD', 'Grey Sloan Primary Care',
+                '(555) 555-0101', '1 Main St, Raleigh, NC 27601', 0, 4, 9, 17, 35.7796, -78.6382),
+    ProviderRow(2, 'Gregory', 'House', 'Orthopedics', 'MD', 'PPTH Orthopedics',
+                '(555) 555-0102', '2 Main St, Greensboro, NC 27401', 0, 4, 8, 17, 36.0726, -79.7920),
+    ProviderRow(3, 'Miranda', 'Bailey', 'Surgery', 'MD', 'Grey Sloan Surgery',
+                '(555) 555-0103', '1 Main St, Raleigh, NC 27601', 0, 6, 0, 24, 35.7796, -78.6382),
+]
+
+ZIP_CODES = [
+    ZipCode('27401', 'Greensboro', 'NC', 36.0726, -79.7920),
+    ZipCode('27601', 'Raleigh', 'NC', 35.7796, -78.6382),
+    ZipCode('27101', 'Winston-Salem', 'NC', 36.0999, -80.2442),
+    ZipCode('28607', 'Boone', 'NC', 36.2168, -81.6746),
+    ZipCode('28560', 'New Bern', 'NC', 35.1085, -77.0441),
+    ZipCode('28601', 'Hickory', 'NC', 35.7332, -81.3412),
+]
+
+PATIENTS = {
+    1: {
+        'id': 1,
+        'name': 'John Doe',
+        'dob': '01/01/1975',
+        'pcp': 'Dr. Meredith Grey',
+        'ehrId': '1234abcd',
+        'referred_providers': [{'provider': 'House, Gregory MD', 'specialty': 'Orthopedics'}],
+        'appointments': [
+            {'date': '8/12/24', 'time': '2:30pm', 'provider': 'Dr. Gregory House', 'status': 'completed'},
+        ],
+    },
+    2: {
+        'id': 2,
+        'name': 'Jane Roe',
+        'dob': '02/03/1980',
+        'pcp': 'Dr. Meredith Grey',
+        'ehrId': '5678efgh',
+        'referred_providers': [],
+        'appointments': [],
+    },
+}
+
+
+class ScriptedClient:
+    """Stands in for AsyncOpenAI, replying with scripted tool calls and messages in order."""
+    def __init__(self, replies):
+        self.chat = self
+        self.completions = self
+        self.replies = list(replies)
+        self.requests = []
+
+    async def create(self, **params):
+        self.requests.append(params)
+        content, tool_calls = self.replies.pop(0)
+        return ChatCompletion.model_validate({
+            'id': 'test',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': 'test',
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'tool_calls' if tool_calls else 'stop',
+                'message': {
+                    'role': 'assistant',
+                    'content': content,
+                    'tool_calls': [
+                        {'id': f'call_{i}', 'type': 'function', 'function': {'name': name, 'arguments': json.dumps(args)}}
+                        for i, (name, args) in enumerate(tool_calls)
+                        ] or None,
+                },
+            }],
+        })
+
+
+@pytest.fixture
+def directory():
+    """PROVIDER_INDEX built from PROVIDERS and ZIP_CODES."""
+    state = PROVIDER_INDEX._state  # pylint: disable=protected-access
+    PROVIDER_INDEX.build(PROVIDERS, ZIP_CODES)
+    yield PROVIDERS
+    PROVIDER_INDEX._state = state  # pylint: disable=protected-access
+
+
+@pytest.fixture
+def bookings(monkeypatch):
+    """Empty in-memory booking store used by the tools."""
+    store = BookingStore()
+    monkeypatch.setattr(tools, 'BOOKINGS', store)
+    monkeypatch.setattr(slots, 'BOOKINGS', store)
+    return store
+
+
+@pytest.fixture
+def ehr(monkeypatch):
+    """EHR serving PATIENTS; returns the IDs of the patients it was asked for."""
+    requested = []
+
+    async def get_patient(_client, idx: int) -> dict:
+        requested.append(idx)
+        if idx not in PATIENTS:
+            request = httpx.Request('GET', f'/patient/{idx}')
+            raise httpx.HTTPStatusError('Patient not found', request=request, response=httpx.Response(404, request=request))
+        return copy.deepcopy(PATIENTS[idx])
+
+    async def search_patients(_client, name: str, dob: str) -> list:
+        return [copy.deepcopy(i) for i in PATIENTS.values() if i['name'].lower() == name.lower() and i['dob'] == dob]
+
+    monkeypatch.setattr(EHRClient, 'get_patient', get_patient)
+    monkeypatch.setattr(EHRClient, 'search_patients', search_patients)
+    PATIENT_CACHE.clear()
+    yield requested
+    PATIENT_CACHE.clear()
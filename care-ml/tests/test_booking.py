@@ -0,0 +1,75 @@
+"""Booking store tests."""
+import multiprocessing
+import threading
+from datetime import datetime
+from care_ml.ml.booking import BookingStore
+
+MONDAY = datetime(2026, 10, 19, 10)
+TUESDAY = datetime(2026, 10, 20, 10)
+
+FORK = multiprocessing.get_context('fork')
+
+
+def opened(path) -> BookingStore:
+    store = BookingStore(str(path))
+    store.open()
+    return store
+
+
+def test_bookings_survive_a_restart(tmp_path):
+    store = opened(tmp_path / 'bookings.wal')
+    booking = store.reserve(1, 'PPTH Orthopedics', 2, MONDAY, 30)
+    store.close()
+
+    store = opened(tmp_path / 'bookings.wal')
+    assert list(store.bookings()) == [booking]
+    assert not store.is_free(1, MONDAY, 15)
+    assert store.reserve(1, 'PPTH Orthopedics', 3, MONDAY, 15) is None
+
+
+def reserve_in_child(path, results) -> None:
+    store = opened(path)
+    results.put(store.reserve(1, 'PPTH Orthopedics', 2, MONDAY, 30) is not None)
+
+
+def test_processes_cannot_book_the_same_slot(tmp_path):
+    results = FORK.Queue()
+    children = [FORK.Process(target=reserve_in_child, args=(tmp_path / 'bookings.wal', results)) for _ in range(8)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join(10)
+
+    assert sorted(results.get(timeout=1) for _ in children) == [False] * 7 + [True]
+
+
+def hold_day(path, ts, held, release) -> None:
+    store = opened(path)
+    with store._exclusive((1, ts.date())):  # pylint: disable=protected-access
+        held.set()
+        release.wait(10)
+
+
+def test_locks_only_the_provider_day(tmp_path):
+    path = tmp_path / 'bookings.wal'
+    held, release = FORK.Event(), FORK.Event()
+    child = FORK.Process(target=hold_day, args=(path, MONDAY, held, release))
+    child.start()
+    try:
+        assert held.wait(10)
+        store = opened(path)
+
+        # another day of the provider is booked while the child holds Monday
+        assert store.reserve(1, 'PPTH Orthopedics', 2, TUESDAY, 30) is not None
+
+        # Monday waits for the child
+        monday = threading.Thread(target=store.reserve, args=(1, 'PPTH Orthopedics', 3, MONDAY, 30))
+        monday.start()
+        monday.join(0.2)
+        assert monday.is_alive()
+    finally:
+        release.set()
+        child.join(10)
+
+    monday.join(10)
+    assert not store.is_free(1, MONDAY, 30)
@@ -0,0 +1,37 @@
+"""Place resolution tests."""
+import pytest
+from care_ml.ml.geo import Places
+from .conftest import ZIP_CODES
+
+
+@pytest.fixture
+def places():
+    return Places(ZIP_CODES)
+
+
+@pytest.mark.parametrize('place, name', [
+    ('27401', '27401 (Greensboro, NC)'),
+    ('27401-1234', '27401 (Greensboro, NC)'),
+    ('Greensboro', 'Greensboro, NC'),
+    ('greensboro, nc', 'Greensboro, NC'),
+    ('Winston Salem', 'Winston-Salem, NC'),
+    ('Greensborro', 'Greensboro, NC'),
+    ('Greensborro, NC', 'Greensboro, NC'),
+])
+def test_resolves_exact_and_close_places(places, place, name):
+    assert places.locate(place).name == name
+
+
+@pytest.mark.parametrize('place, candidate', [
+    ('Boston', 'Boone, NC'),
+    ('Boston, MA', 'Boone, NC'),
+    ('New York', 'New Bern, NC'),
+    ('Chicago', 'Hickory, NC'),
+])
+def test_does_not_resolve_other_cities(places, place, candidate):
+    assert places.locate(place) is None
+    assert candidate in [name for name, score in places.candidates(place) if score < places.min_score]
+
+
+def test_unknown_zip_code(places):
+    assert places.locate('99999') is None
@@ -0,0 +1,38 @@
+"""Pipeline tests."""
+import asyncio
+from care_ml.ml.completion_cache import COMPLETION_CACHE
+from care_ml.ml.message import Message, Role, TOOL_CALLS_TAG
+from care_ml.ml.pipeline import Pipeline
+from care_ml.ml.tools import APPOINTMENT_SCHEDULED
+from .conftest import MONDAY, ScriptedClient
+
+
+def test_books_on_a_later_turn_for_the_patient_confirmed_earlier(directory, bookings, ehr, monkeypatch):
+    jane = {'first_name': 'Jane', 'last_name': 'Roe', 'dob': '02/03/1980'}
+    client = ScriptedClient([
+        (None, [('confirm_name_dob', jane)]),
+        ('I found Jane Roe.', []),
+        (None, [('book_appointment', {
+            **jane,
+            'provider_first_name': 'Meredith',
+            'provider_last_name': 'Grey',
+            'location': 'Grey Sloan Primary Care',
+            'appointment_type': 'NEW',
+            'timestamp': f'{MONDAY} 10:00:00',
+        })]),
+        ('The appointment is booked.', []),
+    ])
+    pipeline = Pipeline(mode='two_stage')
+    pipeline.__dict__['openai_client'] = client
+    monkeypatch.setattr(COMPLETION_CACHE, 'stages', ())
+
+    # a session keeps only the user messages and the replies
+    messages = [Message(role=Role.USER, content='Please confirm Jane Roe, DOB 02/03/1980.')]
+    messages.append(asyncio.run(pipeline(messages)))
+    messages.append(Message(role=Role.USER, content=f'Book her a NEW visit with Dr. Grey on {MONDAY} at 10am.'))
+    assert asyncio.run(pipeline(messages)).content == 'The appointment is booked.'
+
+    # the confirmed patient's ID never reached the second turn, and another patient (ID 1) exists
+    assert not any(TOOL_CALLS_TAG in (i['content'] or '') for i in client.requests[2]['messages'])
+    assert [i.patient_id for i in bookings.bookings()] == [2]
+    assert APPOINTMENT_SCHEDULED in client.requests[3]['messages'][-1]['content']
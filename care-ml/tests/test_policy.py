@@ -0,0 +1,88 @@
+"""Policy fast path tests."""
+import json
+import pytest
+from care_ml.ml import pipeline
+from care_ml.ml.booking import APPOINTMENT_MINUTES
+from care_ml.ml.message import Message, Role
+from care_ml.ml.pipeline import ToolCall, fast_path_reply
+from care_ml.ml.policy import POLICY_TABLE, PolicyAnswerer, PolicyTable
+from care_ml.ml.tools import APPOINTMENT_SCHEDULED, EXISTING_APPOINTMENT_REQUIRED, NEW_APPOINTMENT_REQUIRED
+
+
+@pytest.fixture(scope='module')
+def policy():
+    return PolicyAnswerer(table=PolicyTable.from_template())
+
+
+@pytest.mark.parametrize('text, intent', [
+    ('What insurances do you accept?', 'insurance'),
+    ('Which insurance plans does the clinic take?', 'insurance'),
+    ('Do you accept Aetna?', 'insurance'),
+    ('Do you take Blue Cross Blue Shield of North Carolina?', 'insurance'),
+    ('Is Medicaid accepted?', 'insurance'),
+    ('How much is self-pay?', 'self_pay'),
+    ('How much does an orthopedics visit cost without insurance?', 'self_pay'),
+    ('What are the self pay prices?', 'self_pay'),
+    ("What's the cash price for surgery?", 'self_pay'),
+    ('How early should new patients arrive?', 'arrival'),
+    ('When should I arrive for an established appointment?', 'arrival'),
+    ('Hi, how early do patients need to get there?', 'arrival'),
+    ('How long is a NEW appointment?', 'duration'),
+    ('How long does an established visit take?', 'duration'),
+    ('What is the length of a new patient appointment?', 'duration'),
+    ('How many minutes are appointments?', 'duration'),
+])
+def test_answers_policy_questions(policy, text, intent):
+    assert policy.classify(text) == (intent, 0.9)
+    assert policy.answer(Message(role=Role.USER, content=text)) is not None
+
+
+@pytest.mark.parametrize('text', [
+    # about a patient, their history or status
+    'How long has the patient been seeing Dr. House?',
+    'Has the patient arrived yet?',
+    'Can the patient show up late?',
+    "How long is the patient's appointment?",
+    'When should John Doe arrive for his appointment?',
+    'How much did the last visit cost?',
+    # not about clinic policy
+    'What is the length of the waitlist?',
+    'Is the price of Aetna plans going up?',
+    'How long will it take to get a referral?',
+    'What time does the office open?',
+    'Do you accept Aetna and Kaiser?',
+    'Is my insurance accepted for knee surgery?',
+    # bookings and medical questions
+    'Book a new appointment with Dr. Grey',
+    'How much does a knee replacement cost?',
+    'How long should he wait before surgery?',
+])
+def test_falls_through_otherwise(policy, text):
+    assert policy.answer(Message(role=Role.USER, content=text)) is None
+
+
+def test_booking_durations_follow_the_policy_table():
+    assert APPOINTMENT_MINUTES['NEW'] == POLICY_TABLE.durations['NEW']
+    assert APPOINTMENT_MINUTES['ESTABLISHED'] == APPOINTMENT_MINUTES['EXISTING'] == POLICY_TABLE.durations['ESTABLISHED']
+
+
+@pytest.mark.parametrize('appointment_type, result, expected', [
+    ('NEW', APPOINTMENT_SCHEDULED, 'arrive 45 minutes early'),
+    ('ESTABLISHED', APPOINTMENT_SCHEDULED, 'arrive 5 minutes before'),
+    ('NEW', EXISTING_APPOINTMENT_REQUIRED, 'ESTABLISHED appointment (20 minutes)'),
+    ('ESTABLISHED', NEW_APPOINTMENT_REQUIRED, 'NEW appointment (40 minutes)'),
+])
+def test_fast_replies_follow_the_policy_table(monkeypatch, appointment_type, result, expected):
+    table = POLICY_TABLE.model_copy(update={'durations': {'NEW': 40, 'ESTABLISHED': 20},
+                                            'arrival': {'NEW': 45, 'ESTABLISHED': 5}})
+    monkeypatch.setattr(pipeline, 'POLICY_TABLE', table)
+    arguments = {
+        'appointment_type': appointment_type,
+        'provider_first_name': 'Gregory',
+        'provider_last_name': 'House',
+        'location': 'PPTH Orthopedics',
+        'timestamp': '2025-01-06T09:00:00',
+    }
+    tool_call = ToolCall(id='call_0', name='book_appointment', arguments=json.dumps(arguments))
+
+    assert expected in fast_path_reply([tool_call], [('book_appointment', result)])
@@ -0,0 +1,37 @@
+"""Provider directory query tests."""
+import duckdb
+import pytest
+from care_ml.ml.queries import search_providers
+from .conftest import PROVIDERS
+
+
+@pytest.fixture
+def conn():
+    """In-memory provider database with PROVIDERS."""
+    conn = duckdb.connect(':memory:')
+    conn.execute(
+        'CREATE TABLE providers (id INTEGER, first_name TEXT, last_name TEXT, specialty TEXT, certification TEXT)'
+        )
+    conn.execute(
+        'CREATE TABLE departments (id INTEGER, provider_id INTEGER, name TEXT, phone_number TEXT, address TEXT, '
+        'start_day INTEGER, end_day INTEGER, start_hour INTEGER, end_hour INTEGER, latitude DOUBLE, longitude DOUBLE)'
+        )
+    for i, row in enumerate(PROVIDERS):
+        conn.execute('INSERT INTO providers VALUES (?, ?, ?, ?, ?)', row[:5])
+        conn.execute('INSERT INTO departments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (i, row[0], *row[5:]))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('hour, minute, duration, available', [
+    (16, 30, 30, True),
+    (16, 45, 15, True),
+    (16, 45, 30, False),
+    (16, 59, 15, False),
+    (8, 0, 30, True),
+    (7, 45, 30, False),
+])
+def test_appointment_must_fit_office_hours(conn, hour, minute, duration, available):
+    # House's office is open 8:00-17:00
+    rows = search_providers(conn, last_name='House', day=0, hour=hour, minute=minute, duration=duration)
+    assert bool(rows) == available
@@ -0,0 +1,44 @@
+"""Trace replay tests."""
+import asyncio
+from care_ml import replay
+from care_ml.ml import ehr_connector, trace
+from care_ml.ml.completion_cache import COMPLETION_CACHE
+from care_ml.ml.message import Message, Role
+from care_ml.ml.pipeline import Pipeline
+from care_ml.ml.trace import TraceRecorder, read_traces, traced
+from .conftest import MONDAY, ScriptedClient
+
+
+def test_booking_traces_replay_the_same_every_time(tmp_path, directory, bookings, ehr, monkeypatch):
+    recorder = TraceRecorder(str(tmp_path), max_bytes=10 ** 6, backups=1)
+    pipeline = Pipeline(mode='single_loop')
+    pipeline.__dict__['openai_client'] = ScriptedClient([
+        (None, [('book_appointment', {
+            'first_name': 'Jane',
+            'last_name': 'Roe',
+            'dob': '02/03/1980',
+            'provider_first_name': 'Meredith',
+            'provider_last_name': 'Grey',
+            'location': 'Grey Sloan Primary Care',
+            'appointment_type': 'NEW',
+            'timestamp': f'{MONDAY} 10:00:00',
+        })]),
+    ])
+    monkeypatch.setattr(trace, 'TRACER', recorder)
+    monkeypatch.setattr(COMPLETION_CACHE, 'stages', ())
+    monkeypatch.setattr(ehr_connector, 'EHR_CLIENT', ehr_connector.EHR_CLIENT)
+    messages = [Message(role=Role.USER, content=f'Book Jane Roe, 02/03/1980, with Dr. Grey on {MONDAY} at 10am.')]
+
+    async def record():
+        with traced('/message/create', messages, pipeline) as recorded:
+            recorded['response'] = (await pipeline(messages)).model_dump()
+
+    asyncio.run(record())
+    recorder.close()
+    [recorded] = read_traces([str(recorder.path)])
+
+    for _ in range(2):
+        result = asyncio.run(replay.replay(recorded))
+        assert result['same_response'] and result['unused_completions'] == 0
+    # the replays booked into their own stores
+    assert len(list(bookings.bookings())) == 1
@@ -0,0 +1,92 @@
+"""Session store and endpoint tests."""
+import multiprocessing
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from care_ml.ml.message import Message, Role
+from care_ml.ml.pipeline import StreamEvent
+from care_ml.ml.sessions import SessionSpill, SessionStore, SharedSessionStore
+from care_ml.routers import session
+
+FORK = multiprocessing.get_context('fork')
+
+
+def shared(path) -> SharedSessionStore:
+    return SharedSessionStore(SessionSpill(str(path), ttl=60))
+
+
+def extend_in_child(path, session_id, worker) -> None:
+    store = shared(path)
+    for i in range(25):
+        store.extend(session_id, Message(role=Role.USER, content=f'{worker}-{i}'))
+
+
+def test_concurrent_turns_all_land(tmp_path):
+    path = tmp_path / 'state.db'
+    session_id = shared(path).create()
+
+    children = [FORK.Process(target=extend_in_child, args=(path, session_id, i)) for i in range(4)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+        assert child.exitcode == 0
+
+    contents = [i.content for i in shared(path).get(session_id).root]
+    assert sorted(contents) == sorted(f'{w}-{i}' for w in range(4) for i in range(25))
+
+
+@pytest.mark.parametrize('store', ['local', 'shared'])
+def test_extending_an_ended_session_fails(tmp_path, store):
+    sessions = SessionStore(maxsize=10, ttl=60) if store == 'local' else shared(tmp_path / 'state.db')
+    session_id = sessions.create()
+    sessions.delete(session_id)
+
+    with pytest.raises(KeyError):
+        sessions.extend(session_id, Message(role=Role.USER, content='Hello'))
+
+
+class EndingPipeline:
+    """Answers, ending the session while doing so."""
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.session_id = None
+        self.reply = Message(role=Role.ASSISTANT, content='Done.')
+
+    async def __call__(self, _messages):
+        self.sessions.delete(self.session_id)
+        return self.reply
+
+    async def stream(self, _messages):
+        self.sessions.delete(self.session_id)
+        yield StreamEvent(event='token', data={'content': 'Done.'})
+        yield StreamEvent(event='done', data={'message': self.reply.model_dump()})
+
+
+@pytest.fixture
+def ending_session(monkeypatch):
+    sessions = SessionStore(maxsize=10, ttl=60)
+    pipeline = EndingPipeline(sessions)
+    monkeypatch.setattr(session, 'SESSIONS', sessions)
+    monkeypatch.setattr(session, 'PIPELINE', pipeline)
+    app = FastAPI()
+    app.include_router(session.router, prefix='/session')
+    pipeline.session_id = sessions.create()
+    return TestClient(app), pipeline.session_id
+
+
+def test_turn_on_a_session_ended_meanwhile(ending_session):
+    client, session_id = ending_session
+    response = client.post(f'/session/{session_id}/message', json={'content': 'Hi'})
+
+    assert response.status_code == 410
+    assert response.json()['detail'] == session.SESSION_ENDED
+
+
+def test_streamed_turn_on_a_session_ended_meanwhile(ending_session):
+    client, session_id = ending_session
+    response = client.post(f'/session/{session_id}/stream', json={'content': 'Hi'})
+
+    events = [line.split(': ', 1)[1] for line in response.text.splitlines() if line.startswith('event: ')]
+    assert events == ['token', 'done', 'error']
+    assert session.SESSION_ENDED in response.text
@@ -0,0 +1,86 @@
+"""Shared cache tests."""
+import multiprocessing
+from care_ml.ml.shared import SharedCache
+
+FORK = multiprocessing.get_context('fork')
+
+
+class Loads:
+    """Deserializer that counts its calls."""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, serialized: str) -> dict:
+        self.calls += 1
+        return {'name': serialized}
+
+
+def cache(path, loads=None) -> SharedCache:
+    return SharedCache(str(path), 'patient', ttl=60, dumps=lambda value: value['name'],
+                       loads=loads or Loads(), local_size=8)
+
+
+def test_local_hits_are_not_deserialized(tmp_path):
+    writer, reader = cache(tmp_path / 'state.db'), cache(tmp_path / 'state.db')
+    writer.set(1, {'name': 'John Doe'})
+
+    first = reader.get(1)
+    assert first == {'name': 'John Doe'}
+    for _ in range(10):
+        assert reader.get(1) is first
+    assert reader.loads.calls == 1
+    assert reader.local_hits == 10
+
+    # another commit makes the reader check the entry's version, but not deserialize it again
+    writer.set(2, {'name': 'Jane Roe'})
+    assert reader.get(1) is first
+    assert reader.loads.calls == 1
+
+
+def invalidate_in_child(path) -> None:
+    cache(path).invalidate(1)
+
+
+def set_in_child(path) -> None:
+    cache(path).set(1, {'name': 'Johnny Doe'})
+
+
+def run_in_child(target, path) -> None:
+    child = FORK.Process(target=target, args=(path,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+
+def test_other_processes_changes_are_seen(tmp_path):
+    path = tmp_path / 'state.db'
+    reader = cache(path)
+    reader.set(1, {'name': 'John Doe'})
+    assert reader.get(1) == {'name': 'John Doe'}
+
+    run_in_child(set_in_child, path)
+    assert reader.get(1) == {'name': 'Johnny Doe'}
+
+    run_in_child(invalidate_in_child, path)
+    assert reader.get(1) is None
+    assert reader.local is not None and len(reader.local) == 0
+
+
+def test_invalidation_wins_over_a_concurrent_read(tmp_path):
+    reader = cache(tmp_path / 'state.db')
+    reader.set(1, {'name': 'John Doe'})
+    reader.local.clear()
+
+    # the entry is invalidated between the read of the shared entry and keeping it in process
+    execute = reader.db.execute
+
+    def racing(sql, params=()):
+        rows = execute(sql, params)
+        if sql.startswith('SELECT version'):
+            reader.invalidate(1)
+        return rows
+
+    reader.db.execute = racing
+    assert reader.get(1) == {'name': 'John Doe'}
+    reader.db.execute = execute
+    assert reader.get(1) is None
@@ -0,0 +1,181 @@
+"""Tool tests."""
+import asyncio
+from care_ml.ml.ehr_connector import PATIENT_CACHE, Patient
+from datetime import datetime, timedelta
+import pytest
+from care_ml.ml import tools
+from care_ml.ml.booking import APPOINTMENT_MINUTES
+from care_ml.ml.provider_index import PROVIDER_INDEX
+from care_ml.ml.slots import earliest_slots
+from care_ml.ml.tools import (
+    APPOINTMENT_SCHEDULED,
+    CONFIRM_PROVIDER,
+    EXISTING_APPOINTMENT_REQUIRED,
+    MORE_PROVIDERS,
+    PAST_MIDNIGHT,
+    PLACE_NOT_FOUND,
+    PATIENT_NOT_FOUND,
+    PROVIDER_UNAVAILABLE,
+    SEVERAL_PATIENTS_FOUND,
+    TIME_OFF_GRID,
+    book_appointment,
+    search_available_providers,
+)
+from .conftest import MONDAY, PATIENTS
+
+
+def book(patient_id: int, first_name: str, last_name: str, location: str, appointment_type: str, time: str, **kwargs):
+    patient = PATIENTS.get(patient_id, {'name': 'Nobody Known', 'dob': '01/01/1900'})
+    patient_first_name, patient_last_name = patient['name'].split()
+    return asyncio.run(book_appointment(
+        first_name=patient_first_name,
+        last_name=patient_last_name,
+        dob=patient['dob'],
+        provider_first_name=first_name,
+        provider_last_name=last_name,
+        location=location,
+        appointment_type=appointment_type,
+        timestamp=f'{MONDAY} {time}',
+        **kwargs,
+        ))
+
+
+def test_books_for_the_confirmed_patient(directory, bookings, ehr):
+    # patient 1 has seen a provider recently, so a NEW appointment would be refused for them
+    assert book(2, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00') == APPOINTMENT_SCHEDULED
+    assert [i.patient_id for i in bookings.bookings()] == [2]
+
+
+def test_checks_eligibility_of_the_confirmed_patient(directory, bookings, ehr):
+    assert book(1, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00') == EXISTING_APPOINTMENT_REQUIRED
+    assert not list(bookings.bookings())
+
+
+def test_invalidates_the_booked_patient(directory, bookings, ehr):
+    asyncio.run(Patient.get_by_id(1))
+    asyncio.run(Patient.get_by_id(2))
+
+    assert book(2, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00') == APPOINTMENT_SCHEDULED
+    assert PATIENT_CACHE.get(1, count=False) is not None
+    assert PATIENT_CACHE.get(2, count=False) is None
+
+
+def test_unknown_patient(directory, bookings, ehr):
+    assert book(99, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00') == PATIENT_NOT_FOUND
+    assert not list(bookings.bookings())
+
+
+def test_books_only_one_matching_patient(directory, bookings, ehr, monkeypatch):
+    monkeypatch.setitem(PATIENTS, 3, {**PATIENTS[2], 'id': 3, 'ehrId': '9999aaaa'})
+
+    assert book(2, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00') == SEVERAL_PATIENTS_FOUND
+    assert not list(bookings.bookings())
+
+    result = book(2, 'Meredith', 'Grey', 'Grey Sloan Primary Care', 'NEW', '10:00:00', ehr_id='9999AAAA')
+    assert result == APPOINTMENT_SCHEDULED
+    assert [i.patient_id for i in bookings.bookings()] == [3]
+
+
+@pytest.mark.parametrize('appointment_type, time, expected', [
+    ('NEW', '16:30:00', APPOINTMENT_SCHEDULED),
+    ('EXISTING', '16:45:00', APPOINTMENT_SCHEDULED),
+    ('NEW', '16:45:00', PROVIDER_UNAVAILABLE),
+    ('NEW', '16:59:00', TIME_OFF_GRID),
+    ('NEW', '17:00:00', PROVIDER_UNAVAILABLE),
+    ('NEW', '10:07:00', TIME_OFF_GRID),
+    ('NEW', '10:00:30', TIME_OFF_GRID),
+])
+def test_appointment_must_fit_office_hours(directory, bookings, ehr, appointment_type, time, expected):
+    # House's office closes at 17:00; patient 1 has seen him, patient 2 nobody
+    patient_id = 1 if appointment_type == 'EXISTING' else 2
+    assert book(patient_id, 'Gregory', 'House', 'PPTH Orthopedics', appointment_type, time) == expected
+
+
+@pytest.mark.parametrize('time, expected', [
+    ('23:30:00', APPOINTMENT_SCHEDULED),
+    ('23:45:00', PAST_MIDNIGHT),
+])
+def test_appointment_must_end_by_midnight(directory, bookings, ehr, time, expected):
+    # Bailey's office is open around the clock
+    assert book(2, 'Miranda', 'Bailey', 'Grey Sloan Surgery', 'NEW', time) == expected
+
+
+@pytest.mark.parametrize('appointment_type', ['NEW', 'EXISTING'])
+def test_search_agrees_with_earliest_slots(directory, bookings, appointment_type):
+    day = datetime.strptime(MONDAY, '%m/%d/%Y')
+    duration = APPOINTMENT_MINUTES[appointment_type]
+    rows = PROVIDER_INDEX.match(duration, last_name='House')
+    offered = {ts.strftime('%m/%d/%Y %H:%M:%S') for ts, _ in earliest_slots(rows, day, duration, 24 * 4, 1)}
+
+    for minutes in range(0, 24 * 60, 15):
+        timestamp = (day + timedelta(minutes=minutes)).strftime('%m/%d/%Y %H:%M:%S')
+        available = bool(search_available_providers(appointment_type, last_name='House', timestamp=timestamp))
+        assert available == (timestamp in offered), timestamp
+
+
+@pytest.mark.parametrize('first_name, last_name, location', [
+    ('Gregory', 'Houser', 'PPTH Orthopedics'),
+    ('', 'Gr', 'Grey Sloan Primary Care'),
+    ('Gregory', 'House', 'PPTH Ortho'),
+])
+def test_books_only_exact_names(directory, bookings, ehr, first_name, last_name, location):
+    result = book(1, first_name, last_name, location, 'EXISTING', '10:00:00')
+
+    assert result['message'] == CONFIRM_PROVIDER
+    assert result['candidates'] and all(i['match_score'] <= 1 for i in result['candidates'])
+    assert not list(bookings.bookings())
+
+
+def test_books_exact_names_in_any_case(directory, bookings, ehr):
+    assert book(1, 'gregory', 'Dr. HOUSE', 'ppth orthopedics', 'EXISTING', '10:00:00') == APPOINTMENT_SCHEDULED
+
+
+def test_search_near_an_unknown_place(directory):
+    result = search_available_providers(near='Boston')
+
+    assert result['message'] == PLACE_NOT_FOUND
+    assert result['candidates'][0]['place'] == 'Boone, NC'
+
+
+def test_search_near_names_the_place(directory):
+    results = search_available_providers(near='Greensborro')
+
+    assert results[0]['last_name'] == 'House'
+    assert all(i['department']['distance_from'] == 'Greensboro, NC' for i in results)
+
+
+def test_search_limits_results_and_gives_the_total(directory, bookings, monkeypatch):
+    monkeypatch.setattr(tools, 'SEARCH_LIMIT', 2)
+
+    result = search_available_providers(timestamp=f"{MONDAY} 10:00:00")
+    assert result['message'] == MORE_PROVIDERS.format(shown=2, total=3)
+    assert [i['last_name'] for i in result['providers']] == ['Grey', 'House']
+
+    # Bailey is the only surgeon, and the only one open at night
+    surgeons = search_available_providers(specialty='Surgery', timestamp=f"{MONDAY} 10:00:00")
+    assert [i['last_name'] for i in surgeons] == ['Bailey']
+    assert [i['last_name'] for i in search_available_providers(timestamp=f"{MONDAY} 20:00:00")] == ['Bailey']
+
+
+def test_search_near_counts_only_the_nearest(directory, bookings, monkeypatch):
+    monkeypatch.setattr(tools, 'NEAREST_DEPARTMENTS', 1)
+    nearest = search_available_providers(near='Greensboro', timestamp=f"{MONDAY} 10:00:00")
+    assert [i['last_name'] for i in nearest] == ['House']
+
+    monkeypatch.setattr(tools, 'NEAREST_DEPARTMENTS', 2)
+    monkeypatch.setattr(tools, 'SEARCH_LIMIT', 1)
+    result = search_available_providers(near='Greensboro', timestamp=f"{MONDAY} 10:00:00")
+    assert result['message'] == MORE_PROVIDERS.format(shown=1, total=2)
+
+
+def test_index_counts_matches_beyond_the_limit(directory):
+    ts = datetime.strptime(f"{MONDAY} 16:30:00", '%m/%d/%Y %H:%M:%S')
+
+    results, total = PROVIDER_INDEX.search(APPOINTMENT_MINUTES['NEW'], ts=ts, limit=1)
+    assert [i['last_name'] for i in results] == ['Grey'] and total == 3
+
+    results, total = PROVIDER_INDEX.search(APPOINTMENT_MINUTES['NEW'], specialty='orthopedics', ts=ts, limit=1)
+    assert [i['last_name'] for i in results] == ['House'] and total == 1
+
+    # runs past House's closing time
+    assert PROVIDER_INDEX.search(APPOINTMENT_MINUTES['NEW'] + 15, specialty='orthopedics', ts=ts) == ([], 0)
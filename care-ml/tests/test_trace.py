@@ -0,0 +1,90 @@
+"""Request trace tests."""
+import asyncio
+import multiprocessing
+from openai.types.chat import ChatCompletionChunk
+from care_ml.ml import trace
+from care_ml.ml.message import Message, Role
+from care_ml.ml.pipeline import Pipeline
+from care_ml.ml.trace import TraceRecorder, read_traces
+from care_ml.routers import message
+
+
+class StreamingClient:
+    """Stands in for AsyncOpenAI, streaming a fixed reply."""
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **_params):
+        async def chunks():
+            for content in ('Hello', ' there'):
+                yield ChatCompletionChunk.model_validate({
+                    'id': 'test',
+                    'object': 'chat.completion.chunk',
+                    'created': 0,
+                    'model': 'test',
+                    'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}],
+                })
+        return chunks()
+
+
+def test_streamed_requests_are_traced(tmp_path, monkeypatch):
+    recorder = TraceRecorder(str(tmp_path), max_bytes=10 ** 6, backups=1)
+    pipeline = Pipeline(mode='two_stage')
+    pipeline.__dict__['openai_client'] = StreamingClient()
+    monkeypatch.setattr(trace, 'TRACER', recorder)
+    monkeypatch.setattr(message, 'PIPELINE', pipeline)
+    messages = [Message(role=Role.USER, content='Can you help me with something?')]
+
+    async def consume():
+        return [i async for i in message.traced_stream('/message/stream', messages, pipeline.stream(messages))]
+
+    events = asyncio.run(consume())
+    recorder.close()
+
+    [recorded] = read_traces([str(recorder.path)])
+    assert recorded['endpoint'] == '/message/stream'
+    assert recorded['response'] == events[-1].data['message']
+    assert recorded['response']['content'] == 'Hello there'
+    assert [(i['stage'], i['response']['content'], i['cached']) for i in recorded['llm']] == [
+        ('tool_call', 'Hello there', False),
+    ]
+
+
+FORK = multiprocessing.get_context('fork')
+
+
+def write_traces(directory: str, worker: int, count: int) -> None:
+    recorder = TraceRecorder(directory, max_bytes=4000, backups=100)
+    for i in range(count):
+        with recorder.record('/message/create', [], {}) as recorded:
+            recorded['response'] = {'worker': worker, 'turn': i, 'content': 'lorem ipsum ' * 20}
+    recorder.close()
+
+
+def test_worker_processes_share_the_trace_file(tmp_path):
+    children = [FORK.Process(target=write_traces, args=(str(tmp_path), i, 50)) for i in range(4)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+        assert child.exitcode == 0
+
+    files = sorted(tmp_path.glob('traces*.jsonl.gz'))
+    responses = [i['response'] for i in read_traces([str(i) for i in files])]
+    assert sorted((i['worker'], i['turn']) for i in responses) == [(w, t) for w in range(4) for t in range(50)]
+    # rotated by size of the shared file, not each worker's own writes
+    assert all(i.stat().st_size < 4000 + 1000 for i in files)
+
+
+def test_rotation_counts_what_the_file_already_holds(tmp_path):
+    write_traces(str(tmp_path), 0, 10)
+    size = (tmp_path / 'traces.jsonl.gz').stat().st_size
+
+    recorder = TraceRecorder(str(tmp_path), max_bytes=size + 1, backups=1)
+    with recorder.record('/message/create', [], {}):
+        pass
+    recorder.close()
+
+    assert not (tmp_path / 'traces.jsonl.gz').exists()
+    assert len(list(tmp_path.glob('traces-*.jsonl.gz'))) == 1
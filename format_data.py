@@ -1,8 +1,35 @@
-"""Throw data into a duckdb instance"""
-import pandas as pd
+"""Load the provider directory into a duckdb instance.
+
+Provider and department records are read from CSV, Parquet or JSON Lines
+exports (or globs of them) with DuckDB's native readers, validated, and
+upserted by ID, so an export can hold the whole directory or just changed
+rows. With no files, the sample directory below is loaded.
+
+Department addresses ("street, city, ST 12345") are parsed into city, state
+and ZIP, and located with the ZIP (or, failing that, city) centroids of the
+bundled ZIP code table, which is loaded with the directory.
+
+Usage:
+    python format_data.py [--db data/providers.db]
+    python format_data.py --providers providers.parquet --departments 'departments/*.csv'
+    python format_data.py --departments changed_departments.jsonl
+    python format_data.py --replace --providers ... --departments ...
+
+The service opens the database read-only; stop it before loading.
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import sys
+from pathlib import Path
 import duckdb
 
-providers = [
+DB_FILE = 'data/providers.db'
+ZIP_CODES_FILE = 'data/zip_codes.csv'
+
+# "street, city, ST 12345[-6789]"
+ADDRESS_PATTERN = r'^.*,\s*([^,]+?),\s*([A-Za-z]{2})\s+(\d{5})(-\d{4})?\s*$'
+
+SAMPLE_PROVIDERS = [
     {
         "id": 1,
         "first_name": "Meredith",
@@ -40,7 +67,7 @@ providers = [
     }
 ]
 
-departments = [
+SAMPLE_DEPARTMENTS = [
     {
         "id": 1,
         "provider_id" : 1,
@@ -109,13 +136,338 @@ departments = [
     }
 ]
 
-providers = pd.DataFrame(providers)
-departments = pd.DataFrame(departments)
+# column types by table, in table order
+COLUMNS = {
+    'providers': {
+        'id': 'INTEGER',
+        'first_name': 'VARCHAR',
+        'last_name': 'VARCHAR',
+        'specialty': 'VARCHAR',
+        'certification': 'VARCHAR',
+    },
+    'departments': {
+        'id': 'INTEGER',
+        'provider_id': 'INTEGER',
+        'name': 'VARCHAR',
+        'phone_number': 'VARCHAR',
+        'address': 'VARCHAR',
+        'start_day': 'INTEGER',
+        'end_day': 'INTEGER',
+        'start_hour': 'INTEGER',
+        'end_hour': 'INTEGER',
+    },
+}
+
+# Only the primary keys are indexed: DuckDB can't upsert a column covered by
+# another index, and its hash joins don't use them. Rows are inserted in ID
+# order instead, which keeps the min/max zone maps of ID ranges tight.
+TABLES = {
+    'providers': """
+        CREATE TABLE IF NOT EXISTS providers (
+            id INTEGER PRIMARY KEY,
+            first_name VARCHAR NOT NULL,
+            last_name VARCHAR NOT NULL,
+            specialty VARCHAR NOT NULL,
+            certification VARCHAR NOT NULL
+        )
+    """,
+    'departments': """
+        CREATE TABLE IF NOT EXISTS departments (
+            id INTEGER PRIMARY KEY,
+            provider_id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            phone_number VARCHAR NOT NULL,
+            address VARCHAR NOT NULL,
+            start_day INTEGER NOT NULL CHECK (start_day BETWEEN 0 AND 6),
+            end_day INTEGER NOT NULL CHECK (end_day BETWEEN start_day AND 6),
+            start_hour INTEGER NOT NULL CHECK (start_hour BETWEEN 0 AND 23),
+            end_hour INTEGER NOT NULL CHECK (end_hour BETWEEN start_hour + 1 AND 24)
+        )
+    """,
+    'zip_codes': """
+        CREATE TABLE IF NOT EXISTS zip_codes (
+            zip VARCHAR PRIMARY KEY,
+            city VARCHAR NOT NULL,
+            state VARCHAR NOT NULL,
+            latitude DOUBLE NOT NULL,
+            longitude DOUBLE NOT NULL
+        )
+    """,
+}
+
+# department columns derived from the address, not read from exports
+LOCATION_COLUMNS = {
+    'city': 'VARCHAR',
+    'state': 'VARCHAR',
+    'zip': 'VARCHAR',
+    'latitude': 'DOUBLE',
+    'longitude': 'DOUBLE',
+}
+
+# (problem, condition on a staged row), checked before anything is written;
+# NULLs are rejected by their own rule
+RULES = {
+    'providers': [
+        ('id appears more than once', "id IN (SELECT id FROM staged_providers GROUP BY id HAVING count(*) > 1)"),
+    ],
+    'departments': [
+        ('id appears more than once', "id IN (SELECT id FROM staged_departments GROUP BY id HAVING count(*) > 1)"),
+        ('days must be 0-6 (0 = Monday) with start_day <= end_day', "NOT (start_day BETWEEN 0 AND 6 AND end_day BETWEEN start_day AND 6)"),
+        ('hours must be 0-24 with start_hour < end_hour', "NOT (start_hour BETWEEN 0 AND 23 AND end_hour BETWEEN start_hour + 1 AND 24)"),
+        ('provider_id must be a known provider', "provider_id NOT IN (SELECT id FROM providers UNION ALL SELECT id FROM staged_providers WHERE id IS NOT NULL)"),
+    ],
+}
+
+# rejected rows shown per rule
+EXAMPLES = 5
+
+
+def reader(path: str) -> str:
+    """DuckDB table function reading an export, by file extension."""
+    suffixes = Path(path).suffixes
+    if '.parquet' in suffixes:
+        return "read_parquet($path)"
+    if '.csv' in suffixes or '.tsv' in suffixes:
+        return "read_csv($path, header = true)"
+    if '.jsonl' in suffixes or '.ndjson' in suffixes or '.json' in suffixes:
+        return "read_json($path, format = 'newline_delimited')"
+
+    raise ValueError(f"Unsupported file type: {path} (use CSV, Parquet or JSON Lines)")
+
+
+def stage(conn: duckdb.DuckDBPyConnection, table: str, source: Optional[str], rows: List[dict]) -> None:
+    """Load records into a `staged_{table}` temp table with the table's column types.
+
+    Values that can't be cast become NULL and are rejected by validation.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Connection
+        table (str): Table name
+        source (Optional[str]): Export file or glob; `rows` are staged if None
+        rows (List[dict]): Records to stage without an export
+    """
+    columns = COLUMNS[table]
+    conn.execute(
+        f"CREATE OR REPLACE TEMP TABLE staged_{table} ("
+        + ', '.join(f"{name} {kind}" for name, kind in columns.items())
+        + ")"
+        )
+
+    if source is None:
+        if rows:
+            conn.executemany(
+                f"INSERT INTO staged_{table} VALUES ({', '.join('?' * len(columns))})",
+                [[row.get(name) for name in columns] for row in rows],
+                )
+        return
+
+    scan = f"SELECT * FROM {reader(source)}"
+    found = [row[0] for row in conn.execute(f"DESCRIBE {scan}", {'path': source}).fetchall()]
+    missing = [name for name in columns if name not in found]
+    if missing:
+        raise ValueError(f"{source} is missing {table} columns: {', '.join(missing)}")
+
+    conn.execute(
+        f"INSERT INTO staged_{table} SELECT "
+        + ', '.join(f"TRY_CAST({name} AS {kind})" for name, kind in columns.items())
+        + f" FROM ({scan})",
+        {'path': source},
+        )
+
+
+def validate(conn: duckdb.DuckDBPyConnection, table: str) -> Dict[str, Tuple[int, list]]:
+    """Check staged rows against the table's rules.
+
+    Returns:
+        Dict[str, Tuple[int, list]]: Rejected row count and example IDs, by problem
+    """
+    rules = [(f"{name} is missing or not a valid {kind}", f"{name} IS NULL") for name, kind in COLUMNS[table].items()]
+    problems = {}
+
+    for problem, condition in rules + RULES[table]:
+        count, examples = conn.execute(
+            f"SELECT count(*), list(id ORDER BY id)[:{EXAMPLES}] FROM staged_{table} "
+            f"WHERE COALESCE({condition}, false)"
+            ).fetchone()
+        if count:
+            problems[problem] = (count, examples)
+
+    return problems
+
+
+def upsert(conn: duckdb.DuckDBPyConnection, table: str) -> int:
+    """Insert staged rows in ID order, replacing existing rows with the same ID.
+
+    Returns:
+        int: Rows written
+    """
+    columns = [name for name in COLUMNS[table] if name != 'id']
+    count = conn.execute(f"SELECT count(*) FROM staged_{table}").fetchone()[0]
+    conn.execute(
+        f"INSERT INTO {table} ({', '.join(COLUMNS[table])}) SELECT * FROM staged_{table} ORDER BY id "
+        "ON CONFLICT (id) DO UPDATE SET "
+        + ', '.join(f"{name} = excluded.{name}" for name in columns)
+        )
+
+    return count
+
+
+def load_zip_codes(conn: duckdb.DuckDBPyConnection, path: str) -> int:
+    """Upsert a ZIP code table (zip, city, state, latitude, longitude CSV).
+
+    Returns:
+        int: ZIP codes in the table
+    """
+    conn.execute(
+        """
+        INSERT INTO zip_codes
+        SELECT DISTINCT ON (zip) zip, city, upper(state), latitude, longitude
+        FROM read_csv($path, header = true, types = {'zip': 'VARCHAR'})
+        WHERE zip IS NOT NULL AND city IS NOT NULL AND state IS NOT NULL
+            AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ON CONFLICT (zip) DO UPDATE SET
+            city = excluded.city, state = excluded.state,
+            latitude = excluded.latitude, longitude = excluded.longitude
+        """,
+        {'path': path},
+        )
+
+    return conn.execute("SELECT count(*) FROM zip_codes").fetchone()[0]
+
+
+def locate(conn: duckdb.DuckDBPyConnection) -> int:
+    """Parse department addresses and set their coordinates from the ZIP code table.
+
+    Returns:
+        int: Departments that could not be located
+    """
+    conn.execute(
+        """
+        UPDATE departments SET
+            city = nullif(regexp_extract(address, $pattern, 1), ''),
+            state = nullif(upper(regexp_extract(address, $pattern, 2)), ''),
+            zip = nullif(regexp_extract(address, $pattern, 3), '')
+        """,
+        {'pattern': ADDRESS_PATTERN},
+        )
+    conn.execute(
+        """
+        UPDATE departments SET latitude = located.latitude, longitude = located.longitude
+        FROM (
+            SELECT
+                d.id,
+                COALESCE(z.latitude, c.latitude) AS latitude,
+                COALESCE(z.longitude, c.longitude) AS longitude
+            FROM departments d
+            LEFT JOIN zip_codes z ON z.zip = d.zip
+            LEFT JOIN (
+                SELECT lower(city) AS city, state, avg(latitude) AS latitude, avg(longitude) AS longitude
+                FROM zip_codes
+                GROUP BY ALL
+            ) c ON c.city = lower(d.city) AND c.state = d.state
+        ) located
+        WHERE located.id = departments.id
+        """
+        )
+
+    return conn.execute("SELECT count(*) FROM departments WHERE latitude IS NULL").fetchone()[0]
+
+
+def has_primary_key(conn: duckdb.DuckDBPyConnection, table: str) -> bool:
+    """Whether an existing table was created with its primary key (older builds weren't)."""
+    return bool(conn.execute(
+        "SELECT count(*) FROM duckdb_constraints() WHERE table_name = $table AND constraint_type = 'PRIMARY KEY'",
+        {'table': table},
+        ).fetchone()[0])
+
+
+def load(
+    db_file: str,
+    providers: Optional[str] = None,
+    departments: Optional[str] = None,
+    replace: bool = False,
+    zip_codes: str = ZIP_CODES_FILE,
+    ) -> Dict[str, int]:
+    """Validate and upsert provider directory exports in a single transaction.
+
+    Args:
+        db_file (str): DuckDB database
+        providers (Optional[str]): Provider export (file or glob)
+        departments (Optional[str]): Department export (file or glob)
+        replace (bool): Drop the existing tables first
+        zip_codes (str): ZIP code centroid table
+
+    Returns:
+        Dict[str, int]: Rows written by table, and `unlocated` departments
+
+    Raises:
+        ValueError: If an export can't be read or has invalid rows; nothing is written
+    """
+    sample = providers is None and departments is None
+    sources = {'providers': providers, 'departments': departments}
+
+    with duckdb.connect(db_file) as conn:
+        conn.begin()
+
+        try:
+            if replace:
+                for table in reversed(TABLES):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+            for table, statement in TABLES.items():
+                conn.execute(statement)
+                if not has_primary_key(conn, table):
+                    raise ValueError(f"{db_file} has no primary key on {table}; rebuild it with --replace")
+
+            for name, kind in LOCATION_COLUMNS.items():
+                conn.execute(f"ALTER TABLE departments ADD COLUMN IF NOT EXISTS {name} {kind}")
+
+            written = {'zip_codes': load_zip_codes(conn, zip_codes)}
+            for table, source in sources.items():
+                rows = (SAMPLE_PROVIDERS if table == 'providers' else SAMPLE_DEPARTMENTS) if sample else []
+                stage(conn, table, source, rows)
+
+                problems = validate(conn, table)
+                if problems:
+                    raise ValueError(f"Rejected {table} rows:\n" + '\n'.join(
+                        f"  {problem}: {count} rows (e.g. id {', '.join(map(str, examples))})"
+                        for problem, (count, examples) in problems.items()
+                        ))
+
+                written[table] = upsert(conn, table)
+
+            written['unlocated'] = locate(conn)
+            conn.commit()
+        except (ValueError, duckdb.Error):
+            conn.rollback()
+            raise
+
+        conn.execute("CHECKPOINT")
+
+    return written
+
+
+def main() -> None:
+    """Ingest CLI."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_FILE, help='DuckDB database')
+    parser.add_argument('--providers', help='Provider export (CSV, Parquet or JSON Lines; globs allowed)')
+    parser.add_argument('--departments', help='Department export (CSV, Parquet or JSON Lines; globs allowed)')
+    parser.add_argument('--replace', action='store_true', help='Drop the existing directory instead of upserting into it')
+    parser.add_argument('--zip-codes', default=ZIP_CODES_FILE, help='ZIP code centroids (zip, city, state, latitude, longitude CSV)')
+    args = parser.parse_args()
+
+    try:
+        written = load(args.db, args.providers, args.departments, args.replace, args.zip_codes)
+    except (ValueError, duckdb.Error) as err:
+        sys.exit(f"{args.db} unchanged: {err}")
+
+    unlocated = written.pop('unlocated')
+    for table, count in written.items():
+        print(f"{table}: {count} rows written")
+    if unlocated:
+        print(f"warning: {unlocated} departments have an address whose ZIP code and city are not in {args.zip_codes}")
 
-with duckdb.connect('data/providers.db') as conn:
-    conn.execute("CREATE OR REPLACE TABLE providers AS SELECT * FROM providers")
-    conn.execute("CREATE OR REPLACE TABLE departments AS SELECT * FROM departments")
-    conn.commit()
 
-    assert len(conn.execute("SELECT * FROM providers").fetchall()) == 5
-    assert len(conn.execute("SELECT * FROM departments").fetchall()) == 6
+if __name__ == '__main__':
+    main()